@@ -18,11 +18,24 @@ Resources/help in using tkinter found at:
 from tkinter.ttk import *
 from tkinter import *
 from tkinter import ttk, messagebox, filedialog
+import queue
+import threading
 import NotificationSystem as NS
 from FreedgeDatabase import *
 from AdminInterface.tkinter_style import *
+from AdminInterface.virtual_table import VirtualTable
+from AdminInterface.background_tasks import TaskRunner, TaskCancelled
 import sys
 
+# The column of the freedges each table heading sorts by when clicked on
+SORT_HEADINGS = {'FID': 'freedge_id', 'Project Name': 'project_name',
+                 'Location': 'city', 'Owner': 'contact_name',
+                 'Freedge Status': 'active_status',
+                 'Last Status Update': 'last_status_update'}
+# The choices of the filters which include every freedge
+ALL_STATUSES = "All Statuses"
+ALL_CONTACT_METHODS = "All Contact Methods"
+
 class AdministratorInterface:
     """
     The class responsible for the main interface of the Freedge Tracker System.
@@ -54,6 +67,53 @@ class AdministratorInterface:
         The GUI for showing the table list of all freedges in the database
         which are considered to be "out-of-date".
         A child of self.notebook
+
+    main_view: VirtualTable
+        Fills main_tab with the freedges in the database, a window of rows
+        at a time.
+
+    ood_view: VirtualTable
+        Fills ood_tab with the out-of-date freedges, a window of rows at a
+        time.
+
+    main_query: FreedgeQuery
+        The search, filters, and sort order of the freedges shown in
+        main_tab, or None if no database has been loaded.
+
+    ood_query: FreedgeQuery
+        The same as main_query, but for the out-of-date freedges only.
+
+    search_text: StringVar
+        The text in the search box. The freedges whose project name,
+        caretaker, or address contain a word starting with each of its
+        words are shown (see FreedgeQuery.search).
+
+    status_filter: StringVar
+        The Status chosen in the status filter, or ALL_STATUSES.
+
+    method_filter: StringVar
+        The ContactMethod chosen in the contact method filter, or
+        ALL_CONTACT_METHODS.
+
+    sort_column: str
+        The column of the freedges (see SORT_COLUMNS) the tables are sorted
+        by, chosen by clicking on the table headings.
+
+    sort_descending: bool
+        Whether the tables are sorted in descending order.
+    
+    tasks: TaskRunner
+        Runs the slow database operations on a worker thread, so that the
+        display keeps responding while they run.
+
+    status_label: Label
+        Describes the database operation currently running, if any.
+
+    progress_bar: Progressbar
+        Shows how far the database operation currently running has got.
+
+    cancel_button: Button
+        Stops the database operation currently running, if it can be stopped.
     
     info_box: Frame
         GUI tkinter Frame for displaying information about a particular
@@ -84,10 +144,11 @@ class AdministratorInterface:
         OpenDatabase().
     
     LoadDatabase(db_file_path)
-        Opens the database at the given path, loading the database into the
-        system and updating the internal file which stores the most recently
-        accessed database file. Called by SelecteDatabaseToLoad() and the
-        main driver module, freedge_tracker.py.
+        Opens the database at the given path in the background, loading the
+        database into the system, updating the internal file which stores the
+        most recently accessed database file, and then updating the display.
+        Called by SelecteDatabaseToLoad() and the main driver module,
+        freedge_tracker.py.
     
     SelectCSV()
         Prompts the user to choose a csv file to load during the creation of a
@@ -102,7 +163,7 @@ class AdministratorInterface:
     SelectAndOpenDB()
         Prompts the user to choose a preexisting SQL database file (.db) to
         load into the system, updating the display with the information in
-        the chosen db file. Calls LoadDatabase() and UpdateFullDisplay().
+        the chosen db file. Calls LoadDatabase().
         Called by pressing the tkinter button labeled 'Load Database'.
     
     UpdateDatabase()
@@ -110,7 +171,30 @@ class AdministratorInterface:
         a new csv file that the user selects. Informaton about freedges which
         will be added to, removed from, and modified within the database is
         displayed to the user, allowing them to confirm or cancel the update.
+
+    ConfirmDiff(fdb, diff)
+        Shows the user the changes found by UpdateDatabase(), applying them
+        if the user confirms.
     
+    RunTask(name, fn, on_done, on_error, cancellable)
+        Runs a database operation on the worker thread, showing its progress
+        below the tables. The on_done and on_error callbacks are run on the
+        tkinter main loop once the operation finishes.
+
+    ShowProgress(fraction, message)
+        Shows the progress reported by the running database operation.
+
+    TaskFinished()
+        Clears the progress display once no database operations are running.
+
+    IsBusy()
+        Returns whether a database operation is still running, letting the
+        user know if so.
+
+    CancelTask()
+        Stops the database operations which are running. Called when the user
+        clicks on the GUI button 'Cancel'.
+
     GetSelected()
         Returns the Freedge object corresponding to the user's currently
         selected entry in the display table, if any. If nothing is selected,
@@ -135,22 +219,59 @@ class AdministratorInterface:
         the constants file (InternalData/freedge_constants.py). The system
         first prompts the user with information about the freedges which will
         be messaged, allowing them to confirm or cancel the mass-send.
+
+    ConfirmNotifyOutOfDate(fdb, ood_list)
+        Shows the user the caretakers found by NotifyOutOfDate(), notifying
+        them if the user confirms.
+
+    SendNotifications(fdb, to_notify)
+        Notifies many caretakers at once in the background, saving their
+        replies to the database in batches as they come in.
     
     UpdateFullDisplay()
         Updates the GUI display to reflect the currently loaded database
-        information. This is called on system startup, anytime a notification
-        reply is received from a caretaker, as well as any time a new database
-        is created/loaded.
+        information. This is called on system startup, as well as any time a
+        new database is created/loaded or updated from a csv file. The
+        freedges are counted in the background.
+
+    BuildQuery()
+        Builds the FreedgeQuery of the freedges to show, from the search box,
+        the filters, and the sort order chosen by the user.
+
+    OnSearchChanged()
+        Called whenever the text in the search box changes. Updates the
+        tables once the user stops typing for SEARCH_DEBOUNCE_INTERVAL
+        milliseconds.
+
+    ApplySearch()
+        Updates the tables to show the freedges matching the search box and
+        the filters. Called when the user picks a filter.
+
+    SortBy(column)
+        Sorts the tables by the given column, or reverses their order if they
+        are already sorted by it. Called when the user clicks on a heading.
+
+    OnFreedgesChanged(freedge_ids)
+        Called by the loaded FreedgeDatabase whenever the data of some
+        freedges changes, such as when a caretaker replies to a notification.
+        Queues the changed freedge_ids to be shown by ShowChangedFreedges().
+
+    ShowChangedFreedges()
+        Updates, inserts, or removes just the rows of the freedges which
+        changed in the two display tables.
         
-    UpdateTableDisplay(table, freedges: [Freedge])
-        Updates the information in a particular display table to contain the
-        information stored in the array of Freedge objects passed in. This
-        avoids duplicate code when updating the table tabs ('All', the main
-        tab, and 'Out of Date', the tab showing only the out of date freedges).
+    UpdateTableDisplay(view, query)
+        Updates a particular display table to show the freedges matching a
+        FreedgeQuery. This avoids duplicate code when updating the table tabs
+        ('All', the main tab, and 'Out of Date', the tab showing only the out
+        of date freedges).
         
     BuildTable(tab)
         Constructs the GUI elements necessary for a display table, using the
         passed-in tab argument as the parent object.
+
+    BuildSearchBar()
+        Constructs the search box and the filters shown below the tables.
     
     AddButton(parent, label, cmd, xpos, ypos)
         Creates a new button on the GUI display. Sets the parent, the text
@@ -172,12 +293,28 @@ class AdministratorInterface:
         self.root = None            # The root of the GUI display
         self.main_tab = None        # Tab display showing all freedges
         self.ood_tab = None         # Tab for showing out-of-date freedges
+        self.main_view = None       # Rows shown in the main_tab table
+        self.ood_view = None        # Rows shown in the ood_tab table
+        self.main_query = None      # The freedges shown in the main_tab table
+        self.ood_query = None       # The freedges shown in the ood_tab table
+        self.search_text = None     # The text in the search box
+        self.status_filter = None   # The Status to show, if not all of them
+        self.method_filter = None   # The ContactMethod to show, if not all
+        self.sort_column = "freedge_id"     # The column the tables sort by
+        self.sort_descending = False        # Whether they sort in reverse
+        self._search_after = None   # The search waiting for typing to stop
         self.notebook = None        # The panel containing the two tabs
+        self.tasks = None           # Runs database operations in background
+        self.status_label = None    # Describes the running operation
+        self.progress_bar = None    # Progress of the running operation
+        self.cancel_button = None   # Stops the running operation
         self.info_box = None        # GUI for info about a particular freedge
         self.info_label = None      # Currently displayed freedge info
         self.prompt_label = None    # Text to prompt user for action (used
                                     # when no database has been loaded yet)
         self.ib_width = 30          # Fixed width for info_box display
+        # The freedge_ids changed in the database which are not shown yet
+        self.changed_ids = queue.SimpleQueue()
     
     # =========================================================================
     # Database I/O Methods
@@ -186,9 +323,14 @@ class AdministratorInterface:
     def CreateDatabase(self):
         """
         Creates a new internal freedge database, updating the GUI if necessary.
+        The csv file is imported in the background, and the import can be
+        cancelled; creating the same database from the same csv file again
+        resumes a cancelled import.
         
         Returns: None
         """
+        if self.IsBusy():
+            return
         # Prompt the user to select the csv file to use to create the database
         csv_file_path = self.SelectCSV()
         if csv_file_path is None:           # Verify the user's response
@@ -197,16 +339,50 @@ class AdministratorInterface:
         db_file_path = self.SelectDBSave()
         if db_file_path is None:            # Verify the user's response
             return
+        
+        def import_csv(task):
+            # Runs on the worker thread
+            def progress(stats, fraction):
+                task.report_progress(fraction, "Importing the csv file: " +
+                                     str(stats.rows_inserted) + " rows imported")
+                task.check_cancelled()      # Stop between batches if asked
+            new_fdb = new_database_from_csv(db_file_path, csv_file_path,
+                                            progress=progress)
+            new_fdb.close()
+            return new_fdb.import_stats
+        
+        def imported(stats):
+            # Let the user know about any rows which were set aside
+            rejected = stats.rows_rejected
+            if (rejected > 0):
+                messagebox.showwarning("Rows Rejected", str(rejected) + " row(s) of the csv"
+                                       " file could not be imported. They have been saved,"
+                                       " along with the reason each was rejected, in the"
+                                       " 'rejected_rows' table of the database.")
+            # Load the newly created database into the system, which also
+            # updates the display to reflect the newly loaded information
+            self.LoadDatabase(db_file_path)
+        
+        def failed(error):
+            if isinstance(error, CSVHeaderError):
+                messagebox.showerror("Invalid CSV File", str(error))
+            elif isinstance(error, TaskCancelled):
+                messagebox.showinfo("Import Cancelled", "The import was stopped."
+                                    " Creating a database at the same location from"
+                                    " the same csv file will continue it from where"
+                                    " it stopped.")
+            else:
+                messagebox.showerror("Import Failed", str(error))
+        
         # If the above steps were successful, create a new database
-        new_database_from_csv(db_file_path, csv_file_path)
-        # Load the newly created database into the system
-        self.LoadDatabase(db_file_path)
-        # Update the display to reflect the newly loaded database information
-        self.UpdateFullDisplay()
+        self.RunTask("Importing the csv file", import_csv, imported, failed,
+                     cancellable=True)
 
     def LoadDatabase(self, db_file_path: str):
         """
-        Loads the database at the given path into the system.
+        Loads the database at the given path into the system. The database is
+        opened (and its schema upgraded, if needed) in the background, and the
+        display is updated once it has been loaded.
         
         Parameters:
             db_file_path:   The str path of the .db file to open
@@ -217,19 +393,35 @@ class AdministratorInterface:
         if not exists_internal_database(db_file_path):
             FileNotFoundError("Could not locate the database at: ", db_file_path)
         
-        # Load the database file as an instance of the FreedgeDatabase class
-        self.fdb = load_internal_database(db_file_path)
-        # Update the interface's current database path for future use
-        self.fdb_path = db_file_path
-        # Save/update the path of the most recently accessed database using the
-        # file whose path is specified at DATABASE_PATH_INFO
-        saved_fdb_path = open(DATABASE_PATH_INFO, "w+")
-        # Write the header for the internal path file
-        saved_fdb_path.write("This is a text file which contains the file path to"
-                             " the last database(.db file) that was opened.\n")
-        # Write the actual file location, and close the file
-        saved_fdb_path.write(self.fdb_path)
-        saved_fdb_path.close()
+        def loaded(new_fdb):
+            if new_fdb is None:
+                messagebox.showerror("Unable to Load Database", "Could not"
+                                     " open the database at: " + db_file_path)
+                return
+            # Close the connections to the previously loaded database, if any
+            if self.fdb is not None:
+                self.fdb.remove_listener(self.OnFreedgesChanged)
+                self.fdb.close()
+            # Use the loaded database file, an instance of the FreedgeDatabase class
+            self.fdb = new_fdb
+            # Show the changes made to single freedges as they happen
+            self.fdb.add_listener(self.OnFreedgesChanged)
+            # Update the interface's current database path for future use
+            self.fdb_path = db_file_path
+            # Save/update the path of the most recently accessed database using the
+            # file whose path is specified at DATABASE_PATH_INFO
+            saved_fdb_path = open(DATABASE_PATH_INFO, "w+")
+            # Write the header for the internal path file
+            saved_fdb_path.write("This is a text file which contains the file path to"
+                                 " the last database(.db file) that was opened.\n")
+            # Write the actual file location, and close the file
+            saved_fdb_path.write(self.fdb_path)
+            saved_fdb_path.close()
+            # Update the display to reflect the newly loaded database information
+            self.UpdateFullDisplay()
+        
+        self.RunTask("Loading the database",
+                     lambda task: load_internal_database(db_file_path), loaded)
     
     def SelectCSV(self):
         """
@@ -292,6 +484,8 @@ class AdministratorInterface:
         
         Returns: None
         """
+        if self.IsBusy():
+            return
         file_types = [('db files', '.db')]
         prompt = "Please select the .db file to load into the system."
         # Briefly describe the task to the user before showing the file-select
@@ -300,50 +494,181 @@ class AdministratorInterface:
         db_file_path = filedialog.askopenfilename(
             title="Please select the internal database file.",
             filetypes=file_types, defaultextension=".db")
-        # If they provided a filename correctly, return it. Otherwise, return None.
+        # If they provided a filename correctly, load it, which also updates
+        # the display tables
         if (db_file_path != ""):
             self.LoadDatabase(db_file_path)
-        # Update the display tables
-        self.UpdateFullDisplay()
 
     def UpdateDatabase(self):
         """
         Updates the currently loaded database file (db) with information from
-        a new csv file that the user selects.
+        a new csv file that the user selects. Only the freedges which were
+        added, removed, or modified are written, so the statuses collected
+        through notifications are kept.
         
         Returns: None
         """
+        if (self.fdb is None or self.IsBusy()):
+            return
         # Get path of CSV file to load in in order to update the database
         file_path = filedialog.askopenfilename()
-        (to_add, to_remove, to_modify) = self.fdb.compare_databases(file_path)
-        if (len(to_add) == 0 and len(to_remove) == 0 and len(to_modify) == 0):
+        if (file_path == "" or file_path is None):
+            return
+        fdb = self.fdb
+        
+        def failed(error):
+            if isinstance(error, CSVHeaderError):
+                messagebox.showerror("Invalid CSV File", str(error))
+            else:
+                messagebox.showerror("Update Failed", str(error))
+        
+        # Compare the csv file with the database in the background, and then
+        # let the user confirm the changes
+        self.RunTask("Comparing the csv file with the database",
+                     lambda task: fdb.diff_csv(file_path),
+                     lambda diff: self.ConfirmDiff(fdb, diff), failed)
+    
+    def ConfirmDiff(self, fdb, diff):
+        """
+        Shows the user the changes which loading a csv file into the database
+        will make, and applies them in the background if the user confirms.
+        Called by UpdateDatabase() once the csv file has been compared.
+        
+        Parameters:
+            fdb: the FreedgeDatabase the csv file was compared with.
+            diff: the DatabaseDiff of the changes.
+        
+        Returns: None
+        """
+        if diff.is_empty():
             message = "Loading the selected csv file will not change any data in the database."
         else:
             message = "If you load the selected csv file into the database, the following changes will be made:\n\n"
-      
-        if (len(to_add) > 0):
-            message += "(" + str(len(to_add)) + ") entries will be ADDED.\n"
-            # for freedge in to_add:
-            # message += freedge.ToString() + "\n"
-        if (len(to_remove) > 0):
-            message += "(" + str(len(to_remove)) + ") entries will be REMOVED.\n"
-            # message += "===== Freedges which will be REMOVED =====\n"
-            # for freedge in to_remove:
-            # message += freedge.ToString() + "\n"
-        if (len(to_modify) > 0):
-            message += "(" + str(len(to_modify)) + ") entries will be MODIFIED.\n"
-            # message += "===== Freedges whose data will be MODIFIED =====\n"
-            # for (f1, f2) in to_modify:
-            # changes = f1.compare_freedges(f2)
-            # message += f1.ToString() + "\n"
-            # for change in changes:
-            # message += change
-        messagebox.askokcancel("Proceed?", message+" Proceed?")
-        # Get path of database
-        self.fdb = new_database_from_csv(self.fdb_path, file_path)
-        # Update the menu window
-        self.UpdateFullDisplay()
+        
+        # Summarize each kind of change, listing the first few freedges of each
+        shown = 10
+        for (change_type, action) in [(ChangeType.Add, "ADDED"),
+                                      (ChangeType.Remove, "REMOVED"),
+                                      (ChangeType.Modify, "MODIFIED")]:
+            count = diff.count(change_type)
+            if (count == 0):
+                continue
+            message += "(" + str(count) + ") entries will be " + action + ":\n"
+            for record in diff.page(change_type, 0, shown):
+                message += "    " + record.project_name + "\n"
+            if (count > shown):
+                message += "    ...and " + str(count - shown) + " more.\n"
+        if diff.is_empty():
+            messagebox.showinfo("No Changes", message)
+            return
+        # Only apply the changes if the user confirms them
+        if not messagebox.askokcancel("Proceed?", message+"\nProceed?"):
+            return
+        # Apply just the changes, keeping the statuses of existing freedges,
+        # and then update the menu window
+        self.RunTask("Updating the database", lambda task: fdb.apply_diff(diff),
+                     lambda result: self.UpdateFullDisplay(),
+                     lambda error: messagebox.showerror("Update Failed", str(error)))
 
+    # =========================================================================
+    # Background Task Methods
+    # =========================================================================
+    
+    def RunTask(self, name, fn, on_done=None, on_error=None, cancellable=False):
+        """
+        Runs a database operation on the worker thread, so that the display
+        keeps responding while it runs. Its name and progress are shown below
+        the tables until it finishes.
+        
+        Parameters:
+            name: a str describing the operation to the user.
+            fn: a function of the BackgroundTask, which performs the operation
+                and returns its result. It must not use tkinter.
+            on_done: a function of the result, run on the main loop once the
+                     operation finishes.
+            on_error: a function of the exception, run on the main loop if the
+                      operation fails or is cancelled. By default, the error
+                      is shown to the user.
+            cancellable: whether the user may stop the operation with the
+                         'Cancel' button.
+        
+        Returns: the BackgroundTask
+        """
+        def done(result):
+            self.TaskFinished()
+            self.ShowChangedFreedges()  # Show any changes the task made
+            if on_done is not None:
+                on_done(result)
+        
+        def failed(error):
+            self.TaskFinished()
+            if on_error is not None:
+                on_error(error)
+            elif not isinstance(error, TaskCancelled):
+                messagebox.showerror("Error", name + " failed:\n\n" + str(error))
+        
+        self.status_label.configure(text=name + "...")
+        self.progress_bar.configure(mode='indeterminate')
+        self.progress_bar.start()
+        if cancellable:
+            self.cancel_button.configure(state=NORMAL)
+        return self.tasks.submit(name, fn, done, failed, self.ShowProgress)
+    
+    def ShowProgress(self, fraction, message):
+        """
+        Shows the progress reported by the running database operation.
+        
+        Parameters:
+            fraction: a float from 0 to 1, or None if it is not known.
+            message: a str describing the current step.
+        
+        Returns: None
+        """
+        if message:
+            self.status_label.configure(text=message)
+        if fraction is not None:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate', value=fraction)
+        # Show any changes the operation has saved so far
+        self.ShowChangedFreedges()
+    
+    def TaskFinished(self):
+        """
+        Clears the progress display once no database operations are running.
+        
+        Returns: None
+        """
+        if self.tasks.busy():
+            return
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode='determinate', value=0)
+        self.status_label.configure(text="")
+        self.cancel_button.configure(state=DISABLED)
+    
+    def IsBusy(self):
+        """
+        Checks whether a database operation is still running, letting the
+        user know if it is.
+        
+        Returns: True if an operation is running, otherwise False
+        """
+        if not self.tasks.busy():
+            return False
+        messagebox.showinfo("Please Wait", "Please wait for the current task"
+                            " to finish: " + self.status_label.cget('text'))
+        return True
+    
+    def CancelTask(self):
+        """
+        Stops the database operations which are running, as soon as they can
+        safely be stopped.
+        
+        Returns: None
+        """
+        self.tasks.cancel_all()
+        self.status_label.configure(text="Cancelling...")
+        self.cancel_button.configure(state=DISABLED)
+    
     # =========================================================================
     # GUI Methods Called Via User I/O
     # =========================================================================
@@ -374,11 +699,9 @@ class AdministratorInterface:
             return None
         # Otherwise, get the fields in the table as a list
         fields = list(table.item(table.selection(), 'values'))
-        # Get a list of all the freedges in the currently loaded database
-        freedges = self.fdb.get_freedges()
         # Use the retrieved table fields to lookup the freedge by ID (field 0)
-        selected = freedges[int(fields[0]) - 1]
-        # Return the corresponding Freedge object
+        selected = self.fdb.get_freedge(int(fields[0]))
+        # Return the corresponding Freedge object (None if it was removed)
         return selected
         
     def OnTableClick(self, event: Event):
@@ -439,10 +762,10 @@ class AdministratorInterface:
         if response:        # If the messagebox's reply value was 'True'
             # Create a new instance of the NoficationMgmt class
             notifier = NS.NotificationMgmt(self.root)
-            # Use the new notifier to notify the freedge caretaker
+            # Use the new notifier to notify the freedge caretaker. Saving
+            # their response updates just the freedge's row in each table,
+            # through OnFreedgesChanged()
             notifier.notify_and_update(self.fdb, freedge)
-        # Update the display to reflect their response
-        self.UpdateFullDisplay()
     
     def NotifySelected(self):
         """
@@ -455,7 +778,7 @@ class AdministratorInterface:
         Returns: None
         """
         # Verify that a database has been loaded before proceeding
-        if (self.fdb is None):
+        if (self.fdb is None or self.IsBusy()):
             return
         # Get the Freedge entry currently selected in the table
         selected: Freedge = self.GetSelected()
@@ -473,10 +796,27 @@ class AdministratorInterface:
         Returns: None
         """
         # Verify that a database has been loaded before continuing
-        if (self.fdb is None):
+        if (self.fdb is None or self.IsBusy()):
             return
+        fdb = self.fdb
         # Retrieve the list of out of date freedges according to the database
-        ood_list = self.fdb.get_out_of_date()
+        # in the background, and then confirm the notifications with the user
+        self.RunTask("Finding the out-of-date freedges",
+                     lambda task: fdb.get_out_of_date(),
+                     lambda ood_list: self.ConfirmNotifyOutOfDate(fdb, ood_list))
+    
+    def ConfirmNotifyOutOfDate(self, fdb, ood_list):
+        """
+        Shows the user the caretakers of the out-of-date freedges, and notifies
+        them if the user confirms. Called by NotifyOutOfDate() once the list
+        of out-of-date freedges has been read.
+        
+        Parameters:
+            fdb: the FreedgeDatabase the freedges were read from.
+            ood_list: the list of out-of-date Freedge objects.
+        
+        Returns: None
+        """
         # Create a list of freedges which can be notified based on whether they
         # have given permission to be notified, and are not confirmed to have
         # an inactive status.
@@ -514,11 +854,47 @@ class AdministratorInterface:
         # Verify that the user (admin) would still like to send the messages
         response = messagebox.askokcancel("Verify Message", prompt)
         if response:
-            for freedge in to_notify:
-                notifier = NS.NotificationMgmt(self.root)
-                notifier.notify_and_update(self.fdb, freedge)
-        # Update the display to reflect any changes based on the responses
-        self.UpdateFullDisplay()
+            self.SendNotifications(fdb, to_notify)
+    
+    def SendNotifications(self, fdb, to_notify):
+        """
+        Notifies the caretakers of many freedges at once in the background,
+        saving their replies to the database in batches as they come in (see
+        NotificationSystem/notificationDispatch.py). The rows of the freedges
+        are updated as their replies are saved, and the campaign can be
+        stopped with the 'Cancel' button.
+        
+        Parameters:
+            fdb: the FreedgeDatabase to save the replies to.
+            to_notify: the list of Freedge objects whose caretakers to notify.
+        
+        Returns: None
+        """
+        def dispatch(task):
+            # Runs on the worker thread; the popups are opened on the main loop
+            transport = NS.popup_transport(self.root, task.call_in_main)
+            dispatcher = NS.NotificationDispatcher(fdb, transport,
+                concurrency=min(NOTIFY_CONCURRENCY, NOTIFY_POPUP_LIMIT))
+            def progress(stats):
+                task.report_progress(stats.finished() / stats.total,
+                    "Notifying caretakers: " + str(stats.finished()) + " of " +
+                    str(stats.total) + " notified, " + str(stats.replied) +
+                    " replied")
+            return dispatcher.dispatch(to_notify, should_stop=task.cancelled,
+                                       on_progress=progress)
+        
+        def dispatched(stats):
+            summary = str(stats.sent) + " caretaker(s) were notified, and " + \
+                str(stats.replied) + " replied."
+            if stats.cancelled:
+                summary = "The notifications were stopped. " + summary
+            if stats.failed > 0:
+                summary += "\n\n" + str(stats.failed) + " notification(s)" \
+                    " could not be sent."
+            messagebox.showinfo("Notifications Sent", summary)
+        
+        self.RunTask("Notifying caretakers", dispatch, dispatched,
+                     cancellable=True)
 
     # =========================================================================
     # GUI Management Methods    (creation, updating)
@@ -546,42 +922,147 @@ class AdministratorInterface:
         # Otherwise, get rid of the instruction prompt label if it exists
         elif self.fdb is not None and self.prompt_label is not None:
             self.prompt_label.destroy()
-        # Get the list of freedges in the currently loaded database
-        freedges = self.fdb.get_freedges()
-        # Get the list of freedges whose statuses are considered out-of-date
-        out_of_date = self.fdb.get_out_of_date()
-        self.root.update()      # Be sure the display is up-to-date
-        # Update the displays of the two GUI tabs, 'All' and 'Out of Date'
-        self.UpdateTableDisplay(self.main_tab, freedges)
-        self.UpdateTableDisplay(self.ood_tab, out_of_date)
+        # Keep the current queries if the search has not changed, so that the
+        # tables keep their scroll positions
+        main_query = self.BuildQuery()
+        if main_query != self.main_query:
+            self.main_query = main_query
+            self.ood_query = main_query.out_of_date()
+        (fdb, main_query, ood_query) = (self.fdb, self.main_query, self.ood_query)
+        
+        def counted(counts):
+            # Skip the update if another database was loaded, or the search
+            # changed, in the meantime
+            if (fdb is not self.fdb or main_query is not self.main_query):
+                return
+            # Update the displays of the two GUI tabs, 'All' and 'Out of Date'.
+            # The counts are cached, and only the visible rows of each are read
+            # from the database.
+            self.UpdateTableDisplay(self.main_view, main_query)
+            self.UpdateTableDisplay(self.ood_view, ood_query)
+        
+        # Counting the freedges may read every row, so do it in the background
+        self.RunTask("Reading the database", lambda task:
+                     (main_query.count(), ood_query.count()), counted)
     
-    def UpdateTableDisplay(self, table: Treeview, freedges: [Freedge]):
+    def UpdateTableDisplay(self, view: VirtualTable, query: FreedgeQuery):
         """
-        Updates the information in a particular display table to contain the
-        information stored in the array of Freedge objects passed in.
+        Updates a particular display table to show the freedges matching a
+        query, in the query's order. If the table already shows the same
+        query, its scroll position is kept and only the rows which changed
+        are updated.
         
         Parameters:
-            table: the tkinter Treeview object for the table to update.
-            freedges: An array of Freedge objects containing the data to
-                      fill the table with
+            view: the VirtualTable for the table to update.
+            query: the FreedgeQuery of the freedges to show.
                       
         Return: None
         """
-        # clear the old list of freedges
-        for item in table.get_children():
-            table.delete(item)
-        # Add the new list of freedges
-        for fridge in range(len(freedges)):
-            f = freedges[fridge]
-            contact = "-"
-            if (f.preferred_contact_method == ContactMethod.SMS.value):
-                contact = f.phone_number
-            if (f.preferred_contact_method == ContactMethod.Email.value):
-                contact = f.email_address
-            # Insert the Freedge's data into the Treeview display
-            table.insert(parent='', index=fridge, iid=fridge, text='', values=(
-                f.freedge_id, f.project_name, f.fridge_location.ShortString(),
-                f.caretaker_name, f.freedge_status.value, f.last_status_update))
+        # Lists in order of freedge_id are updated without a sort key
+        if (query.sort == "freedge_id" and not query.descending):
+            sort_key = None
+        else:
+            sort_key = query.sort_key
+        view.set_source(query.count, query.page, query.by_id, sort_key)
+    
+    def BuildQuery(self):
+        """
+        Builds the query of the freedges to show in the tables, from the text
+        in the search box, the chosen filters, and the chosen sort order.
+        
+        Returns: a FreedgeQuery on the loaded database
+        """
+        query = self.fdb.query().search(self.search_text.get())
+        if self.status_filter.get() != ALL_STATUSES:
+            query = query.with_status(Status(self.status_filter.get()))
+        if self.method_filter.get() != ALL_CONTACT_METHODS:
+            query = query.with_contact_method(ContactMethod(self.method_filter.get()))
+        return query.sort_by(self.sort_column, self.sort_descending)
+    
+    def OnSearchChanged(self, *args):
+        """
+        Updates the tables once the user stops typing in the search box, so
+        that typing a word only searches the database once.
+        
+        Parameters:
+            args: parameters passed by tkinter, which are not used.
+        
+        Return: None
+        """
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+        self._search_after = self.root.after(SEARCH_DEBOUNCE_INTERVAL,
+                                             self.ApplySearch)
+    
+    def ApplySearch(self, *args):
+        """
+        Updates the tables to show the freedges matching the search box and
+        the chosen filters.
+        
+        Parameters:
+            args: parameters passed by tkinter, which are not used.
+        
+        Return: None
+        """
+        self._search_after = None
+        if self.fdb is not None:
+            self.UpdateFullDisplay()
+    
+    def SortBy(self, column):
+        """
+        Sorts the tables by a column of the freedges, or reverses the order of
+        the tables if they are already sorted by it. The heading of the column
+        shows an arrow pointing in the direction it is sorted in.
+        
+        Parameters:
+            column: the str name of the column (one of SORT_COLUMNS).
+        
+        Return: None
+        """
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        arrow = " \u25bc" if self.sort_descending else " \u25b2"
+        for table in (self.main_tab, self.ood_tab):
+            for (heading, sorts_by) in SORT_HEADINGS.items():
+                text = heading + arrow if sorts_by == column else heading
+                table.heading(heading, text=text)
+        self.ApplySearch()
+    
+    def OnFreedgesChanged(self, freedge_ids):
+        """
+        Records that the data of some freedges changed in the database. It is
+        called by the FreedgeDatabase on the thread which made the change, so
+        the rows are only updated right away on the main loop; otherwise, they
+        are updated once the background task making the change finishes.
+        
+        Parameters:
+            freedge_ids: the list of int freedge_ids which changed.
+        
+        Return: None
+        """
+        self.changed_ids.put(freedge_ids)
+        # tkinter may only be used from the thread running the main loop
+        if threading.current_thread() is threading.main_thread():
+            self.ShowChangedFreedges()
+    
+    def ShowChangedFreedges(self):
+        """
+        Updates just the rows of the freedges which changed since the display
+        was last updated, in both of the display tables. Freedges which are
+        no longer out of date are removed from the 'Out of Date' table.
+        
+        Return: None
+        """
+        freedge_ids = []
+        while not self.changed_ids.empty():
+            freedge_ids.extend(self.changed_ids.get())
+        if (len(freedge_ids) == 0 or self.fdb is None):
+            return
+        self.main_view.update_rows(freedge_ids)
+        self.ood_view.update_rows(freedge_ids)
 
     def BuildTable(self, tab: Frame) -> Treeview:
         """
@@ -593,23 +1074,57 @@ class AdministratorInterface:
         Returns: a tkinter Treeview (the table which was constructed)
         """
         # Build the structure of the Treeview's columns and their widths
-        name_width_dict = {'FID': 40, 'Project Name': 240, 'Location': 200,
+        name_width_dict = {'FID': 40, 'Project Name': 220, 'Location': 200,
         'Owner': 150, 'Freedge Status': 150, 'Last Status Update': 100}
         columns = list(name_width_dict.keys())
         table = ttk.Treeview(tab, height=30, columns=columns, show='headings',
                              selectmode='browse')
-        table.pack()
+        # Leave room on the right for the VirtualTable's scrollbar
+        table.pack(side=LEFT)
         
         # Insert the columns/headers for the table
         table.column('#0', width=0, stretch=NO)
         table.heading('#0', text='', anchor='w')
         for col in columns:
             table.column(col, anchor='w', width=name_width_dict[col])
-            table.heading(col, anchor='w', text=col)
+            # Clicking on a heading sorts the tables by that column
+            table.heading(col, anchor='w', text=col,
+                          command=lambda col=col: self.SortBy(SORT_HEADINGS[col]))
         # Bind the function OnTableClick() to be called when a row is selected
         table.bind('<<TreeviewSelect>>', self.OnTableClick)
         return table
     
+    def BuildSearchBar(self):
+        """
+        Constructs the search box, and the filters for the freedges' statuses
+        and contact methods, below the tables.
+        
+        Returns: None
+        """
+        search_box = Frame(self.root, background="#34495e")
+        search_box.place(x=200, y=620)
+        label = Label(search_box, text="Search:", background="#34495e",
+                      foreground="white", font=("Helvetica", 10))
+        label.grid(column=0, row=0, sticky="w")
+        # The tables are searched once the user stops typing
+        self.search_text = StringVar(self.root)
+        entry = ttk.Entry(search_box, textvariable=self.search_text, width=40)
+        entry.grid(column=1, row=0, padx=10)
+        self.search_text.trace_add('write', self.OnSearchChanged)
+        # The filters apply as soon as one of their choices is picked
+        self.status_filter = StringVar(self.root, value=ALL_STATUSES)
+        statuses = ttk.Combobox(search_box, textvariable=self.status_filter,
+            values=[ALL_STATUSES] + [s.value for s in Status],
+            state='readonly', width=20)
+        statuses.grid(column=2, row=0, padx=10)
+        statuses.bind('<<ComboboxSelected>>', self.ApplySearch)
+        self.method_filter = StringVar(self.root, value=ALL_CONTACT_METHODS)
+        methods = ttk.Combobox(search_box, textvariable=self.method_filter,
+            values=[ALL_CONTACT_METHODS] + [m.value for m in ContactMethod],
+            state='readonly', width=20)
+        methods.grid(column=3, row=0, padx=10)
+        methods.bind('<<ComboboxSelected>>', self.ApplySearch)
+    
     def AddButton(self, parent, label, cmd, xpos, ypos):
         """
         Adds a new button to the GUI.
@@ -672,6 +1187,11 @@ class AdministratorInterface:
         # Build the structure of the tables to be displayed in the two tabs
         self.main_tab = self.BuildTable(tab1)
         self.ood_tab = self.BuildTable(tab2)
+        # Only the visible rows of each table are added to it at a time
+        self.main_view = VirtualTable(self.main_tab)
+        self.ood_view = VirtualTable(self.ood_tab)
+        # The search box and filters for the freedges shown in the tables
+        self.BuildSearchBar()
         
         # Create the display to provide info about the currently selected row
         info_box = Frame(root, height=514, width=30)
@@ -689,6 +1209,27 @@ class AdministratorInterface:
         info_label.columnconfigure(0, weight=1)
         info_label.rowconfigure(1, weight=1)
 
+        # =====================================================================
+        # Creating the Background Task Display
+        # =====================================================================
+        # Database operations run on a worker thread, which reports back to
+        # the main loop every TASK_POLL_INTERVAL milliseconds
+        self.tasks = TaskRunner(root)
+        task_box = Frame(root, background="#34495e")
+        task_box.place(x=200, y=660)
+        # The description of the running operation
+        self.status_label = Label(task_box, text="", anchor='w', width=50,
+            background="#34495e", foreground="white", font=("Helvetica", 10))
+        self.status_label.grid(column=0, row=0, sticky="w")
+        # How far the running operation has got
+        self.progress_bar = ttk.Progressbar(task_box, orient=HORIZONTAL,
+            length=300, mode='determinate', maximum=1.0)
+        self.progress_bar.grid(column=1, row=0, padx=10)
+        # Button to stop the running operation, if it can be stopped
+        self.cancel_button = Button(task_box, text="Cancel", command=self.CancelTask,
+            font=("Helvetica", 10), width=10, state=DISABLED)
+        self.cancel_button.grid(column=2, row=0)
+
         # =====================================================================
         # Creating the GUI Buttons
         # =====================================================================
@@ -727,5 +1268,9 @@ class AdministratorInterface:
 
         Returns: None
         """
+        # Stop any running database operations, keeping an import that was
+        # cancelled so that it can be resumed later
+        if self.tasks is not None:
+            self.tasks.shutdown()
         # use the exit method from the sys module
         sys.exit()
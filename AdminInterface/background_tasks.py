@@ -0,0 +1,323 @@
+"""
+===============================================================================
+Title:	Background Tasks for the Administrator Interface
+===============================================================================
+Description:	Runs slow database operations (imports, diffs, and queries) on a
+                worker thread, so that the tkinter display keeps responding
+                while they run.
+
+                tkinter may only be used from the thread running the main
+                loop, so a task never touches the display itself. Instead, it
+                reports its progress to a queue, and the TaskRunner checks on
+                its tasks every TASK_POLL_INTERVAL milliseconds using
+                root.after(), passing the progress and the final result (or
+                error) to callbacks which run on the main loop.
+
+                By default there is a single worker thread, so tasks run one
+                at a time in the order they were submitted, and never write
+                to the database at the same time as each other.
+
+                A task which does need the display (for example, to open a
+                notification popup) asks for a function to be run on the main
+                loop with call_in_main(), which the TaskRunner runs the next
+                time it checks on the task.
+"""
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from InternalData.freedge_constants import TASK_POLL_INTERVAL
+
+
+class TaskCancelled(Exception):
+    """
+    Raised within a task when it stops early because it was cancelled.
+    """
+    pass
+
+
+class BackgroundTask:
+    """
+    A single operation submitted to a TaskRunner.
+
+    Attributes
+    ===========================================================================
+    name: str
+        A short description of the task, shown to the user while it runs.
+
+    future: Future
+        The concurrent.futures Future of the task's result.
+
+    Methods
+    ===========================================================================
+    cancel()
+        Asks the task to stop as soon as it can.
+
+    cancelled()
+        Returns whether the task has been asked to stop.
+
+    check_cancelled()
+        Raises TaskCancelled if the task has been asked to stop. Called by the
+        task itself, between steps which can safely be interrupted.
+
+    report_progress(fraction, message)
+        Records how far the task has got. Called by the task itself.
+
+    call_in_main(fn)
+        Runs fn on the main loop, returning a Future of its result. Called by
+        the task itself.
+    """
+    def __init__(self, name, on_done=None, on_error=None, on_progress=None):
+        """
+        Initializes a task which has not been started yet.
+
+        Parameters:
+            name: a short str describing the task.
+            on_done: a function of the task's result, called on the main loop
+                     once the task finishes.
+            on_error: a function of the exception, called on the main loop if
+                      the task raises one (including TaskCancelled).
+            on_progress: a function of (fraction, message), called on the
+                         main loop with the task's latest progress.
+        """
+        self.name = name
+        self.future = None
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self._cancel = threading.Event()
+        self._progress = queue.SimpleQueue()    # (fraction, message) reports
+        self._calls = queue.SimpleQueue()       # (fn, Future) to run on main loop
+
+    def cancel(self):
+        """
+        Asks the task to stop. A task which has not started yet never runs;
+        a running task stops at its next call to check_cancelled().
+
+        Returns: None
+        """
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelled(self):
+        """
+        Returns whether the task has been asked to stop.
+
+        Returns: True or False
+        """
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """
+        Stops the task if it has been asked to stop.
+
+        Returns: None
+
+        Raises: TaskCancelled if cancel() has been called.
+        """
+        if self._cancel.is_set():
+            raise TaskCancelled(self.name + " was cancelled.")
+
+    def report_progress(self, fraction, message=""):
+        """
+        Records how far the task has got. May be called from any thread.
+
+        Parameters:
+            fraction: a float from 0 to 1, or None if it is not known.
+            message: a str describing the current step.
+
+        Returns: None
+        """
+        self._progress.put((fraction, message))
+
+    def call_in_main(self, fn):
+        """
+        Asks for a function to be run on the main loop, where it may use
+        tkinter. May be called from any thread; the function runs the next
+        time the TaskRunner checks on the task.
+
+        Parameters:
+            fn: a function of no arguments.
+
+        Returns: a concurrent.futures Future of the function's result
+        """
+        future = Future()
+        self._calls.put((fn, future))
+        return future
+
+    def _run_calls(self):
+        """
+        Runs the functions passed to call_in_main() since the last call, on
+        the main loop. Intended for internal use only.
+        """
+        while True:
+            try:
+                (fn, future) = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue        # The task no longer wants the result
+            try:
+                result = fn()
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _latest_progress(self):
+        """
+        Returns the most recent progress report since the last call, or None
+        if there have been none. Intended for internal use only.
+        """
+        latest = None
+        while True:
+            try:
+                latest = self._progress.get_nowait()
+            except queue.Empty:
+                return latest
+
+
+class TaskRunner:
+    """
+    Runs BackgroundTasks on worker threads, and passes their progress and
+    results back to the tkinter main loop.
+
+    Attributes
+    ===========================================================================
+    root: Tk
+        The root of the GUI display, whose main loop the callbacks run on.
+
+    poll_interval: int
+        The number of milliseconds between each check on the running tasks.
+
+    Methods
+    ===========================================================================
+    submit(name, fn, on_done, on_error, on_progress)
+        Runs fn(task) on a worker thread, returning the BackgroundTask.
+
+    busy()
+        Returns whether any tasks have not finished yet.
+
+    cancel_all()
+        Asks every task which has not finished to stop.
+
+    shutdown()
+        Cancels every task and stops the worker threads.
+    """
+    def __init__(self, root, workers=1, poll_interval=TASK_POLL_INTERVAL):
+        """
+        Initializes a task runner for the display with the given root.
+
+        Parameters:
+            root: the Tk root (or any object with the same after() method).
+            workers: the int number of worker threads.
+            poll_interval: the int number of milliseconds between checks.
+        """
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="freedge-task")
+        self._tasks = []            # The tasks which have not been reported
+        self._polling = False       # Whether a check has been scheduled
+
+    def submit(self, name, fn, on_done=None, on_error=None, on_progress=None):
+        """
+        Runs a function on a worker thread. The callbacks are always called
+        on the main loop, and may safely update the display.
+
+        Parameters:
+            name: a short str describing the task.
+            fn: a function of the BackgroundTask, which returns the result.
+                It must not use tkinter.
+            on_done: a function of the result, called once fn returns.
+            on_error: a function of the exception, called if fn raises one.
+                      Defaults to raising it on the main loop.
+            on_progress: a function of (fraction, message), called with the
+                         latest progress reported by fn.
+
+        Returns: the BackgroundTask
+        """
+        task = BackgroundTask(name, on_done, on_error, on_progress)
+        task.future = self._executor.submit(self._run, fn, task)
+        self._tasks.append(task)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+        return task
+
+    def _run(self, fn, task):
+        """
+        Runs a task on its worker thread, unless it was cancelled before it
+        started. Intended for internal use only.
+        """
+        task.check_cancelled()
+        return fn(task)
+
+    def busy(self):
+        """
+        Returns whether any submitted tasks have not finished (or have not
+        had their results passed to the main loop yet).
+
+        Returns: True or False
+        """
+        return len(self._tasks) > 0
+
+    def cancel_all(self):
+        """
+        Asks every task which has not finished to stop.
+
+        Returns: None
+        """
+        for task in self._tasks:
+            task.cancel()
+
+    def _poll(self):
+        """
+        Passes the progress and results of the tasks to their callbacks, and
+        checks on them again after poll_interval if any are still running.
+        Runs on the main loop. Intended for internal use only.
+        """
+        try:
+            for task in list(self._tasks):
+                self._report(task)
+        finally:
+            # Keep checking on the other tasks, even if a callback failed
+            if len(self._tasks) > 0:
+                self.root.after(self.poll_interval, self._poll)
+            else:
+                self._polling = False
+
+    def _report(self, task):
+        """
+        Runs the functions the task asked to run on the main loop, passes its
+        latest progress to on_progress, and if it finished, its result to
+        on_done or its exception to on_error. Intended for internal use only.
+        """
+        task._run_calls()
+        progress = task._latest_progress()
+        if progress is not None and task.on_progress is not None:
+            task.on_progress(*progress)
+        if not task.future.done():
+            return
+        self._tasks.remove(task)
+        if task.future.cancelled():
+            error = TaskCancelled(task.name + " was cancelled.")
+        else:
+            error = task.future.exception()
+        if error is None:
+            if task.on_done is not None:
+                task.on_done(task.future.result())
+        elif task.on_error is not None:
+            task.on_error(error)
+        else:
+            raise error
+
+    def shutdown(self):
+        """
+        Cancels every task and stops the worker threads, waiting for the
+        running task to stop.
+
+        Returns: None
+        """
+        self.cancel_all()
+        self._executor.shutdown(wait=True, cancel_futures=True)
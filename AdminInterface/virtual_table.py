@@ -0,0 +1,403 @@
+"""
+===============================================================================
+Title:	Virtual Table for the Administrator Interface
+===============================================================================
+Description:	A wrapper around the tkinter Treeview tables of the
+                Administrator Interface which lets them show any number of
+                freedges without freezing the display.
+
+                Rather than inserting one Treeview item per freedge, the
+                table only ever holds the rows which are currently visible.
+                The rows are read from the FreedgeDatabase a page at a time,
+                along with a buffer of TABLE_ROW_BUFFER rows above and below
+                the visible ones, so that scrolling a short distance does not
+                read the database again. When the visible rows change, only
+                the items which differ are inserted, updated, moved, or
+                deleted. Each item's iid is the freedge_id of its freedge.
+
+                When only a few freedges change (such as after a caretaker
+                replies to a notification), update_rows() reads just those
+                freedges, and updates, inserts, or removes their rows in place.
+                Lists sorted by something other than the freedge_id give a
+                sort_key, so that a changed row can be moved to its new place.
+"""
+from bisect import bisect_left
+from tkinter import *
+from tkinter import ttk
+from InternalData.freedge_constants import TABLE_ROW_BUFFER
+
+
+class VirtualTable:
+    """
+    Shows a (possibly very long) list of freedges in a Treeview, a window of
+    rows at a time.
+
+    Attributes
+    ===========================================================================
+    table: Treeview
+        The tkinter Treeview the rows are shown in.
+
+    scrollbar: Scrollbar
+        The tkinter Scrollbar used to move through the whole list.
+
+    first: int
+        The position in the list of the first visible row.
+
+    total: int
+        The number of freedges in the list.
+
+    Methods
+    ===========================================================================
+    set_source(count_rows, fetch_rows, fetch_ids, sort_key)
+        Changes the list of freedges shown in the table.
+
+    refresh()
+        Re-reads the visible rows, keeping the current scroll position.
+
+    update_rows(freedge_ids)
+        Updates, inserts, or removes just the rows of the given freedges.
+
+    clear()
+        Removes every row from the table.
+
+    scroll_to(first)
+        Scrolls the table so that the row at position first is at the top.
+    """
+    def __init__(self, table: ttk.Treeview, buffer=TABLE_ROW_BUFFER):
+        """
+        Initializes a virtual table around an existing (empty) Treeview,
+        adding a scrollbar beside it.
+
+        Parameters:
+            table: the tkinter Treeview to show the rows in.
+            buffer: the number of rows above and below the visible ones to
+                    read ahead of time.
+        """
+        self.table = table
+        self.buffer = buffer
+        self.visible = int(table.cget('height'))  # Rows shown at once
+        self.first = 0
+        self.total = 0
+        self._count_rows = None     # Returns the number of rows in the list
+        self._fetch_rows = None     # Returns the rows in a range of the list
+        self._fetch_ids = None      # Returns the listed rows with given IDs
+        self._sort_key = None       # Returns a row's place in the list's order
+        self._rows = []             # The buffered Freedge objects
+        self._rows_start = 0        # The position of the first buffered row
+        self._shown = {}            # {iid: values} of the items in the table
+
+        # The scrollbar stands for the whole list, not just the shown rows
+        self.scrollbar = ttk.Scrollbar(table.master, orient=VERTICAL,
+                                       command=self._on_scrollbar)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
+        # Scrolling with the mouse wheel (Windows and macOS, then Linux)
+        table.bind('<MouseWheel>', self._on_mousewheel)
+        table.bind('<Button-4>', lambda event: self._scroll_by(-3))
+        table.bind('<Button-5>', lambda event: self._scroll_by(3))
+        # Moving past the first or last visible row with the keyboard
+        table.bind('<Up>', lambda event: self._on_key(-1))
+        table.bind('<Down>', lambda event: self._on_key(1))
+        table.bind('<Prior>', lambda event: self._scroll_by(-self.visible))
+        table.bind('<Next>', lambda event: self._scroll_by(self.visible))
+
+    def set_source(self, count_rows, fetch_rows, fetch_ids=None, sort_key=None):
+        """
+        Changes the list of freedges shown in the table, scrolling back to the
+        top of the list. If the table already shows the same list, it is
+        refreshed instead, keeping the current scroll position.
+
+        Parameters:
+            count_rows: a function of no arguments which returns the number of
+                        freedges in the list (e.g. FreedgeDatabase.count_freedges)
+            fetch_rows: a function of (offset, limit) which returns that range
+                        of the list (e.g. FreedgeDatabase.get_freedges_page)
+            fetch_ids: a function of a list of freedge_ids which returns a
+                       dict of {freedge_id: Freedge} for those of them in the
+                       list (e.g. FreedgeDatabase.get_freedges_by_id). Without
+                       it, update_rows() re-reads all of the visible rows.
+            sort_key: a function of a Freedge which returns a value that sorts
+                      in the same order as the list, or None if it cannot
+                      (e.g. FreedgeQuery.sort_key). Leave it as None if the
+                      list is in ascending order of freedge_id.
+
+        Returns: None
+        """
+        if (count_rows != self._count_rows or fetch_rows != self._fetch_rows):
+            self._count_rows = count_rows
+            self._fetch_rows = fetch_rows
+            self.first = 0
+        self._fetch_ids = fetch_ids
+        self._sort_key = sort_key
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-reads the number of freedges and the visible rows from the source,
+        keeping the current scroll position where possible. Only the items
+        which changed are updated in the table.
+
+        Returns: None
+        """
+        if self._count_rows is None:
+            return
+        self.total = self._count_rows()
+        self._rows = []             # Forget the buffered rows
+        self._render()
+
+    def clear(self):
+        """
+        Removes every row from the table, and forgets the source of the list.
+
+        Returns: None
+        """
+        self._count_rows = None
+        self._fetch_rows = None
+        self._fetch_ids = None
+        self._sort_key = None
+        self.first = 0
+        self.total = 0
+        self._rows = []
+        for iid in list(self._shown.keys()):
+            self.table.delete(iid)
+        self._shown = {}
+        self.scrollbar.set(0, 1)
+
+    def update_rows(self, freedge_ids):
+        """
+        Updates the table after the data of some freedges changed, without
+        reading the rest of the list again. The rows of the freedges which are
+        still in the list are updated, the rows of those which left the list
+        are removed, and rows are inserted for those which joined it. The
+        visible rows stay where they are, unless one of them was removed.
+
+        Only the buffered rows are known, so if a freedge before the buffer
+        joined or left the list, the visible rows are re-read instead. The
+        same happens in a list with a sort_key if a freedge outside the buffer
+        changed, since its old place in the list is not known.
+
+        Parameters:
+            freedge_ids: a list of the int freedge_ids which changed.
+
+        Returns: None
+        """
+        if self._count_rows is None:
+            return
+        if (self._fetch_ids is None or len(self._rows) == 0):
+            self.refresh()
+            return
+        if self._sort_key is not None:
+            self._update_sorted_rows(freedge_ids)
+            return
+        # The list is in order of freedge_id, and so is the buffer
+        ids = [f.freedge_id for f in self._rows]
+        starts_list = (self._rows_start == 0)
+        ends_list = (self._rows_start + len(self._rows) >= self.total)
+        inside = []         # Changed IDs whose place in the buffer is known
+        before = []         # Changed IDs before the start of the buffer
+        after = []          # Changed IDs after the end of the buffer
+        for fid in sorted(set(int(fid) for fid in freedge_ids)):
+            if (fid < ids[0] and not starts_list):
+                before.append(fid)
+            elif (fid > ids[-1] and not ends_list):
+                after.append(fid)
+            else:
+                inside.append(fid)
+
+        found = self._fetch_ids(inside) if len(inside) > 0 else {}
+        for fid in inside:
+            index = bisect_left(ids, fid)
+            listed = (index < len(ids) and ids[index] == fid)
+            position = self._rows_start + index
+            if (fid in found and listed):
+                self._rows[index] = found[fid]          # Update the row
+            elif fid in found:
+                self._rows.insert(index, found[fid])    # Insert a new row
+                ids.insert(index, fid)
+                self.total += 1
+                if (position < self.first):
+                    self.first += 1
+            elif listed:
+                del self._rows[index]                   # Remove the row
+                del ids[index]
+                self.total -= 1
+                if (position < self.first):
+                    self.first -= 1
+
+        if (len(before) > 0 or len(after) > 0):
+            # Only the number of rows outside the buffer may have changed
+            expected = self.total
+            self.total = self._count_rows()
+            if (len(before) > 0 and (self.total != expected
+                                     or len(before) + len(after) > 1)):
+                self._rows = []     # The buffered rows may have moved
+        self._render()
+
+    def _update_sorted_rows(self, freedge_ids):
+        """
+        Updates the table after the data of some freedges changed, in a list
+        sorted by its sort_key. Each changed row is taken out of the buffer,
+        and put back in the place its new sort key belongs.
+        """
+        changed = set(int(fid) for fid in freedge_ids)
+        keys = [self._sort_key(f) for f in self._rows]
+        buffered = set(f.freedge_id for f in self._rows)
+        if (any(key is None for key in keys) or not changed <= buffered):
+            self.refresh()
+            return
+        found = self._fetch_ids(sorted(changed))
+        new_keys = {fid: self._sort_key(f) for (fid, f) in found.items()}
+        if any(key is None for key in new_keys.values()):
+            self.refresh()
+            return
+        starts_list = (self._rows_start == 0)
+        ends_list = (self._rows_start + len(self._rows) >= self.total)
+        # Take the changed rows out of the buffer
+        for index in reversed(range(len(self._rows))):
+            if self._rows[index].freedge_id in changed:
+                del self._rows[index]
+                del keys[index]
+                self.total -= 1
+                if (self._rows_start + index < self.first):
+                    self.first -= 1
+        # Put back those still in the list, where they now belong
+        for (fid, key) in sorted(new_keys.items(), key=lambda item: item[1]):
+            index = bisect_left(keys, key)
+            self.total += 1
+            if (index == 0 and not starts_list):
+                self._rows_start += 1   # The row moved before the buffer
+                self.first += 1
+            elif (index == len(keys) and not ends_list):
+                pass                    # The row moved after the buffer
+            else:
+                self._rows.insert(index, found[fid])
+                keys.insert(index, key)
+                if (self._rows_start + index < self.first):
+                    self.first += 1
+        if len(self._rows) == 0:
+            self.refresh()
+            return
+        self._render()
+
+    def scroll_to(self, first):
+        """
+        Scrolls the table so that the row at the given position in the list is
+        the first visible row.
+
+        Parameters:
+            first: the int position of the row to show at the top.
+
+        Returns: None
+        """
+        last_first = max(0, self.total - self.visible)
+        first = min(max(0, int(first)), last_first)
+        if (first != self.first):
+            self.first = first
+            self._render()
+
+    def _scroll_by(self, rows):
+        """
+        Scrolls the table by a number of rows (negative to scroll up).
+        """
+        self.scroll_to(self.first + rows)
+        return 'break'      # Stop the Treeview from scrolling itself
+
+    def _on_mousewheel(self, event):
+        """
+        Scrolls the table when the mouse wheel is turned.
+        """
+        # Each notch of the wheel is a delta of 120 on Windows, and 1 on macOS
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._scroll_by(-3 * notches)
+
+    def _on_key(self, step):
+        """
+        Moves the selection up or down a row, scrolling the table if the
+        selection would move past the first or last visible row.
+        """
+        selection = self.table.selection()
+        if len(selection) == 0:
+            return None     # Let the Treeview handle the key as usual
+        children = self.table.get_children()
+        index = children.index(selection[0]) + step
+        if 0 <= index < len(children):
+            return None     # The next row is already visible
+        position = self.first + index
+        if not 0 <= position < self.total:
+            return 'break'  # There are no more rows in that direction
+        self._scroll_by(step)
+        row = self._rows[position - self._rows_start]
+        iid = str(row.freedge_id)
+        self.table.selection_set(iid)
+        self.table.focus(iid)
+        return 'break'
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        """
+        Scrolls the table when the scrollbar is dragged or clicked.
+        """
+        if action == 'moveto':
+            self.scroll_to(round(float(amount) * self.total))
+        elif action == 'scroll':
+            step = self.visible if unit == 'pages' else 1
+            self._scroll_by(int(amount) * step)
+
+    def _window(self):
+        """
+        Returns the Freedge objects of the visible rows, reading them (and the
+        buffer around them) from the source if they are not buffered.
+        """
+        end = min(self.first + self.visible, self.total)
+        buffered_end = self._rows_start + len(self._rows)
+        if (self.first < self._rows_start or end > buffered_end
+                or len(self._rows) == 0):
+            self._rows_start = max(0, self.first - self.buffer)
+            limit = (end - self._rows_start) + self.buffer
+            self._rows = self._fetch_rows(self._rows_start, limit)
+        return self._rows[self.first - self._rows_start:end - self._rows_start]
+
+    def _render(self):
+        """
+        Updates the items in the table to match the visible rows, changing
+        only the items which differ.
+        """
+        last_first = max(0, self.total - self.visible)
+        self.first = min(self.first, last_first)
+        rows = self._window() if self.total > 0 else []
+        wanted = {}
+        for f in rows:
+            wanted[str(f.freedge_id)] = row_values(f)
+        # Delete the items which are no longer visible
+        for iid in list(self._shown.keys()):
+            if iid not in wanted:
+                self.table.delete(iid)
+                del self._shown[iid]
+        # Insert, update, and reorder the rest
+        for (index, (iid, values)) in enumerate(wanted.items()):
+            if iid not in self._shown:
+                self.table.insert(parent='', index=index, iid=iid, text='',
+                                  values=values)
+            else:
+                if self._shown[iid] != values:
+                    self.table.item(iid, values=values)
+                if self.table.index(iid) != index:
+                    self.table.move(iid, '', index)
+            self._shown[iid] = values
+        # Update the scrollbar to reflect the part of the list which is shown
+        if self.total > 0:
+            self.scrollbar.set(self.first / self.total,
+                               (self.first + len(rows)) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+
+def row_values(f):
+    """
+    Builds the values shown in each column of a table for a freedge.
+
+    Parameters:
+        f: a Freedge object
+
+    Returns: a tuple of the values, in the order of the table's columns
+    """
+    return (f.freedge_id, f.project_name, f.fridge_location.ShortString(),
+            f.caretaker_name, f.freedge_status.value, f.last_status_update)
@@ -1,5 +1,8 @@
 # Init.py
-from .freedge_database import load_internal_database, exists_internal_database, new_database_from_csv
-from .caretaker_info_parser import parse_freedge_data_file
+from .freedge_database import load_internal_database, exists_internal_database, new_database_from_csv, new_database_from_csvs, restore_previous_database
+from .csv_import import ImportStats, CSVImport
+from .database_diff import ChangeType, ChangeRecord, DatabaseDiff
+from .freedge_query import FreedgeQuery, SORT_COLUMNS
+from .caretaker_info_parser import parse_freedge_data_file, iter_freedge_data_file, ImportPlan, CSVHeaderError
 from .freedge_data_entry import Status, Freedge, FreedgeAddress, ContactMethod
 from InternalData.freedge_constants import *
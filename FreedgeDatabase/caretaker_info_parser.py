@@ -8,7 +8,9 @@ Description:	Read in data from a csv file, input by the user. Parser
 		the freedge database from the csv file. 
 
 		Parser works under the assumption that file has been pre-validated
-		by a Freedge Administrator and follows a consistent format.
+		by a Freedge Administrator and follows a consistent format. The
+		header row is checked for the required columns before any data
+		is read, so that a file in the wrong format is rejected at once.
 				
 Authors: 	Madison Werries, Ginni Gallagher
 Last Edited: 	3-6-2022
@@ -24,8 +26,9 @@ date		editor		changes
 """
 
 import csv
-from datetime import date
-from FreedgeDatabase.freedge_data_entry import Status
+from itertools import islice
+from operator import itemgetter
+from FreedgeDatabase.csv_normalizer import normalize_date, normalize_statuses
 from InternalData.freedge_constants import *
 
 def remove_whitespace(field_name):
@@ -45,7 +48,7 @@ def _get_headers():
 
 	Parameters: None
 
-	Calls: Called by _parse_row(data_entry); intended for internal use only.
+	Calls: Called by ImportPlan(header_row); intended for internal use only.
 
 	Returns: headers -> a list of strings to define each column header
 	"""
@@ -62,6 +65,11 @@ def _get_headers():
 	]
 	return headers
 
+# The positions of the status and the permission to contact within the list
+# returned by _get_headers()
+_STATUS_INDEX = _get_headers().index(ACTIVE_STATUS_KEY)
+_PERMISSION_INDEX = _get_headers().index(PERMISSION_TO_CONTACT_KEY)
+
 def _get_address_format():
 	"""
 	Sets the format of addresses required of the csv file
@@ -69,7 +77,7 @@ def _get_address_format():
 
 	Parameters: None
 
-	Calls: Called by _parse_address(entry_data); intended for internal use only.
+	Calls: Called by ImportPlan(header_row); intended for internal use only.
 
 	Returns: headers -> a list of strings to define each address column header
 	"""
@@ -95,86 +103,209 @@ def _parse_field(data):
 		return None
 	return data
 
-def _parse_address(entry_data):
+class CSVHeaderError(ValueError):
+	"""
+	Raised when the header row of a csv file is missing any of the columns
+	defined in freedge_constants.py. This is raised before any of the rows of
+	the file are read, so nothing is written to the database.
+
+	Attributes
+	-----------
+	filename -> a string of the name of the csv file, or None
+	missing -> a tuple of the strings of the missing column headers
+	"""
+	def __init__(self, filename, missing):
+		"""
+		Initializes a new header error. The arguments are passed on to
+		ValueError, so that the error can be sent between processes.
+		"""
+		super().__init__(filename, tuple(missing))
+		self.filename = filename
+		self.missing = tuple(missing)
+
+	def __str__(self):
+		"""
+		Returns a message listing the missing column headers.
+		"""
+		name = "The csv file" if self.filename is None else "The csv file '" + str(self.filename) + "'"
+		if (len(self.missing) == len(_get_headers()) + len(_get_address_format())):
+			# None of the expected columns were found
+			return name + " is empty or has no header row."
+		return name + " is missing the columns: " + ", ".join(self.missing)
+
+# The converter applied to each value of a column which is not stored exactly
+# as it appears in the csv file, by column header. Every other column (apart
+# from the status, which depends on the permission to contact) is copied.
+_COLUMN_CONVERTERS = {
+	DATE_INSTALLED_KEY: normalize_date
+}
+
+class ImportPlan:
 	"""
-	Generates a list containing address data for each freedge.
+	A plan for reading the rows of a csv file, compiled once from its header
+	row. The header row is checked for every required column before any row
+	is read, and the position of each column is found ahead of time so that
+	each row is read by index rather than being converted into a dict.
 
-	Parameters: entry_data -> a row (list of strings) from csv file
+	Attributes
+	-----------
+	width -> the int number of columns in the header row
 
-	Calls: Called by parse_freedge_data_file(filename) to organize address data
+	Methods
+	--------
+	from_file(filename): Compiles the plan for a csv file from its header row
 
-	Returns: parsed -> a list of strings containing the parsed address data fields
+	parse_batch(rows): Returns the (general data, address) of each of a batch of rows
+
+	parse(entry_data): Returns the (general data, address) of a single row
+	"""
+	def __init__(self, header_row, filename=None):
+		"""
+		Compiles the plan for a csv file.
+
+		Parameters:
+			header_row -> the list of strings in the first row of the csv
+						  file, or None if the file is empty
+			filename -> the name of the csv file, used in error messages
+
+		Raises: CSVHeaderError if any of the required columns are missing
+		"""
+		if header_row is None:
+			header_row = []
+		positions = {}
+		for i in range(len(header_row)):
+			# As with csv.DictReader, the last column with a given name is used
+			positions[header_row[i]] = i
+		for i in range(len(header_row)):
+			# Allow for stray whitespace around the headers themselves
+			positions.setdefault(header_row[i].strip(), i)
+
+		headers = _get_headers()
+		address_headers = _get_address_format()
+		missing = [h for h in headers + address_headers if h not in positions]
+		if (len(missing) > 0):
+			raise CSVHeaderError(filename, missing)
+
+		self.width = len(header_row)
+		# itemgetters pick all of the fields out of a row in a single call
+		self._general_fields = itemgetter(*[positions[h] for h in headers])
+		self._address_fields = itemgetter(*[positions[h] for h in address_headers])
+		# Only the columns which need converting are visited for each batch
+		self._converters = tuple((i, _COLUMN_CONVERTERS[headers[i]])
+								 for i in range(len(headers))
+								 if headers[i] in _COLUMN_CONVERTERS)
+
+	@classmethod
+	def from_file(cls, filename):
+		"""
+		Compiles the plan for a csv file, reading only its header row.
+
+		Parameters: filename -> a string defining the name of the csv file
+
+		Returns: an ImportPlan
+
+		Raises: CSVHeaderError if any of the required columns are missing
+		"""
+		# Only the header row is checked, so text which cannot be decoded
+		# further into the file is left for the import itself to reject
+		with open(filename, newline='', errors='replace') as csvfile:
+			return cls(next(csv.reader(csvfile), None), filename)
+
+	def parse_batch(self, rows):
+		"""
+		Generates the general data and address of a freedge from each of a
+		batch of rows of the csv file. The batch is normalized a column at a
+		time (see csv_normalizer.py), rather than row by row.
+
+		Parameters: rows -> a list of rows (lists of strings) from the csv file
+
+		Returns: a list of (general data, address) tuples, one per row, where
+				 the general data is ordered as _get_headers() followed by the
+				 last update, and the address is ordered as _get_address_format()
+		"""
+		if (len(rows) == 0):
+			return []
+		width = self.width
+		# Missing fields at the end of a row are read as empty
+		rows = [row if len(row) >= width else row + [""] * (width - len(row))
+				for row in rows]
+		columns = list(zip(*map(self._general_fields, rows)))
+		for (i, convert) in self._converters:
+			columns[i] = list(map(convert, columns[i]))
+		(columns[_STATUS_INDEX], last_updates) = normalize_statuses(
+			columns[_STATUS_INDEX], columns[_PERMISSION_INDEX])
+		# Each row's last_update value is appended to its parsed fields
+		general = map(list, zip(*columns, last_updates))
+		addresses = map(list, map(self._address_fields, rows))
+		return list(zip(general, addresses))
+
+	def parse(self, entry_data):
+		"""
+		Generates the general data and address of a freedge from a single row
+		of the csv file.
+
+		Parameters: entry_data -> a row (list of strings) from the csv file
+
+		Returns: a (general data, address) tuple, as from parse_batch()
+		"""
+		return self.parse_batch([entry_data])[0]
+
+def iter_freedge_data_file(filename):
 	"""
-	parsed = []
-	headers = _get_address_format()
+	Lazily reads in freedge information from a comma-separated csv file,
+	yielding the parsed rows as they are read. The rows are parsed in batches
+	of IMPORT_BATCH_SIZE, and only a single batch of the file is held in
+	memory at a time, so this may be fed straight into the database for files
+	of any size.
 
-	# converts fields of datatype None to a string if needed
-	# add all data to the list to be returned
-	for header in headers:
-		field = entry_data[header]
-		if field is None:
-			parsed.append("")
-		else:
-			parsed.append(entry_data[header])
-	return parsed
+	The header row is read and checked straight away, so a file which is
+	missing any of the required columns is rejected before any of its rows
+	are used.
 
-def _parse_row(entry_data):
-	""" 
-	Generates a list containing general data for each freedge.
+	Parameter: filename -> a string defining the name of the csv file to be opened
 
-	Parameters: entry_data -> a row (list of strings) from csv file
+	Calls:
+		Called by:
+			freedge_database.new_database_from_csv() -> loads data from csv file into
+			database
+			parse_freedge_data_file() -> reads in the whole file at once
 
-	Calls: Called by parse_freedge_data_file(filename) to organize genearl freedge data
-	
-	Returns: parsed -> a list of values containing the parsed freedge data fields
-	"""
-	parsed = []
-	headers = _get_headers()
-
-	# converts fields of datatype None to a string if needed
-	# add all data to the list to be returned
-	status_index = -1
-	for i in range(len(headers)):
-		header = headers[i]
-		if (header == ACTIVE_STATUS_KEY):
-			status_index = i
-		field = entry_data[header]
-		if field is None:
-			parsed.append("")
-		else:
-			parsed.append(entry_data[header])
-	
-	status_str = parsed[status_index].strip().upper()
-	status_given = len(status_str) != 0
-	permission_str = entry_data[PERMISSION_TO_CONTACT_KEY].strip()
-	permission_resp_given = len(permission_str) != 0
-	
-	# If the csv file was filled out to include a status for the freedge
-	if (status_given):
-		# If there is a status in the csv file, then the most recent status
-		# updated happened just now during the creation of the new database
-		last_update = date.today().isoformat()  # Set last update to today
-		if (status_str == 'YES'):
-			parsed[status_index] = Status.Active.value
-		elif (status_str == 'NO'):
-			parsed[status_index] = Status.ConfirmedInactive.value
-		else:
-			parsed[status_index] = Status.Unknown.value
-	else:
-		# If no status was provided, check if the caretaker gave a response for
-		# whether or not they agree to be contacted/notified via SMS or text
-		if (permission_resp_given):
-			# If they responded to that part of the form, assume their
-			# freedge is active for the time being
-			parsed[status_index] = Status.Active.value
-			# Set the last update to today, since we are adding a new entry to
-			# the database and we're updating the status of the new entry
-			last_update = date.today().isoformat()
-		else:
-			last_update = "NULL"
-	# Append the last_update value to the list of parsed fields
-	parsed.append(last_update)
-	return parsed
+	Returns: an iterator of tuples of lists of strings containing the general
+			 and address data for each freedge database entry
+
+	Raises: CSVHeaderError if any of the required columns are missing
+	"""
+	csvfile = open(filename, newline='')
+	try:
+		info_reader = csv.reader(csvfile)
+		plan = ImportPlan(next(info_reader, None), filename)
+	except:
+		csvfile.close()
+		raise
+	return _iter_rows(csvfile, info_reader, plan)
+
+def _iter_rows(csvfile, info_reader, plan):
+	"""
+	Yields the parsed rows of an open csv file whose header row has already
+	been read. The file is closed once every row has been read.
+
+	Parameters:
+		csvfile -> the open csv file
+		info_reader -> the csv.reader of the file
+		plan -> the ImportPlan compiled from the file's header row
+
+	Calls: Called by iter_freedge_data_file(filename); intended for internal use only.
+
+	Returns: (yields) a (general data, address) tuple for each row
+	"""
+	with csvfile:
+		# Skip blank lines, as csv.DictReader does
+		row_data = filter(None, info_reader)
+		while True:
+			batch = list(islice(row_data, IMPORT_BATCH_SIZE))
+			if (len(batch) == 0):
+				return
+			yield from plan.parse_batch(batch)
 
 def parse_freedge_data_file(filename):
 	"""
@@ -186,29 +317,9 @@ def parse_freedge_data_file(filename):
 		Called by:
 			freedge_database.compare_databases -> loads a new csv file and compares to 
 			state of current database
-			freedge_database.new_database_from_csv() -> loads data from csv file into
-			database
 
 	Returns: freedge_database_entries -> a list of lists of strings containing all general and 
 			address data for each freedge database entry
 	
 	"""
-	freedge_database_entries = []
-	
-	with open(filename, newline='') as csvfile:
-
-		# DictReader is built-in python method to map data from each file row
-		# to a specific fieldname
-		info_reader = csv.DictReader(csvfile)
-
-		# ensures file is not empty
-		if(info_reader.line_num == 0):
-			EOFError("The csv file is empty.")
-
-		# for each row of data, parse general info and addresses differently
-		# then add parsed data to freedge entries list
-		for row_data in info_reader:
-			general_data = _parse_row(row_data)
-			address = _parse_address(row_data)
-			freedge_database_entries.append((general_data, address))
-		return freedge_database_entries
+	return list(iter_freedge_data_file(filename))
@@ -0,0 +1,195 @@
+"""
+===============================================================================
+Title:	Connection Manager for the Freedge Database
+===============================================================================
+Description:	Owns the SQLite connections used by a FreedgeDatabase. Rather
+		than opening a brand new connection for every database
+		operation, each thread is given a single pooled connection which
+		is opened once, configured with the PRAGMAs defined in
+		freedge_constants.py, and reused until close() is called.
+
+		Connections are opened in autocommit mode, so writes are grouped
+		together explicitly by using transaction() as a context manager.
+
+		When a database is rebuilt, a new file is moved into place over the
+		old one. A connection keeps reading the file it was opened on, so
+		each connection is replaced with a fresh one the next time it is
+		requested (outside of a transaction) after the file was replaced.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from InternalData.freedge_constants import *
+
+class ConnectionManager:
+	"""
+	A thread-local pool of SQLite connections to a single database file.
+
+	Attributes
+	-----------
+	db_location -> a string of the location of the database file
+
+	Methods
+	--------
+	connection(): Returns the calling thread's connection, opening it if needed
+
+	data_version(): Returns a value which changes when another connection
+					changes the database
+
+	transaction(): A context manager which runs the enclosed statements in
+					a single transaction, committing or rolling back at the end
+
+	close(): Closes every connection opened by the manager
+	"""
+	def __init__(self, db_location):
+		"""
+		Initializes a connection manager for the database at db_location.
+		No connection is opened until one is first requested.
+
+		Parameters: db_location -> string defining location of file.
+
+		Returns: None
+		"""
+		self.db_location = db_location
+		self._local = threading.local()		# Each thread's own connection
+		self._lock = threading.Lock()		# Guards the list of connections
+		self._connections = []				# Every connection opened so far
+		# Counts the changes to the database seen through PRAGMA data_version,
+		# which is shared so that every thread agrees on the data's version
+		self._version = 0
+
+	def _configure(self, conn):
+		"""
+		Applies the PRAGMAs defined in freedge_constants.py to a newly opened
+		connection.
+
+		Parameters: conn -> the sqlite3 Connection to configure.
+
+		Returns: None
+		"""
+		conn.execute("PRAGMA journal_mode = " + SQLITE_JOURNAL_MODE)
+		conn.execute("PRAGMA synchronous = " + SQLITE_SYNCHRONOUS)
+		conn.execute("PRAGMA cache_size = " + str(SQLITE_CACHE_SIZE))
+		conn.execute("PRAGMA mmap_size = " + str(SQLITE_MMAP_SIZE))
+
+	def connection(self):
+		"""
+		Returns the pooled connection belonging to the calling thread,
+		opening and configuring a new one the first time it is requested.
+
+		Parameters: None
+
+		Returns: An SQLite Connection object linked to the database.
+		"""
+		conn = getattr(self._local, "conn", None)
+		if (conn is not None and not conn.in_transaction
+				and self._file_id() != self._local.file_id):
+			# The database file was replaced since the connection was opened
+			self._discard(conn)
+			conn = None
+		if conn is None:
+			# isolation_level=None leaves the connection in autocommit mode;
+			# transactions are started explicitly by transaction()
+			conn = sqlite3.connect(self.db_location, isolation_level=None,
+								   check_same_thread=False)
+			self._configure(conn)
+			self._local.conn = conn
+			self._local.file_id = self._file_id()
+			self._local.seen_version = None		# Not checked on this connection
+			with self._lock:
+				self._connections.append(conn)
+		return conn
+
+	def _file_id(self):
+		"""
+		Identifies the file currently at db_location, which changes whenever
+		another file is moved into its place.
+
+		Parameters: None
+
+		Returns: a (device, inode) tuple, or None if there is no file
+		"""
+		try:
+			info = os.stat(self.db_location)
+		except OSError:
+			return None
+		return (info.st_dev, info.st_ino)
+
+	def _discard(self, conn):
+		"""
+		Closes one of the manager's connections and forgets it.
+
+		Parameters: conn -> the sqlite3 Connection to close.
+
+		Returns: None
+		"""
+		with self._lock:
+			if conn in self._connections:
+				self._connections.remove(conn)
+		conn.close()
+		self._local.conn = None
+
+	def data_version(self):
+		"""
+		Returns a value which changes whenever a connection other than the
+		calling thread's (possibly in another process) commits a change to the
+		database, or the database file is replaced. The value is shared by
+		every thread, so a value returned on one thread can be compared with
+		one returned on another.
+
+		Parameters: None
+
+		Returns: a hashable value
+		"""
+		conn = self.connection()
+		# PRAGMA data_version only checks the file's header, so it is cheap.
+		# Its value differs between connections, so each thread only uses it
+		# to tell whether the data changed since the thread last checked.
+		version = conn.execute("PRAGMA data_version").fetchone()[0]
+		with self._lock:
+			if (self._local.seen_version is not None
+					and version != self._local.seen_version):
+				self._version += 1
+			self._local.seen_version = version
+			return (self._local.file_id, self._version)
+
+	@contextmanager
+	def transaction(self):
+		"""
+		A context manager which wraps the enclosed statements in a single
+		transaction. The transaction is committed if the block finishes, and
+		rolled back if an exception is raised. If the calling thread is
+		already inside a transaction, the block simply joins it.
+
+		Parameters: None
+
+		Returns: (yields) the calling thread's SQLite Connection object.
+		"""
+		conn = self.connection()
+		if conn.in_transaction:
+			# Nested use; the outermost transaction decides whether to commit
+			yield conn
+			return
+		conn.execute("BEGIN")
+		try:
+			yield conn
+		except BaseException:
+			conn.rollback()
+			raise
+		conn.commit()
+
+	def close(self):
+		"""
+		Closes every connection opened by the manager. Any thread which uses
+		the manager afterwards is given a fresh connection.
+
+		Parameters: None
+
+		Returns: None
+		"""
+		with self._lock:
+			for conn in self._connections:
+				conn.close()
+			self._connections = []
+			self._local = threading.local()
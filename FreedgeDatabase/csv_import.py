@@ -0,0 +1,418 @@
+"""
+===============================================================================
+Title:	Resumable CSV Import for the Freedge Database
+===============================================================================
+Description:	Imports a csv file into a freedge database a batch at a time.
+
+		Rows which cannot be imported (for example, rows which are not
+		valid csv, or which have no project name) do not stop the import.
+		Instead, they are written to the 'rejected_rows' table along with
+		the reason each was rejected, so that they can be fixed later.
+
+		Each batch is committed together with a checkpoint in the
+		'import_progress' table, which records the byte offset in the csv
+		file just past the last row of the batch. If the import is
+		interrupted, running it again on the same database resumes from
+		the last committed batch, as long as the csv file is unchanged.
+"""
+import csv
+import io
+import os
+import time
+from itertools import islice
+from InternalData.freedge_constants import *
+from FreedgeDatabase import database_schema as schema
+from FreedgeDatabase.caretaker_info_parser import (ImportPlan, CSVHeaderError,
+												   _get_headers, _get_address_format)
+
+class ImportStats:
+	"""
+	Statistics collected while importing csv data into the database.
+
+	Attributes
+	-----------
+	rows_read -> the number of parsed csv rows which were read in
+	rows_inserted -> the number of freedges which were inserted into the database
+	rows_rejected -> the number of csv rows which could not be inserted
+	elapsed -> the number of seconds the import took
+	resumed -> whether the import continued one which had been interrupted
+
+	Methods
+	--------
+	rows_per_second(): Returns the import throughput in rows per second
+	"""
+	def __init__(self):
+		"""
+		Initializes an empty set of import statistics.
+		"""
+		self.rows_read = 0
+		self.rows_inserted = 0
+		self.rows_rejected = 0
+		self.elapsed = 0.0
+		self.resumed = False
+
+	def rows_per_second(self):
+		"""
+		Returns the number of csv rows read per second during the import.
+
+		Parameters: None
+
+		Returns: a float, or 0.0 if no time has elapsed
+		"""
+		if (self.elapsed <= 0):
+			return 0.0
+		return self.rows_read / self.elapsed
+
+	def ToString(self):
+		"""
+		Converts the import statistics into a single-line summary string.
+
+		Parameters: None
+
+		Returns: ret -> a formatted string
+		"""
+		ret = str(self.rows_inserted) + " rows imported, "
+		ret += str(self.rows_rejected) + " rows rejected in "
+		ret += "%.3f" % self.elapsed + "s (%.0f rows/sec)" % self.rows_per_second()
+		if (self.resumed):
+			ret += ", resuming an interrupted import"
+		return ret
+
+class CSVRecordReader:
+	"""
+	Reads the records of a csv file starting from a byte offset, keeping
+	track of the offset and line number just past the last record read.
+
+	Attributes
+	-----------
+	filename -> a string of the name of the csv file
+	offset -> the int byte offset just past the last record read
+	line_number -> the int number of lines read, counting from the start of
+				   the file
+
+	Methods
+	--------
+	__iter__(): Yields a (line number, row, reason, raw text) tuple per record
+	"""
+	def __init__(self, filename, offset=0, line_number=0):
+		"""
+		Initializes a reader for the csv file, starting at the given offset,
+		which must be the start of a record.
+		"""
+		self.filename = filename
+		self.offset = offset
+		self.line_number = line_number
+		self._record_lines = []		# The lines of the record being read
+		self._bad_encoding = False	# Whether the record is not valid UTF-8
+
+	def _lines(self, csvfile):
+		"""
+		Yields each line of the csv file as text, counting the bytes and lines
+		read. Intended for internal use only.
+		"""
+		for raw_line in csvfile:
+			self.offset += len(raw_line)
+			self.line_number += 1
+			try:
+				line = raw_line.decode("utf-8")
+			except UnicodeDecodeError:
+				line = raw_line.decode("utf-8", errors="replace")
+				self._bad_encoding = True
+			if (self.line_number == 1 and line.startswith("\ufeff")):
+				line = line[1:]		# Ignore the byte order mark of the file
+			self._record_lines.append(line)
+			yield line
+
+	def __iter__(self):
+		"""
+		Yields each record of the csv file as a tuple of
+		(line number, row, reason, raw text). Records which could be read
+		have a row (a list of strings) and no reason; records which could not
+		have a reason string and the raw text of the lines they span instead.
+		"""
+		with open(self.filename, "rb") as csvfile:
+			csvfile.seek(self.offset)
+			reader = csv.reader(self._lines(csvfile))
+			while True:
+				line_number = self.line_number + 1
+				self._record_lines = []
+				self._bad_encoding = False
+				try:
+					row = next(reader)
+				except StopIteration:
+					return
+				except csv.Error as e:
+					yield (line_number, None, "Malformed csv: " + str(e),
+						   "".join(self._record_lines))
+					continue
+				if (self._bad_encoding):
+					yield (line_number, None, "The row is not valid UTF-8 text",
+						   "".join(self._record_lines))
+					continue
+				yield (line_number, row, None, None)
+
+def format_row(fields):
+	"""
+	Formats a list of fields as a single line of csv text, for recording a
+	rejected row whose original text was not kept.
+
+	Parameters: fields -> a list of strings
+
+	Returns: a str
+	"""
+	text = io.StringIO()
+	csv.writer(text, lineterminator="").writerow(fields)
+	return text.getvalue()
+
+class ImportValidator:
+	"""
+	Decides which parsed csv rows are inserted into the database and which
+	are rejected. Every import uses one, so that they all follow the same
+	rules: a row is rejected if it does not have the expected number of
+	fields, or if it has no project name. More than one freedge may have the
+	same project name, so rows which share a name are all inserted.
+
+	Attributes
+	-----------
+	source -> a string of the path of the csv file the rows are read from,
+			  or None if they do not all come from a single file
+	next_id -> the int ID to give the next freedge inserted
+
+	Methods
+	--------
+	reject(line_number, reason, raw): Returns a row for the rejected_rows table
+
+	validate(rows): Splits a batch of parsed rows into the rows to insert and
+					the rows to reject
+	"""
+	# The number of fields of the parsed freedge data (the general fields,
+	# followed by the last update) and of the parsed address
+	FREEDGE_FIELDS = len(_get_headers()) + 1
+	ADDRESS_FIELDS = len(_get_address_format())
+
+	def __init__(self, conn, source=None):
+		"""
+		Initializes a validator for rows to be inserted using the connection
+		conn, which must be at the current schema version.
+		"""
+		self.source = source
+		# Since the freedge IDs cannot be read back from an executemany call,
+		# assign them here so that each address can be linked to its freedge
+		self.next_id = conn.execute(
+			"SELECT COALESCE(MAX(freedge_id), 0) FROM freedges").fetchone()[0] + 1
+
+	def reject(self, line_number, reason, raw):
+		"""
+		Builds the row of the rejected_rows table for a rejected csv row.
+
+		Parameters:
+			line_number -> the int line the row starts on, or None if unknown
+			reason -> a string of why the row was rejected
+			raw -> a string of the text of the row
+
+		Returns: a tuple for SQL_INSERT_REJECTED_ROW
+		"""
+		return (self.source, line_number, reason, raw)
+
+	def validate(self, rows):
+		"""
+		Splits a batch of parsed rows into the rows to insert and the rows to
+		reject, giving each row to insert the next freedge ID.
+
+		Parameters: rows -> an iterable of (line number, csv fields,
+				freedge_data, address_data) tuples. The line number and csv
+				fields are None for rows which were not read straight from
+				the csv file, in which case the text of a rejected row is
+				rebuilt from its parsed data.
+
+		Returns: a tuple of (freedge rows, address rows, rejected rows), to be
+				 inserted using SQL_INSERT_FREEDGE, SQL_INSERT_ADDRESS, and
+				 SQL_INSERT_REJECTED_ROW
+		"""
+		freedge_rows = []
+		address_rows = []
+		rejected = []
+		for (line_number, fields, freedge_data, address_data) in rows:
+			if (len(freedge_data) != self.FREEDGE_FIELDS
+					or len(address_data) != self.ADDRESS_FIELDS):
+				reason = "The row does not have the expected number of fields"
+			elif (not freedge_data[0] or not freedge_data[0].strip()):
+				reason = "The row has no project name"
+			else:
+				freedge_rows.append([self.next_id] + list(freedge_data))
+				address_rows.append([self.next_id] + list(address_data))
+				self.next_id += 1
+				continue
+			if fields is None:
+				fields = [str(v) for v in list(freedge_data) + list(address_data)]
+			rejected.append(self.reject(line_number, reason, format_row(fields)))
+		return (freedge_rows, address_rows, rejected)
+
+class CSVImport:
+	"""
+	The import of a single csv file into a FreedgeDatabase, which may be
+	resumed if it is interrupted.
+
+	Attributes
+	-----------
+	fdb -> the FreedgeDatabase the csv file is imported into
+	csv_file_path -> a string of the path of the csv file
+	batch_size -> the int number of csv rows to import in each transaction
+
+	Methods
+	--------
+	progress(): Returns the saved progress of the import, if any
+
+	can_resume(): Returns whether an interrupted import can be resumed
+
+	run(progress): Imports the rest of the csv file, returning an ImportStats
+				   object
+	"""
+	def __init__(self, fdb, csv_file_path, batch_size=IMPORT_BATCH_SIZE):
+		"""
+		Initializes the import of csv_file_path into fdb, whose tables must
+		already be at the current schema version.
+		"""
+		if (batch_size < 1):
+			raise ValueError("The import batch size must be at least 1.")
+		self.fdb = fdb
+		self.csv_file_path = csv_file_path
+		self.batch_size = batch_size
+		# The name the progress of the import is saved under
+		self._source = os.path.abspath(csv_file_path)
+
+	def _source_identity(self):
+		"""
+		Returns the (size, modification time) of the csv file, which are used
+		to tell whether it changed since the import was interrupted.
+		"""
+		info = os.stat(self.csv_file_path)
+		return (info.st_size, info.st_mtime_ns)
+
+	def progress(self):
+		"""
+		Returns the saved progress of importing the csv file.
+
+		Parameters: None
+
+		Returns: a dict of the import_progress columns, or None if the file
+				 has not been imported into this database
+		"""
+		cur = self.fdb.open_connection().execute(
+			"SELECT * FROM import_progress WHERE source_file = ?", (self._source,))
+		row = cur.fetchone()
+		if row is None:
+			return None
+		return dict(zip([d[0] for d in cur.description], row))
+
+	def can_resume(self):
+		"""
+		Returns whether an earlier import of the same, unchanged csv file was
+		interrupted, so that run() will continue it.
+
+		Parameters: None
+
+		Returns: True or False
+		"""
+		progress = self.progress()
+		return (progress is not None and not progress["completed"]
+				and (progress["source_size"], progress["source_mtime"]) == self._source_identity())
+
+	def _save_progress(self, conn, reader, stats, completed):
+		"""
+		Records how far the import has got. Intended for internal use only.
+		"""
+		(size, mtime) = self._source_identity()
+		conn.execute(
+			"""INSERT OR REPLACE INTO import_progress(source_file, source_size,
+					source_mtime, byte_offset, line_number, rows_read,
+					rows_inserted, rows_rejected, completed)
+				VALUES(?,?,?,?,?,?,?,?,?)""",
+			(self._source, size, mtime, reader.offset, reader.line_number,
+			 stats.rows_read, stats.rows_inserted, stats.rows_rejected,
+			 1 if completed else 0))
+
+	def _read_plan(self):
+		"""
+		Reads the header row of the csv file and compiles its ImportPlan.
+
+		Returns: a tuple of (ImportPlan, CSVRecordReader positioned just past
+				 the header row)
+
+		Raises: CSVHeaderError if any of the required columns are missing
+		"""
+		reader = CSVRecordReader(self.csv_file_path)
+		records = iter(reader)
+		header = next(records, None)
+		records.close()
+		if header is None or header[1] is None:
+			raise CSVHeaderError(self.csv_file_path, _get_headers() + _get_address_format())
+		return (ImportPlan(header[1], self.csv_file_path), reader)
+
+	def run(self, progress=None):
+		"""
+		Imports the csv file into the database, one batch at a time. If an
+		earlier import of the file was interrupted, only the rest of the file
+		is imported.
+
+		Parameters:
+			progress -> an optional function of (ImportStats, fraction of the
+						file imported), called after each batch is committed.
+						If it raises an exception, the import stops there and
+						can be resumed later.
+
+		Returns: stats -> an ImportStats object describing the whole import,
+				 including any part of it done before an interruption
+
+		Raises: CSVHeaderError if any of the required columns are missing
+		"""
+		start = time.perf_counter()
+		(plan, reader) = self._read_plan()
+		file_size = max(self._source_identity()[0], 1)
+		stats = ImportStats()
+		if self.can_resume():
+			saved = self.progress()
+			reader = CSVRecordReader(self.csv_file_path, saved["byte_offset"],
+									 saved["line_number"])
+			stats.rows_read = saved["rows_read"]
+			stats.rows_inserted = saved["rows_inserted"]
+			stats.rows_rejected = saved["rows_rejected"]
+			stats.resumed = True
+
+		validator = ImportValidator(self.fdb.open_connection(), self._source)
+
+		# Skip blank lines, as csv.DictReader does
+		records = (record for record in reader if record[1] != [])
+		while True:
+			batch = list(islice(records, self.batch_size))
+			if (len(batch) == 0):
+				break
+			unreadable = []
+			readable = []
+			for (line_number, row, reason, raw) in batch:
+				if reason is None:
+					readable.append((line_number, row))
+				else:
+					unreadable.append(validator.reject(line_number, reason, raw))
+			parsed = plan.parse_batch([row for (line_number, row) in readable])
+			(freedge_rows, address_rows, rejected) = validator.validate(
+				(line_number, row, freedge_data, address_data)
+				for ((line_number, row), (freedge_data, address_data)) in zip(readable, parsed))
+			rejected = unreadable + rejected
+			stats.rows_read += len(batch)
+			stats.rows_inserted += len(freedge_rows)
+			stats.rows_rejected += len(rejected)
+			# The rows are committed along with the checkpoint just past them
+			with self.fdb.connections.transaction() as conn:
+				conn.executemany(schema.SQL_INSERT_FREEDGE, freedge_rows)
+				conn.executemany(schema.SQL_INSERT_ADDRESS, address_rows)
+				conn.executemany(schema.SQL_INSERT_REJECTED_ROW, rejected)
+				self._save_progress(conn, reader, stats, False)
+			if progress is not None:
+				stats.elapsed = time.perf_counter() - start
+				progress(stats, reader.offset / file_size)
+
+		with self.fdb.connections.transaction() as conn:
+			self._save_progress(conn, reader, stats, True)
+		stats.elapsed = time.perf_counter() - start
+		return stats
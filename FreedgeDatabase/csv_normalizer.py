@@ -0,0 +1,98 @@
+"""
+===============================================================================
+Title:	Batch Normalizer for the Freedge Tracker System
+===============================================================================
+Description:	Converts the values read from a csv file into the form they are
+		stored in within the freedge database. Rather than deciding each
+		row on its own, a whole batch of rows is normalized one column at
+		a time, so the work which is the same for every row is done once:
+
+		(1)	Today's date, used as the last status update of freedges
+			whose status is known, is computed once per batch.
+		(2)	Status responses are converted using a lookup table, and
+			each distinct response is only converted once per batch.
+		(3)	Installed dates are converted from any of the formats in
+			INSTALLED_DATE_FORMATS into ISO dates, and the converted
+			dates are kept in a bounded cache, since most freedges
+			share a small number of installation dates.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+from FreedgeDatabase.freedge_data_entry import Status
+from FreedgeDatabase.row_decoder import DATE_CACHE_SIZE
+from InternalData.freedge_constants import INSTALLED_DATE_FORMATS
+
+# The value of the Status for each (uppercase, stripped) response in the
+# status column. The form asks whether the freedge is active, so 'yes' and
+# 'no' are expected; any other response is read as unknown.
+STATUS_RESPONSES = {
+	"YES": Status.Active.value,
+	"NO": Status.ConfirmedInactive.value
+}
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def normalize_date(date_str):
+	"""
+	Converts a date written in any of the INSTALLED_DATE_FORMATS into an ISO
+	date, remembering the most recently converted dates.
+
+	Parameters: date_str -> the str from a date column
+
+	Returns: the ISO date str, or the (stripped) original str if it does not
+			 match any of the formats, so that nothing entered is lost
+	"""
+	if date_str is None:
+		return None
+	stripped = date_str.strip()
+	if (len(stripped) == 0):
+		return stripped
+	for date_format in INSTALLED_DATE_FORMATS:
+		try:
+			return datetime.strptime(stripped, date_format).date().isoformat()
+		except ValueError:
+			continue
+	return stripped
+
+def normalize_statuses(statuses, permissions, today=None):
+	"""
+	Converts a column of status responses into Status values, and determines
+	the last status update of each freedge.
+
+	If a status was given, the freedge's status was last updated just now,
+	during the creation of the new database. Otherwise, a caretaker who
+	responded to whether they agree to be contacted is assumed to have an
+	active freedge for the time being. If neither was given, the status is
+	left as it is and the freedge has no last update.
+
+	Parameters:
+		statuses -> a sequence of the strs in the status column
+		permissions -> a sequence of the strs in the permission to contact
+					   column, in the same order
+		today -> the ISO date str to use as the last update, which defaults
+				 to today's date
+
+	Returns: a tuple of (list of status strs, list of last update strs)
+	"""
+	if today is None:
+		today = date.today().isoformat()
+	active = Status.Active.value
+	# The converted value of each distinct status response in this batch
+	converted = {}
+	new_statuses = []
+	last_updates = []
+	for (status_str, permission_str) in zip(statuses, permissions):
+		status = converted.get(status_str)
+		if status is None:
+			key = status_str.strip().upper()
+			status = STATUS_RESPONSES.get(key, Status.Unknown.value) if key else ""
+			converted[status_str] = status
+		if status:
+			new_statuses.append(status)
+			last_updates.append(today)
+		elif permission_str.strip():
+			new_statuses.append(active)
+			last_updates.append(today)
+		else:
+			new_statuses.append(status_str)
+			last_updates.append("NULL")
+	return (new_statuses, last_updates)
@@ -0,0 +1,307 @@
+"""
+===============================================================================
+Title:	Database Diff Engine for the Freedge Database
+===============================================================================
+Description:	Determines which freedges would be added to, removed from, or
+		modified within a FreedgeDatabase if a new csv file were loaded
+		into it.
+
+		Freedges are matched by their project name. More than one freedge
+		may have the same name, so the n-th freedge with a given name (in
+		the order they were added) is matched with the n-th row of the
+		csv file with that name. Rather than copying the csv file into
+		temporary tables and comparing them with SQL, the engine reads
+		the existing rows once to build a small index of
+		{(project name, n): (freedge_id, content hash)}, and then streams
+		the parsed csv rows past it, comparing the hash of each row's
+		content. Only the rows which actually changed are kept, and they
+		are converted into Freedge objects when they are paged through.
+
+		The statuses and last status updates of the freedges are tracked
+		by the system through notifications rather than by the csv file,
+		so they are not compared.
+"""
+import hashlib
+from enum import Enum
+
+# The columns of a freedge which are compared between the database and the
+# csv file, as selected from 'freedges JOIN addresses'.
+CONTENT_COLUMNS = ["project_name", "network_name", "contact_name",
+				   "date_installed", "phone_number", "email_address",
+				   "permission_to_contact", "preferred_contact_method",
+				   "street_address", "city", "state_province", "zip_code",
+				   "country"]
+
+class ChangeType(Enum):
+	"""
+	An Enum class for the kinds of changes a csv file can make to a database.
+
+	Defined Enum Constants (keys):
+	-----------------------------
+	Add -> the freedge is in the csv file, but not the database
+	Remove -> the freedge is in the database, but not the csv file
+	Modify -> the freedge is in both, but its information differs
+	"""
+	Add = "ADD"
+	Remove = "REMOVE"
+	Modify = "MODIFY"
+
+class ChangeRecord:
+	"""
+	A single change which loading a csv file would make to the database.
+
+	Attributes
+	-----------
+	change_type -> the ChangeType of the change
+	project_name -> a string of the name of the freedge which changes
+	old -> the Freedge currently in the database, or None if it is being added
+	new -> the Freedge from the csv file, or None if it is being removed
+
+	Methods
+	--------
+	changed_fields(): Returns a list of strings describing the fields which differ
+	"""
+	def __init__(self, change_type, project_name, old, new):
+		"""
+		Initializes a new change record.
+		"""
+		self.change_type = change_type
+		self.project_name = project_name
+		self.old = old
+		self.new = new
+
+	def changed_fields(self):
+		"""
+		Returns a list of the fields which differ between the old and the new
+		freedge. This is empty unless the record is a modification.
+
+		Parameters: None
+
+		Returns: a list of formatted strings describing each difference.
+		"""
+		if (self.old is None or self.new is None):
+			return []
+		return self.old.compare_freedges(self.new)
+
+class DatabaseDiff:
+	"""
+	The set of changes between a FreedgeDatabase and a csv file.
+
+	Methods
+	--------
+	count(change_type): Returns the number of changes of the given type
+
+	is_empty(): Returns whether the csv file would change nothing
+
+	page(change_type, offset, limit): Returns a list of ChangeRecords
+
+	removed_ids(): Returns the freedge_ids of the freedges to be removed
+
+	new_rows(change_type): Returns the parsed csv rows of the added or
+							modified freedges
+
+	modified_rows(): Returns the IDs and parsed csv rows of the modified
+					 freedges
+	"""
+	def __init__(self, fdb):
+		"""
+		Initializes an empty diff for the given FreedgeDatabase, which is used
+		to look up and convert the changed rows.
+		"""
+		self.fdb = fdb
+		# [(project_name, parsed csv row)] of the freedges to be added
+		self._added = []
+		# [(freedge_id, project_name)] of the freedges to be removed
+		self._removed = []
+		# [(freedge_id, project_name, parsed csv row)] of the modified freedges
+		self._modified = []
+
+	def count(self, change_type):
+		"""
+		Returns the number of changes of the given type.
+
+		Parameters: change_type -> a ChangeType
+
+		Returns: an int
+		"""
+		if (change_type == ChangeType.Add):
+			return len(self._added)
+		if (change_type == ChangeType.Remove):
+			return len(self._removed)
+		return len(self._modified)
+
+	def is_empty(self):
+		"""
+		Returns whether loading the csv file would not change the database.
+
+		Parameters: None
+
+		Returns: True or False
+		"""
+		return (len(self._added) == 0 and len(self._removed) == 0
+				and len(self._modified) == 0)
+
+	def removed_ids(self):
+		"""
+		Returns the database IDs of the freedges which would be removed.
+
+		Parameters: None
+
+		Returns: a list of ints
+		"""
+		return [fid for (fid, name) in self._removed]
+
+	def new_rows(self, change_type):
+		"""
+		Returns the parsed csv data of the freedges which would be added or
+		modified, in the format returned by parse_freedge_data_file().
+
+		Parameters: change_type -> ChangeType.Add or ChangeType.Modify
+
+		Returns: a list of (freedge_data, address_data) tuples
+		"""
+		if (change_type == ChangeType.Add):
+			return [row for (name, row) in self._added]
+		return [row for (fid, name, row) in self._modified]
+
+	def modified_rows(self):
+		"""
+		Returns the freedges which would be modified, as the database ID of
+		each along with its parsed csv data.
+
+		Parameters: None
+
+		Returns: a list of (freedge_id, (freedge_data, address_data)) tuples
+		"""
+		return [(fid, row) for (fid, name, row) in self._modified]
+
+	def page(self, change_type, offset=0, limit=None):
+		"""
+		Returns the changes of the given type as ChangeRecords, converting
+		only the requested page of them into Freedge objects.
+
+		Parameters:
+			change_type -> a ChangeType
+			offset -> the int index of the first change to return
+			limit -> the int maximum number of changes to return, or None
+					 to return all of them
+
+		Returns: records -> a list of ChangeRecord objects
+		"""
+		end = None if limit is None else offset + limit
+		records = []
+		if (change_type == ChangeType.Add):
+			for (name, row) in self._added[offset:end]:
+				new = self.fdb.row_to_freedge(parsed_to_row(row))
+				records.append(ChangeRecord(change_type, name, None, new))
+		elif (change_type == ChangeType.Remove):
+			chunk = self._removed[offset:end]
+			old = self.fdb.get_freedges_by_id([fid for (fid, name) in chunk])
+			for (fid, name) in chunk:
+				records.append(ChangeRecord(change_type, name, old.get(fid), None))
+		else:
+			chunk = self._modified[offset:end]
+			old = self.fdb.get_freedges_by_id([fid for (fid, name, row) in chunk])
+			for (fid, name, row) in chunk:
+				new = self.fdb.row_to_freedge(parsed_to_row(row, fid))
+				records.append(ChangeRecord(change_type, name, old.get(fid), new))
+		return records
+
+def parsed_to_row(parsed, freedge_id=None):
+	"""
+	Rearranges a parsed csv row into the column order of a row selected from
+	'freedges JOIN addresses', so that it can be converted by row_to_freedge().
+
+	Parameters:
+		parsed -> a (freedge_data, address_data) tuple from the csv parser
+		freedge_id -> the database ID to give the row, if any
+
+	Returns: a list of values in database column order
+	"""
+	(f, a) = parsed
+	# The parser orders the fields as they are inserted into the database:
+	# project, network, installed, contact, status, phone, email, permission,
+	# contact method, last update
+	return [freedge_id, f[0], f[1], f[3], f[2], f[4], f[9], f[5], f[6], f[7],
+			f[8]] + list(a)
+
+def _content_hash(values):
+	"""
+	Computes a hash of the content of a freedge, given its values for each of
+	the CONTENT_COLUMNS. Values are normalized first, so that formatting
+	differences introduced by the system (for example, 'Yes' being saved back
+	as 'yes') are not reported as changes.
+
+	Parameters: values -> a sequence of values, one per CONTENT_COLUMNS
+
+	Returns: a bytes digest
+	"""
+	normalized = []
+	for i in range(len(values)):
+		value = values[i]
+		value = "" if value is None else str(value).strip()
+		if (CONTENT_COLUMNS[i] == "permission_to_contact"):
+			value = "YES" if value.upper() == "YES" else "NO"
+		normalized.append(value)
+	return hashlib.blake2b("\x1f".join(normalized).encode("utf-8"),
+						   digest_size=16).digest()
+
+def _parsed_content(parsed):
+	"""
+	Returns the values of a parsed csv row for each of the CONTENT_COLUMNS.
+
+	Parameters: parsed -> a (freedge_data, address_data) tuple
+
+	Returns: a list of values
+	"""
+	(f, a) = parsed
+	return [f[0], f[1], f[3], f[2], f[5], f[6], f[7], f[8]] + list(a)
+
+def diff_database(fdb, freedge_dataset):
+	"""
+	Computes the changes which loading the parsed csv data would make to the
+	database, in a single pass over each.
+
+	Parameters:
+		fdb -> the FreedgeDatabase to compare against
+		freedge_dataset -> an iterable of (freedge_data, address_data) tuples,
+						   as returned by parse_freedge_data_file()
+
+	Returns: diff -> a DatabaseDiff
+	"""
+	diff = DatabaseDiff(fdb)
+	# Index the existing freedges by project name, and by how many freedges
+	# with the same name come before them
+	existing = {}
+	occurrences = {}
+	cur = fdb.open_connection().cursor()
+	cur.execute("SELECT freedge_id, " + ", ".join(CONTENT_COLUMNS) +
+				" FROM freedges JOIN addresses USING(freedge_id)"
+				" ORDER BY freedge_id")
+	for row in cur:
+		name = row[1]
+		n = occurrences.get(name, 0)
+		occurrences[name] = n + 1
+		existing[(name, n)] = (row[0], _content_hash(row[1:]))
+	cur.close()
+
+	# Stream the csv rows past the index
+	seen = set()
+	occurrences = {}
+	for parsed in freedge_dataset:
+		name = parsed[0][0]
+		n = occurrences.get(name, 0)
+		occurrences[name] = n + 1
+		seen.add((name, n))
+		match = existing.get((name, n))
+		if match is None:
+			diff._added.append((name, parsed))
+		elif (match[1] != _content_hash(_parsed_content(parsed))):
+			diff._modified.append((match[0], name, parsed))
+
+	# Whatever was never matched is not in the csv file
+	for (key, match) in existing.items():
+		if key not in seen:
+			diff._removed.append((match[0], key[0]))
+	diff._removed.sort()
+	return diff
@@ -0,0 +1,398 @@
+"""
+===============================================================================
+Title:	Database Schema and Migrations for the Freedge Database
+===============================================================================
+Description:	Defines the structure of the tables in the freedge database,
+		along with the list of migrations used to upgrade database files
+		created by older versions of the system.
+
+		The version of a database file's schema is stored in the file
+		itself using SQLite's 'PRAGMA user_version'. Each entry in
+		MIGRATIONS upgrades a file from one version to the next, so a file
+		at version N is brought up to date by applying every migration
+		after the first N. Each migration is a list of SQL statements, or
+		of functions for changes which SQL alone cannot express.
+
+		To change the schema, ALWAYS append a new migration to the end of
+		MIGRATIONS rather than editing an existing one, since files which
+		have already applied a migration will never run it again.
+"""
+import sqlite3
+from FreedgeDatabase.csv_normalizer import normalize_date
+from FreedgeDatabase.row_decoder import STATUS_LOOKUP
+
+# This defines the structure of the addresses table
+SQL_ADDRESSES_TABLE = \
+	""" CREATE TABLE IF NOT EXISTS addresses (
+		freedge_id INTEGER PRIMARY KEY,
+		street_address varchar(255),
+		city varchar(255),
+		state_province varchar(255),
+		zip_code varchar(10),
+		country varchar(50)
+	);"""
+
+# This defines the structure of the freedges table
+SQL_FREEDGES_TABLE = \
+	""" CREATE TABLE IF NOT EXISTS freedges (
+		freedge_id INTEGER PRIMARY KEY AUTOINCREMENT,
+		project_name varchar(255),
+		network_name varchar(255),
+		contact_name varchar(255),
+		date_installed date,
+		active_status varchar(50) DEFAULT 'Unknown',
+		last_status_update date DEFAULT NULL,
+		phone_number varchar(50),
+		email_address varchar(50),
+		permission_to_contact int,
+		preferred_contact_method varchar(10)
+	);"""
+
+# This defines the structure of the rejected_rows table, which holds the csv
+# rows which could not be imported, along with the reason each was rejected
+SQL_REJECTED_ROWS_TABLE = \
+	""" CREATE TABLE IF NOT EXISTS rejected_rows (
+		rejected_id INTEGER PRIMARY KEY,
+		source_file varchar(255),
+		line_number int,
+		reason varchar(255),
+		raw_row text
+	);"""
+
+# This defines the structure of the import_progress table, which records how
+# far the import of each csv file has got, so that it can be resumed
+SQL_IMPORT_PROGRESS_TABLE = \
+	""" CREATE TABLE IF NOT EXISTS import_progress (
+		source_file varchar(255) PRIMARY KEY,
+		source_size int,
+		source_mtime int,
+		byte_offset int,
+		line_number int,
+		rows_read int,
+		rows_inserted int,
+		rows_rejected int,
+		completed int DEFAULT 0
+	);"""
+
+# This defines the structure of the freedge_search table, an FTS5 full-text
+# index of the words in each freedge's names and address, whose rowid is the
+# freedge_id. Accents are ignored, and the prefixes of 2 and 3 characters are
+# indexed so that searching for the start of a word is quick.
+SQL_SEARCH_TABLE = \
+	""" CREATE VIRTUAL TABLE IF NOT EXISTS freedge_search USING fts5(
+		project_name,
+		contact_name,
+		street_address,
+		city,
+		state_province,
+		tokenize = 'unicode61 remove_diacritics 2',
+		prefix = '2 3'
+	);"""
+
+# Copies a freedge's names and address into the freedge_search table
+SQL_INDEX_FREEDGE = \
+	"""INSERT INTO freedge_search(rowid, project_name,
+			contact_name, street_address, city, state_province)
+		SELECT f.freedge_id, f.project_name, f.contact_name,
+			a.street_address, a.city, a.state_province
+		FROM freedges f LEFT JOIN addresses a USING(freedge_id)
+		WHERE f.freedge_id = {freedge_id};"""
+
+# Replaces a freedge's entry in the freedge_search table. The old entry is
+# deleted first rather than using INSERT OR REPLACE, since the statements of
+# a trigger use the conflict handling of the statement which fired it, and
+# an upsert (INSERT ... ON CONFLICT DO UPDATE) would make the insert fail
+SQL_REINDEX_FREEDGE = \
+	"DELETE FROM freedge_search WHERE rowid = {freedge_id}; " + SQL_INDEX_FREEDGE
+
+# The triggers which keep the freedge_search table in sync with the freedges
+# and addresses tables whenever a row is inserted, updated, or deleted
+# {name: the statements the trigger runs}
+SEARCH_TRIGGERS = {
+	"freedge_search_freedge_insert AFTER INSERT ON freedges":
+		SQL_REINDEX_FREEDGE.format(freedge_id="new.freedge_id"),
+	"freedge_search_freedge_update AFTER UPDATE OF project_name, contact_name ON freedges":
+		SQL_REINDEX_FREEDGE.format(freedge_id="new.freedge_id"),
+	"freedge_search_freedge_delete AFTER DELETE ON freedges":
+		"DELETE FROM freedge_search WHERE rowid = old.freedge_id;",
+	"freedge_search_address_insert AFTER INSERT ON addresses":
+		SQL_REINDEX_FREEDGE.format(freedge_id="new.freedge_id"),
+	"freedge_search_address_update AFTER UPDATE OF street_address, city, state_province ON addresses":
+		SQL_REINDEX_FREEDGE.format(freedge_id="new.freedge_id"),
+	"freedge_search_address_delete AFTER DELETE ON addresses":
+		SQL_REINDEX_FREEDGE.format(freedge_id="old.freedge_id")
+}
+
+# The statements used to insert imported rows into each table
+SQL_INSERT_FREEDGE = \
+	"""INSERT INTO freedges(freedge_id, project_name, network_name,
+			date_installed, contact_name, active_status, phone_number,
+			email_address, permission_to_contact, preferred_contact_method,
+			last_status_update)
+		VALUES(?,?,?,?,?,?,?,?,?,?,?)"""
+SQL_INSERT_ADDRESS = \
+	"""INSERT INTO addresses(freedge_id, street_address, city,
+			state_province, zip_code, country)
+		VALUES(?,?,?,?,?,?)"""
+SQL_INSERT_REJECTED_ROW = \
+	"""INSERT INTO rejected_rows(source_file, line_number, reason, raw_row)
+		VALUES(?,?,?,?)"""
+
+def _normalize_installed_dates(conn):
+	"""
+	Converts the dates installed which were stored as they appeared in the csv
+	file (for example, '9/21/2021') into ISO dates, as they are now stored.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	updates = []
+	for (freedge_id, installed) in conn.execute(
+			"SELECT freedge_id, date_installed FROM freedges"):
+		if isinstance(installed, str):
+			normalized = normalize_date(installed)
+			if (normalized != installed):
+				updates.append((normalized, freedge_id))
+	conn.executemany("UPDATE freedges SET date_installed = ? WHERE freedge_id = ?",
+					 updates)
+
+def _normalize_statuses(conn):
+	"""
+	Converts the statuses which were stored in another spelling (for example,
+	'yes', or ' Active') into the Status values, as they are now stored, so
+	that freedges can be filtered by status using the index on active_status.
+	Statuses which do not match any Status are left as they are.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	for (spelling, status) in STATUS_LOOKUP.items():
+		conn.execute("UPDATE freedges SET active_status = ?"
+					 " WHERE UPPER(TRIM(active_status)) = ? AND active_status != ?",
+					 (status.value, spelling, status.value))
+
+def _create_search_index(conn):
+	"""
+	Creates the freedge_search full-text index, along with the triggers which
+	keep it in sync, and indexes the freedges already in the database. If
+	this build of SQLite does not include FTS5, nothing is created, and
+	searches fall back to reading the freedges tables (see has_search_index).
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	try:
+		conn.execute(SQL_SEARCH_TABLE)
+	except sqlite3.OperationalError:
+		return		# No such module: fts5
+	rebuild_search_index(conn)
+
+def _replace_search_triggers(conn):
+	"""
+	Replaces the triggers of the freedge_search full-text index, which used
+	INSERT OR REPLACE and so failed when fired by an upsert, with the current
+	SEARCH_TRIGGERS. Files without the index are left unchanged, as are files
+	whose triggers are suspended (see suspend_search_index).
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	if not has_search_index(conn):
+		return
+	existing = conn.execute("SELECT COUNT(*) FROM sqlite_master"
+							" WHERE type = 'trigger' AND name LIKE 'freedge_search_%'").fetchone()[0]
+	if (existing == 0):
+		return
+	suspend_search_index(conn)
+	_create_search_triggers(conn)
+
+# The list of migrations, in order. Migration i (counting from 1) upgrades a
+# database file from schema version i-1 to schema version i.
+MIGRATIONS = [
+	# Version 1: the original tables. Files created before schema versions
+	# were tracked already have these tables, and are left unchanged.
+	[
+		SQL_ADDRESSES_TABLE,
+		SQL_FREEDGES_TABLE
+	],
+	# Version 2: indexes for looking up freedges by name, and for filtering
+	# them by status, contact method, and the date of their last update.
+	[
+		"CREATE INDEX IF NOT EXISTS idx_freedges_project_name"
+		" ON freedges(project_name);",
+		"CREATE INDEX IF NOT EXISTS idx_freedges_last_status_update"
+		" ON freedges(last_status_update);",
+		"CREATE INDEX IF NOT EXISTS idx_freedges_active_status"
+		" ON freedges(active_status);",
+		"CREATE INDEX IF NOT EXISTS idx_freedges_preferred_contact_method"
+		" ON freedges(preferred_contact_method);"
+	],
+	# Version 3: once made project names unique by deleting every freedge
+	# which shared its name with an earlier one. It no longer changes
+	# anything, since freedges may share a name (see version 9), and no
+	# migration may delete a file's freedges.
+	[],
+	# Version 4: dates installed are stored as ISO dates, whatever format
+	# they were written in within the csv file.
+	[
+		_normalize_installed_dates
+	],
+	# Version 5: the tables used to quarantine rejected csv rows and to
+	# resume interrupted imports.
+	[
+		SQL_REJECTED_ROWS_TABLE,
+		SQL_IMPORT_PROGRESS_TABLE
+	],
+	# Version 6: case-insensitive indexes for searching freedges by the start
+	# of their project name, caretaker, or city, and statuses stored as the
+	# Status values so that they can be filtered using their index.
+	[
+		"CREATE INDEX IF NOT EXISTS idx_freedges_project_name_nocase"
+		" ON freedges(project_name COLLATE NOCASE);",
+		"CREATE INDEX IF NOT EXISTS idx_freedges_contact_name_nocase"
+		" ON freedges(contact_name COLLATE NOCASE);",
+		"CREATE INDEX IF NOT EXISTS idx_addresses_city_nocase"
+		" ON addresses(city COLLATE NOCASE);",
+		_normalize_statuses
+	],
+	# Version 7: the full-text index for searching the words anywhere in the
+	# freedges' names and addresses, if SQLite includes FTS5.
+	[
+		_create_search_index
+	],
+	# Version 8: search index triggers which also work when fired by an
+	# upsert, as when a database is updated from a csv file.
+	[
+		_replace_search_triggers
+	],
+	# Version 9: project names are no longer unique, since more than one
+	# freedge may have the same name, each with its own caretaker. Files which
+	# applied the old version 3 have a unique index on the names, which is
+	# replaced by an ordinary one.
+	[
+		"DROP INDEX IF EXISTS idx_freedges_project_name;",
+		"CREATE INDEX IF NOT EXISTS idx_freedges_project_name"
+		" ON freedges(project_name);"
+	]
+]
+
+# The schema version of database files created by this version of the system
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(conn):
+	"""
+	Reads the schema version stored in a database file.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: an int, which is 0 for files created before versions were tracked.
+	"""
+	return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn):
+	"""
+	Upgrades the schema of a database file to SCHEMA_VERSION by applying each
+	of the migrations it has not applied yet. This should be called from
+	within a transaction, so that a failed upgrade leaves the file unchanged.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: version -> the int schema version the file was upgraded from.
+	"""
+	version = get_schema_version(conn)
+	if (version > SCHEMA_VERSION):
+		raise RuntimeError("The database was created by a newer version of the"
+						   " Freedge Tracker (schema version " + str(version) + ").")
+	for migration in MIGRATIONS[version:]:
+		for step in migration:
+			if callable(step):
+				step(conn)
+			else:
+				conn.execute(step)
+	if (version != SCHEMA_VERSION):
+		conn.execute("PRAGMA user_version = " + str(SCHEMA_VERSION))
+	return version
+
+def has_search_index(conn):
+	"""
+	Checks whether the freedge_search full-text index can be used, which
+	needs both the table to have been created and SQLite to include FTS5.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: True or False
+	"""
+	try:
+		conn.execute("SELECT rowid FROM freedge_search LIMIT 0")
+	except sqlite3.OperationalError:
+		return False
+	return True
+
+def suspend_search_index(conn):
+	"""
+	Stops the freedge_search full-text index from being updated as rows are
+	inserted, by dropping its triggers. Indexing each row as it is inserted
+	is many times slower than indexing them all at once, so this is used
+	while importing a csv file into a new database, which calls
+	rebuild_search_index() once the import has finished.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	for trigger in SEARCH_TRIGGERS.keys():
+		conn.execute("DROP TRIGGER IF EXISTS " + trigger.split()[0])
+
+def rebuild_search_index(conn):
+	"""
+	Indexes every freedge in the freedge_search full-text index from scratch,
+	and creates the triggers which keep it in sync from then on. Does nothing
+	if the database has no full-text index.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	if not has_search_index(conn):
+		return
+	conn.execute("DELETE FROM freedge_search")
+	conn.execute(SQL_INDEX_FREEDGE.format(freedge_id="f.freedge_id"))
+	_create_search_triggers(conn)
+
+def _create_search_triggers(conn):
+	"""
+	Creates the triggers in SEARCH_TRIGGERS which keep the freedge_search
+	table in sync, unless they already exist. Intended for internal use only.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	for (trigger, statements) in SEARCH_TRIGGERS.items():
+		conn.execute("CREATE TRIGGER IF NOT EXISTS " + trigger +
+					 " BEGIN " + statements + " END;")
+
+def drop_tables(conn):
+	"""
+	Drops the freedge tables (and with them, their indexes and triggers),
+	along with the full-text index and the records of earlier imports,
+	resetting the schema version so that apply_migrations() recreates them
+	from scratch.
+
+	Parameters: conn -> An open Connection object linked to the database.
+
+	Returns: None
+	"""
+	conn.execute("DROP TABLE IF EXISTS addresses;")
+	conn.execute("DROP TABLE IF EXISTS freedges;")
+	conn.execute("DROP TABLE IF EXISTS rejected_rows;")
+	conn.execute("DROP TABLE IF EXISTS import_progress;")
+	try:
+		conn.execute("DROP TABLE IF EXISTS freedge_search;")
+	except sqlite3.OperationalError:
+		pass		# SQLite cannot drop an FTS5 table without FTS5
+	conn.execute("PRAGMA user_version = 0")
@@ -114,6 +114,13 @@ class Freedge:
 	ToString(): Converts the freedge data to a string containing the project name,
 				caretaker name, and status.
 	"""
+	# A fixed set of attributes, rather than a per-object __dict__, keeps each
+	# Freedge small when thousands of them are read from the database
+	__slots__ = ("freedge_id", "project_name", "network_name", "caretaker_name",
+				 "fridge_location", "date_installed", "permission_to_notify",
+				 "preferred_contact_method", "phone_number", "email_address",
+				 "freedge_status", "last_status_update")
+
 	def __init__(self, fid, pname, nname, cname, loc, last_update, c_method, phone, email,
 				 installed_date, permission):
 		"""
@@ -229,12 +236,12 @@ class Freedge:
 		"""
 		if (field_name == 'Location'):
 			ret = field_name + "\n"
-			ret += "Old: " + old.ToString()
-			ret += "New: " + new.ToString()
+			ret += "Old: " + old.ToString() + "\n"
+			ret += "New: " + new.ToString() + "\n"
 		else:
 			ret = field_name + "\n"
-			ret += "Old: " + old
-			ret += "New: " + new
+			ret += "Old: " + str(old) + "\n"
+			ret += "New: " + str(new) + "\n"
 		return ret
 		
 	def compare_freedges(self, f):
@@ -269,7 +276,12 @@ class Freedge:
 
 		# compare each field between the freedge objects, looking for differences
 		for i in range(len(field_names)):
-			if (f1[i] != f2[i]):
+			if (field_names[i] == 'Location'):
+				# FreedgeAddress objects are compared by their contents
+				differs = (f1[i].ToString() != f2[i].ToString())
+			else:
+				differs = (f1[i] != f2[i])
+			if (differs):
 				c = self.comparison_string(field_names[i], f1[i], f2[i])
 				diff.append(c)
 				
@@ -323,6 +335,9 @@ class FreedgeAddress:
 		Returns the freedge's full address, formatted to display
 		oneattribute per line
 	"""
+	# A fixed set of attributes, as in the Freedge class
+	__slots__ = ("street_address", "city", "state_province", "zip_code", "country")
+
 	def __init__(self, loc):
 		""" 
 		A constructor to store the address of a freedge. 
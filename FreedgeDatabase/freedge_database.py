@@ -15,13 +15,27 @@ Authors:        Madison Werries, Ginni Gallagher
 Last Edited:    3-6-2022
 Last Edit By:   Madison Werries
 """
+import csv
+import os
+import shutil
 from os.path import exists
 import sqlite3
+import threading
+import time
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
 from sqlite3 import Error
 from InternalData.freedge_constants import *
-from datetime import date
+from datetime import date, timedelta
 import FreedgeDatabase as FD
 from FreedgeDatabase.freedge_data_entry import Status
+from FreedgeDatabase.connection_manager import ConnectionManager
+from FreedgeDatabase import database_schema as schema
+from FreedgeDatabase.database_diff import ChangeType, diff_database
+from FreedgeDatabase.row_decoder import RowDecoder, DEFAULT_DECODER, decode_status, decode_date
+from FreedgeDatabase.csv_import import ImportStats, CSVImport, CSVRecordReader, ImportValidator
+from FreedgeDatabase.freedge_query import FreedgeQuery, search_words, fts_match
 
 """
 Helpful links used in setting up database connection and database table:
@@ -48,10 +62,30 @@ class FreedgeDatabase:
 		Returns: None
 		"""
 		self.db_location = db_location
+		# The pool of connections shared by all of the database operations
+		self.connections = ConnectionManager(db_location)
+		# Statistics from the most recent csv import, if any (ImportStats)
+		self.import_stats = None
+		# Incremented by every write made through this FreedgeDatabase
+		self.data_version = 0
+		# The results of read queries, which are reused until the data changes
+		# {query key: result}, valid while _cache_state() equals _cache_key
+		self._cache = {}
+		self._cache_key = None
+		# Guards the cache, which may be used by several threads at once
+		self._cache_lock = threading.Lock()
+		# The functions called with the IDs of the freedges changed by
+		# update_freedges(), such as the tables of the Administrator Interface
+		self._listeners = []
+		# Whether the freedge_search full-text index can be used, once known
+		self._search_index = None
 		
 	def open_connection(self):
 		""" 
-		Open and return a database connection defined by db_location.
+		Return the calling thread's pooled database connection defined by
+		db_location, opening it if it has not been opened yet. The connection
+		is owned by the FreedgeDatabase and must not be closed by the caller;
+		use close() once the database is no longer needed.
 
 		Parameters: None
 
@@ -60,11 +94,165 @@ class FreedgeDatabase:
 		"""
 		conn = None
 		try:
-			conn = sqlite3.connect(self.db_location)
+			conn = self.connections.connection()
 			return conn
 		except Error as e:
 			Error(e, "Failed to connect to the database at: ", self.db_location)
 		return conn
+
+	def _data_changed(self):
+		"""
+		Records that the data in the database was changed, so that results
+		cached before the change are no longer used. Intended for internal
+		use only.
+
+		Parameters: None
+
+		Returns: None
+		"""
+		with self._cache_lock:
+			self.data_version += 1
+			self._cache = {}
+
+	def add_listener(self, listener):
+		"""
+		Registers a function to be called whenever update_freedges() (or
+		update_freedge()) changes the data of some freedges, so that anything
+		showing those freedges can update just them. The function is called
+		on the thread which made the change, after it has been committed.
+
+		Parameters: listener -> a function of a list of the int freedge_ids
+								which changed.
+
+		Returns: None
+		"""
+		self._listeners.append(listener)
+
+	def remove_listener(self, listener):
+		"""
+		Stops calling a function registered with add_listener().
+
+		Parameters: listener -> the function to stop calling.
+
+		Returns: None
+		"""
+		if listener in self._listeners:
+			self._listeners.remove(listener)
+
+	def _notify_listeners(self, freedge_ids):
+		"""
+		Calls each registered listener with the IDs of the freedges which
+		changed. Intended for internal use only.
+
+		Parameters: freedge_ids -> a list of int freedge_ids.
+
+		Returns: None
+		"""
+		for listener in list(self._listeners):
+			listener(freedge_ids)
+
+	def _cache_state(self):
+		"""
+		Returns a value which changes whenever the cached results may be out
+		of date: when this object writes to the database, when another
+		connection (or process) writes to it, when the database file is
+		replaced, or when the date changes, since which freedges are out of
+		date depends on today's date. Intended for internal use only.
+		"""
+		return (self.data_version, date.today(), self.connections.data_version())
+
+	def _cached(self, key, compute):
+		"""
+		Returns the cached result of a read query, computing and caching it if
+		there is no up-to-date result. Intended for internal use only.
+
+		Parameters:
+			key -> a hashable value identifying the query and its parameters.
+			compute -> a function of no arguments which runs the query.
+
+		Returns: the result of compute()
+		"""
+		state = self._cache_state()
+		with self._cache_lock:
+			if (state != self._cache_key):
+				self._cache = {}
+				self._cache_key = state
+			if key in self._cache:
+				return self._cache[key]
+		# Run the query without holding the lock, so other threads can read
+		result = compute()
+		with self._cache_lock:
+			# Keep the result only if the data did not change in the meantime
+			if (state == self._cache_key):
+				self._cache[key] = result
+		return result
+
+	def upgrade_schema(self):
+		"""
+		Upgrades the tables of the database file in place to the current
+		schema version, adding any indexes or tables it is missing. Files
+		which are already up to date are left unchanged.
+
+		Parameters: None
+
+		Returns: An int, the schema version the file was upgraded from.
+		"""
+		with self.connections.transaction() as conn:
+			version = schema.apply_migrations(conn)
+		if (version != schema.SCHEMA_VERSION):
+			self._search_index = None
+			self._data_changed()
+			self.analyze()		# The new indexes have no statistics yet
+		return version
+
+	def has_search_index(self):
+		"""
+		Checks whether the database has a full-text index of the freedges'
+		names and addresses, which it only has if SQLite includes FTS5.
+
+		Parameters: None
+
+		Returns: True or False
+		"""
+		if self._search_index is None:
+			self._search_index = schema.has_search_index(self.open_connection())
+		return self._search_index
+
+	def analyze(self):
+		"""
+		Gathers the statistics SQLite's query planner uses to choose which
+		index to use for a query, sampling SQLITE_ANALYSIS_LIMIT rows of each
+		index. Without them, a query which both filters and sorts the
+		freedges may pick an index which reads far more rows than needed.
+
+		Parameters: None
+
+		Returns: None
+		"""
+		conn = self.open_connection()
+		conn.execute("PRAGMA analysis_limit = " + str(SQLITE_ANALYSIS_LIMIT))
+		conn.execute("ANALYZE")
+
+	def checkpoint(self):
+		"""
+		Copies every change in the database's write-ahead log into the
+		database file itself, and empties the log.
+
+		Parameters: None
+
+		Returns: None
+		"""
+		self.open_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+	def close(self):
+		"""
+		Closes all of the pooled connections to the database.
+
+		Parameters: None
+
+		Returns: None
+		"""
+		self.connections.close()
 	
 	def create_table(self, conn, create_table_sql):
 		""" 
@@ -81,117 +269,111 @@ class FreedgeDatabase:
 		except Error as e:
 			Error(e, "Failed to connect to the database at: ", self.db_location)
 
-	def new_address(self, conn, address_data, temp=False):
+	def new_address(self, conn, address_data):
 		"""
 		Inserts a new address into the SQLite database's 'addresses' table.
+		The insert is committed along with the caller's transaction, if any.
 
 		Parameters:
 			conn -> An open Connection object linked to the database.
 			address_data -> An array containing the address data of specific
 							freedge. These values will be fed into the
 							SQLite INSERT statement.
-			temp -> A boolean used to determine whether to store the new
-					address in the permanent table, or the temporary one
-					called 'new_addresses,' which is only used for database
-					comparison. Default value is False.
 
 		Returns: An int, which is the database ID of the created address.
 		"""
-		if (temp):
-			sql = '''INSERT INTO new_addresses(
-						freedge_id, street_address, city,
-						state_province, zip_code, country)
-					VALUES(?,?,?,?,?,?)'''
-		else:
-			sql = '''INSERT INTO addresses(
-						freedge_id, street_address, city,
-						state_province, zip_code, country)
-					VALUES(?,?,?,?,?,?)'''
+		sql = '''INSERT INTO addresses(
+					freedge_id, street_address, city,
+					state_province, zip_code, country)
+				VALUES(?,?,?,?,?,?)'''
 		cur = conn.cursor()
 		cur.execute(sql, address_data)
-		conn.commit()
+		self._data_changed()
 		return cur.lastrowid
 	
-	def new_freedge(self, conn, freedge_data, temp=False):
+	def new_freedge(self, conn, freedge_data):
 		"""
 		Inserts a new freedge into the SQLite database's 'freedges' table.
+		The insert is committed along with the caller's transaction, if any.
 	
 		Parameters:
 			conn -> An open Connection object linked to the database.
 			freedge_data -> An array containing the address data of specific
 							freedge. These values will be fed into the
 							SQLite INSERT statement.
-			temp -> A boolean used to determine whether to store the new
-					freedge in the permanent table, or the temporary one
-					called 'new_freedges,' which is only used for database
-					comparison. Default is False.
 
 		Returns: An int, which is the database ID of the new freedge entry.
 		"""
-		if (temp):
-			sql = '''INSERT INTO new_freedges(project_name, network_name, date_installed,
-						contact_name, active_status, phone_number, email_address,
-						permission_to_contact, preferred_contact_method,
-						last_status_update)
-						VALUES(?,?,?,?,?,?,?,?,?,?)'''
-		else:
-			sql = '''INSERT INTO freedges(project_name, network_name, date_installed,
-						contact_name, active_status, phone_number, email_address,
-						permission_to_contact, preferred_contact_method,
-						last_status_update)
-						VALUES(?,?,?,?,?,?,?,?,?,?)'''
+		sql = '''INSERT INTO freedges(project_name, network_name, date_installed,
+					contact_name, active_status, phone_number, email_address,
+					permission_to_contact, preferred_contact_method,
+					last_status_update)
+					VALUES(?,?,?,?,?,?,?,?,?,?)'''
 		cur = conn.cursor()
 		cur.execute(sql, freedge_data)
-		conn.commit()
+		self._data_changed()
 		return cur.lastrowid
+
+	def bulk_insert_freedges(self, freedge_dataset, batch_size=IMPORT_BATCH_SIZE):
+		"""
+		Inserts many parsed csv rows into the 'freedges' and 'addresses' tables
+		inside a single transaction, writing the rows in batches with
+		executemany rather than committing once per row. Rows which cannot be
+		inserted are written to the 'rejected_rows' table instead.
+
+		Parameters:
+			freedge_dataset -> An iterable of (freedge_data, address_data)
+							tuples, as returned by parse_freedge_data_file().
+			batch_size -> The number of rows to insert per executemany call.
+
+		Returns: stats -> An ImportStats object describing the import.
+		"""
+		if (batch_size < 1):
+			raise ValueError("The import batch size must be at least 1.")
+		stats = ImportStats()
+		start = time.perf_counter()
+		dataset = iter(freedge_dataset)
+		with self.connections.transaction() as conn:
+			validator = ImportValidator(conn)
+			while True:
+				batch = list(islice(dataset, batch_size))
+				if (len(batch) == 0):
+					break
+				(freedge_rows, address_rows, rejected) = validator.validate(
+					(None, None, freedge_data, address_data)
+					for (freedge_data, address_data) in batch)
+				conn.executemany(schema.SQL_INSERT_FREEDGE, freedge_rows)
+				conn.executemany(schema.SQL_INSERT_ADDRESS, address_rows)
+				conn.executemany(schema.SQL_INSERT_REJECTED_ROW, rejected)
+				stats.rows_read += len(batch)
+				stats.rows_inserted += len(freedge_rows)
+				stats.rows_rejected += len(rejected)
+		self._data_changed()
+		stats.elapsed = time.perf_counter() - start
+		return stats
 	
+	def parse_status(self, status_str):
+		"""
+		Converts a status stored in the database into the proper Status.
+
+		Parameters: status_str -> the str stored in the active_status column.
+
+		Returns: status -> a Status
+		"""
+		return decode_status(status_str)
+
 	def row_to_freedge(self, row):
 		""" 
 		Converts an SQL row into an instance of the Freedge class. 
         
-		Parameters: row -> List of strings containing data for a freedge. 
+		Parameters: row -> List of strings containing data for a freedge, in
+						   the column order of 'SELECT * FROM freedges JOIN
+						   addresses'. Rows of other queries should be
+						   converted with a RowDecoder built for that query.
 
 		Returns: new_freedge -> A instance of the Freedge class.
 		"""
-		# Convert yes/no form responses into the proper Status
-		# 		(`Status` class found in freedge_data_entry.py)
-		active_str = Status.Active.value.upper()
-		sus_inact_str = Status.SuspectedInactive.value.upper()
-		conf_inact_str = Status.ConfirmedInactive.value.upper()
-		unknown_str = Status.Unknown.value.upper()
-		
-		status_str = row[5].upper().strip()
-		# Read in the status of the user from the given row value, accepting
-		# a few potential formats
-		if (status_str == "YES" or status_str == active_str):
-			status = Status.Active
-		elif (status_str == "NO" or status_str == conf_inact_str):
-			status = Status.ConfirmedInactive
-		elif (status_str == sus_inact_str):
-			status = Status.SuspectedInactive
-		else:
-			status = Status.Unknown
-		
-		# Parse yes/no form responses into booleans
-		permission = (row[9].upper().strip() == "YES")
-		try:
-			installed_date = date.fromisoformat(row[6])
-		except:
-			installed_date = '-'
-		try:
-			last_update = date.fromisoformat(row[4])
-		except:
-			last_update = '-'
-			
-		# Create a new instance of a FreedgeAddress
-		address = FD.FreedgeAddress([row[11], row[12], row[13], row[14], row[15]])
-		# Create a new instance of a Freedge:
-		new_freedge = FD.Freedge(row[0], row[1], row[2], row[3], address, installed_date, row[10], row[7],
-							  row[8], last_update, permission)
-		# Set the address and the status of the freedge
-		new_freedge.freedge_status = status
-		
-		return new_freedge
+		return DEFAULT_DECODER.decode(row)
 	
 	def query_to_freedgelist(self, rows):
 		""" 
@@ -209,12 +391,25 @@ class FreedgeDatabase:
 			freedge_list.append(new_freedge)
 		return freedge_list
 	
-	def get_freedges(self):
-		""" 
-		Retrieves a list of all of the entries in the database in the form of Freedge objects.
-		Parameters: None
+	def iter_freedges(self, batch_size=FETCH_BATCH_SIZE, where=None, params=(),
+					  limit=None, offset=0, order_by="freedge_id"):
+		"""
+		Lazily iterates over the entries in the database in the form of
+		Freedge objects. Rows are fetched batch_size at a time and converted
+		as they are reached, so memory use does not grow with the size of
+		the database.
 
-		Returns: A list of Freedge objects.
+		Parameters:
+			batch_size -> the int number of rows to fetch from the database at a time.
+			where -> an optional str SQL condition which the rows must match,
+					 using ? in place of any values (e.g. "city = ?").
+			params -> the list of values to fill in the ? fields of where.
+			limit -> the int maximum number of freedges to return, or None.
+			offset -> the int number of matching freedges to skip first.
+			order_by -> the str SQL expression to sort the freedges by.
+
+		Returns: (yields) Freedge objects, in order of their database ID
+				 unless order_by is given.
 		"""
 		# Connect to the database
 		conn = self.open_connection()
@@ -222,35 +417,259 @@ class FreedgeDatabase:
 		if conn is None:
 			ConnectionError("Error: Could not connect to the database.")
 		
-		# Query the database, retrieving all the freedges and their addresses
+		# Query the database, retrieving the freedges and their addresses
+		sql = "SELECT * FROM freedges JOIN addresses USING(freedge_id)"
+		if where is not None:
+			sql += " WHERE " + where
+		sql += " ORDER BY " + order_by
+		if limit is not None:
+			sql += " LIMIT ? OFFSET ?"
+			params = list(params) + [limit, offset]
 		cur = conn.cursor()
-		cur.execute("SELECT * FROM freedges JOIN addresses USING(freedge_id)")
-		# Get the results of the SQL query
-		rows = cur.fetchall()
-		
+		try:
+			cur.execute(sql, params)
+			# Look up the positions of the columns once for the whole query
+			decoder = RowDecoder.from_cursor(cur)
+			# Parse each batch of rows into instances of the Freedge class
+			rows = cur.fetchmany(batch_size)
+			while (len(rows) > 0):
+				for row in rows:
+					yield decoder.decode(row)
+				rows = cur.fetchmany(batch_size)
+		finally:
+			cur.close()
+
+	def get_freedges(self):
+		""" 
+		Retrieves a list of all of the entries in the database in the form of Freedge objects.
+		To avoid holding every Freedge in memory at once, use iter_freedges().
+
+		The result is cached until the data in the database changes, so the
+		same Freedge objects may be returned by later calls. Changes made to
+		them should be written with update_freedges().
+
+		Parameters: None
+
+		Returns: A list of Freedge objects.
+		"""
 		# Parse the SQL query rows into instances of the Freedge class
 		# This allows for easier access by the other Freedge Tracker modules
-		return self.query_to_freedgelist(rows)
+		return list(self._cached("freedges", lambda: list(self.iter_freedges())))
 	
-	def get_out_of_date(self):
+	def count_freedges(self):
+		"""
+		Counts the freedges in the database, without building any Freedge
+		objects. The result is cached until the data in the database changes.
+
+		Parameters: None
+
+		Returns: An int, the number of freedges in the database.
+		"""
+		return self._cached("count", lambda: self.open_connection().execute(
+			"SELECT COUNT(*) FROM freedges JOIN addresses USING(freedge_id)").fetchone()[0])
+
+	def get_freedges_page(self, offset, limit):
+		"""
+		Retrieves a single page of the freedges in the database, in order of
+		their database ID, so that a long list can be shown a piece at a time.
+
+		Parameters:
+			offset -> the int number of freedges before the start of the page.
+			limit -> the int maximum number of freedges on the page.
+
+		Returns: A list of Freedge objects.
+		"""
+		return list(self.iter_freedges(limit=limit, offset=offset))
+
+	def _out_of_date_filter(self, threshold):
+		"""
+		Builds the SQL WHERE clause matching the freedges whose last status
+		update was more than threshold days ago. This matches the freedges for
+		which Freedge.time_since_last_update() is greater than the threshold,
+		skipping those whose status is Unknown or whose last update is not a
+		valid date. Intended for internal use only.
+
+		Parameters: threshold -> the int number of days after which a status
+								 is considered out of date.
+
+		Returns: (sql, params) -> the str WHERE clause and its list of values.
+		"""
+		# The oldest date which is still considered up to date. Comparing the
+		# ISO date strings directly (rather than the number of days between
+		# them) lets SQLite range-scan the index on last_status_update.
+		cutoff = (date.today() - timedelta(days=threshold)).isoformat()
+		# The stored statuses which row_to_freedge() does not treat as Unknown
+		known_statuses = ["YES", "NO", Status.Active.value.upper(),
+						  Status.SuspectedInactive.value.upper(),
+						  Status.ConfirmedInactive.value.upper()]
+		sql = '''last_status_update < ?
+				AND julianday(last_status_update) IS NOT NULL
+				AND UPPER(TRIM(active_status)) IN (?,?,?,?,?)'''
+		return (sql, [cutoff] + known_statuses)
+
+	def get_out_of_date(self, threshold=FIRST_UPDATE_THRESHOLD):
 		""" 
-		Grabs a list of freedges whose information is out of date. 
+		Grabs a list of freedges whose information is out of date. Only the
+		matching rows are read from the database.
 		
-		Parameters: None
+		Parameters: threshold -> the int number of days after which a status
+								 is considered out of date. Defaults to
+								 FIRST_UPDATE_THRESHOLD.
 
 		Returns: 
 			A list of Freedge objects corresponding to the entries in the
-			database whose statuses are out of date.
-		"""
-		freedges = self.get_freedges()
-		needs_updating = []
-		for freedge in freedges:
-			t = freedge.time_since_last_update()
-			if (t is not None):
-				if (t > FIRST_UPDATE_THRESHOLD):
-					needs_updating.append(freedge)
-		return needs_updating
+			database whose statuses are out of date. As with get_freedges(),
+			the result is cached until the data in the database changes.
+		"""
+		(where, params) = self._out_of_date_filter(threshold)
+		return list(self._cached(("out_of_date", threshold),
+			lambda: list(self.iter_freedges(where=where, params=params))))
+
+	def get_out_of_date_page(self, offset, limit, threshold=FIRST_UPDATE_THRESHOLD):
+		"""
+		Retrieves a single page of the freedges whose information is out of
+		date, in order of their database ID.
+
+		Parameters:
+			offset -> the int number of freedges before the start of the page.
+			limit -> the int maximum number of freedges on the page.
+			threshold -> the int number of days after which a status is
+						 considered out of date.
+
+		Returns: A list of Freedge objects.
+		"""
+		(where, params) = self._out_of_date_filter(threshold)
+		return list(self.iter_freedges(where=where, params=params,
+									   limit=limit, offset=offset))
+
+	def count_out_of_date(self, threshold=FIRST_UPDATE_THRESHOLD):
+		"""
+		Counts the freedges whose information is out of date, without
+		building any Freedge objects. The result is cached until the data in
+		the database changes.
+
+		Parameters: threshold -> the int number of days after which a status
+								 is considered out of date. Defaults to
+								 FIRST_UPDATE_THRESHOLD.
+
+		Returns: An int, the number of out-of-date freedges in the database.
+		"""
+		(where, params) = self._out_of_date_filter(threshold)
+		def count():
+			cur = self.open_connection().cursor()
+			cur.execute("SELECT COUNT(*) FROM freedges JOIN addresses USING(freedge_id)"
+						" WHERE " + where, params)
+			count = cur.fetchone()[0]
+			cur.close()
+			return count
+		return self._cached(("count_out_of_date", threshold), count)
 	
+	def get_out_of_date_by_id(self, freedge_ids, threshold=FIRST_UPDATE_THRESHOLD):
+		"""
+		Retrieves those of the freedges with the given database IDs whose
+		information is out of date.
+
+		Parameters:
+			freedge_ids -> a list of int database IDs.
+			threshold -> the int number of days after which a status is
+						 considered out of date.
+
+		Returns: A dict of {freedge_id: Freedge} for each ID which was found
+				 and is out of date.
+		"""
+		(where, params) = self._out_of_date_filter(threshold)
+		found = {}
+		# Look the IDs up in chunks, as get_freedges_by_id() does
+		for i in range(0, len(freedge_ids), 500):
+			chunk = list(freedge_ids[i:i + 500])
+			in_chunk = "(" + where + ") AND freedge_id IN (" + ",".join("?" * len(chunk)) + ")"
+			for f in self.iter_freedges(where=in_chunk, params=params + chunk):
+				found[f.freedge_id] = f
+		return found
+
+	def _search_filter(self, words):
+		"""
+		Builds the SQL WHERE clause matching the freedges with a word starting
+		with each of the given words in their project name, caretaker's name,
+		or address, for a query of 'freedges JOIN addresses USING(freedge_id)'.
+		Without the full-text index, each word may appear anywhere in those
+		columns instead, which means reading every row. Intended for internal
+		use only.
+
+		Parameters: words -> a non-empty list of strs, from search_words()
+
+		Returns: (sql, params) -> the str WHERE clause and its list of values.
+		"""
+		if self.has_search_index():
+			return ("freedge_id IN (SELECT rowid FROM freedge_search"
+					" WHERE freedge_search MATCH ?)", [fts_match(words)])
+		columns = ["project_name", "contact_name", "street_address", "city",
+				   "state_province"]
+		clauses = []
+		params = []
+		for word in words:
+			clauses.append("(" + " OR ".join(c + " LIKE ? ESCAPE '\\'"
+											  for c in columns) + ")")
+			# Words may contain underscores, which LIKE would treat as wildcards
+			params += ["%" + word.replace("_", "\\_") + "%"] * len(columns)
+		return (" AND ".join(clauses), params)
+
+	def search(self, text, limit=SEARCH_RESULT_LIMIT):
+		"""
+		Searches for the freedges matching a few words, such as part of a
+		project name and part of a street name ('heladera buenos'). A freedge
+		matches if its project name, caretaker's name, or address has a word
+		starting with each of the words, ignoring case and accents. The best
+		matches come first, ranked by SQLite's bm25() with a match in the
+		project name counting the most. The results are cached until the
+		data in the database changes.
+
+		If SQLite does not include FTS5, each word may appear anywhere in
+		those columns instead (ignoring case, but not accents), and the
+		matches are in order of their database ID.
+
+		Parameters:
+			text -> the str to search for.
+			limit -> the int maximum number of freedges to return.
+
+		Returns: A list of Freedge objects, best match first.
+		"""
+		words = search_words(text)
+		if len(words) == 0:
+			return []
+		def search():
+			conn = self.open_connection()
+			if self.has_search_index():
+				# The weights of the project name, caretaker's name, street
+				# address, city, and state or province, in that order
+				sql = '''SELECT rowid FROM freedge_search
+						 WHERE freedge_search MATCH ?
+						 ORDER BY bm25(freedge_search, 10.0, 5.0, 2.0, 2.0, 1.0)
+						 LIMIT ?'''
+				params = [fts_match(words), limit]
+			else:
+				(where, params) = self._search_filter(words)
+				sql = "SELECT freedge_id FROM freedges JOIN addresses" \
+					  " USING(freedge_id) WHERE " + where + \
+					  " ORDER BY freedge_id LIMIT ?"
+				params.append(limit)
+			ids = [row[0] for row in conn.execute(sql, params)]
+			found = self.get_freedges_by_id(ids)
+			return [found[fid] for fid in ids if fid in found]
+		return list(self._cached(("search", tuple(words), limit), search))
+
+	def query(self):
+		"""
+		Starts a search of the freedges in the database, which can then be
+		narrowed with filters and sorted (see FreedgeQuery).
+
+		Parameters: None
+
+		Returns: A FreedgeQuery matching every freedge, in order of their
+				 database ID.
+		"""
+		return FreedgeQuery(self)
+
 	def update_freedge(self, f):
 		""" 
 		Update the database to reflect the information contained in a specific
@@ -261,61 +680,262 @@ class FreedgeDatabase:
 
 		Returns: None
 		"""
-		conn = self.open_connection()
-		# Verify that the connection was successful
-		if conn is None:
-			ConnectionError("Error: Could not connect to the database.")
-		cur = conn.cursor()
-		
-		# Update the corresponding entry in the freedges table
-		sql_update_freedges = '''
-			UPDATE freedges
-			SET project_name = ?,
-				network_name = ?,
-				date_installed = ?,
-				contact_name = ?,
-				active_status = ?,
-				last_status_update = ?,
-				phone_number = ?,
-				email_address = ?,
-				permission_to_contact = ?,
-				preferred_contact_method = ?
-			WHERE freedge_id = ?'''
-		
-		# Get the proper values to fill in the ? fields
+		self.update_freedges([f])
+
+	def _freedge_to_columns(self, f):
+		"""
+		Converts a Freedge object into the values stored in each of the
+		database columns. Intended for internal use only.
+
+		Parameters: f -> a Freedge object
+
+		Returns: A dict of {(table, column): value}
+		"""
+		# Get the proper values to store in the database
 		permission = "no"
 		if (f.permission_to_notify):
 			permission = "yes"
-		
-		fields = [f.project_name, f.network_name,
-				  f.date_installed, f.caretaker_name,
-				  str(f.freedge_status.value), f.last_status_update, f.phone_number,
-				  f.email_address, permission,
-				  f.preferred_contact_method, str(f.freedge_id)]
-		# Execute the update to the table
-		cur.execute(sql_update_freedges, fields)
-
-		# Update the corresponding entry in the addresses table
-		sql = '''
-			UPDATE addresses
-			SET street_address = ?,
-				city = ?,
-				state_province = ?,
-				zip_code = ?,
-				country = ?
-			WHERE freedge_id = ?'''
-		
+		installed = f.date_installed
+		if isinstance(installed, date):
+			installed = installed.isoformat()
+		last_update = f.last_status_update
+		if isinstance(last_update, date):
+			last_update = last_update.isoformat()
 		# FreedgeAddress of the passed-in Freedge f
 		addr = f.fridge_location
-		# Get the proper values to fill in the ? fields
-		fields = [addr.street_address, addr.city, addr.state_province,
-				  addr.zip_code, addr.country, str(f.freedge_id)]
-		# Execute the update to the table
-		cur.execute(sql, fields)
-		# Commit the changes and close the connection
-		conn.commit()
-		conn.close()
+		return {
+			("freedges", "project_name"): f.project_name,
+			("freedges", "network_name"): f.network_name,
+			("freedges", "date_installed"): installed,
+			("freedges", "contact_name"): f.caretaker_name,
+			("freedges", "active_status"): str(f.freedge_status.value),
+			("freedges", "last_status_update"): last_update,
+			("freedges", "phone_number"): f.phone_number,
+			("freedges", "email_address"): f.email_address,
+			("freedges", "permission_to_contact"): permission,
+			("freedges", "preferred_contact_method"): f.preferred_contact_method,
+			("addresses", "street_address"): addr.street_address,
+			("addresses", "city"): addr.city,
+			("addresses", "state_province"): addr.state_province,
+			("addresses", "zip_code"): addr.zip_code,
+			("addresses", "country"): addr.country
+		}
+
+	def _column_changed(self, column, old, new):
+		"""
+		Determines whether a value read from the database differs from the
+		value of a Freedge object. Intended for internal use only.
+
+		Parameters:
+			column -> the str name of the column
+			old -> the value currently stored in the database
+			new -> the value from _freedge_to_columns()
+
+		Returns: True or False
+		"""
+		if (column == "active_status"):
+			# Several stored strings give the same Status (e.g. 'Yes' and 'ACTIVE')
+			return self.parse_status(old or "").value != new
+		if (column == "permission_to_contact"):
+			# 'Yes', 'yes', and 'YES' all give the same Freedge permission
+			return (str(old).upper().strip() == "YES") != (new == "yes")
+		if (column in ("date_installed", "last_status_update") and new is None):
+			# A stored value which is not an ISO date is read in as None, so
+			# keep it rather than erasing it
+			if decode_date(old) is None:
+				return False
+		return old != new
+
+	def update_freedges(self, freedges):
+		"""
+		Update the database to reflect the information contained in many
+		Freedge objects at once, located by their freedge_id. Only the columns
+		whose values actually changed are written, and all of the updates are
+		made within a single transaction using executemany.
+
+		Parameters: freedges -> an iterable of the Freedge objects whose data
+								needs to be updated within the database.
+
+		Once the changes are committed, the listeners registered with
+		add_listener() are called with the IDs of the freedges which changed.
+
+		Returns: An int, the number of freedges whose data changed.
+		"""
+		freedges = list(freedges)
+		ids = [f.freedge_id for f in freedges]
+		# Updates which write the same set of columns are grouped together,
+		# so that each group can be written with a single executemany call
+		# {(table, (column, ...)): [[value, ..., freedge_id], ...]}
+		updates = {}
+		changed_ids = []
+		with self.connections.transaction() as conn:
+			cur = conn.cursor()
+			# Read the current values of each freedge to compare them against
+			current = {}
+			for i in range(0, len(ids), 500):
+				chunk = ids[i:i + 500]
+				cur.execute("SELECT * FROM freedges JOIN addresses USING(freedge_id)"
+							" WHERE freedge_id IN (" + ",".join("?" * len(chunk)) + ")",
+							chunk)
+				names = [d[0] for d in cur.description]
+				for row in cur.fetchall():
+					current[row[0]] = dict(zip(names, row))
+			
+			for f in freedges:
+				old = current.get(int(f.freedge_id))
+				if old is None:
+					continue		# The freedge is not in the database
+				columns = {}
+				for ((table, column), value) in self._freedge_to_columns(f).items():
+					if self._column_changed(column, old[column], value):
+						columns.setdefault(table, []).append((column, value))
+				if (len(columns) > 0):
+					changed_ids.append(int(f.freedge_id))
+				for (table, pairs) in columns.items():
+					key = (table, tuple(column for (column, value) in pairs))
+					values = [value for (column, value) in pairs] + [f.freedge_id]
+					updates.setdefault(key, []).append(values)
+			
+			# Write each group of updates
+			for ((table, columns), rows) in updates.items():
+				sql = "UPDATE " + table + " SET " + \
+					", ".join(column + " = ?" for column in columns) + \
+					" WHERE freedge_id = ?"
+				cur.executemany(sql, rows)
+		if (len(changed_ids) > 0):
+			self._data_changed()
+			self._notify_listeners(changed_ids)
+		return len(changed_ids)
 		
+	def get_freedge(self, freedge_id):
+		"""
+		Retrieves a single freedge by its database ID, using a primary key
+		lookup rather than reading the whole database.
+
+		Parameters: freedge_id -> the int database ID of the freedge.
+
+		Returns: A Freedge object, or None if there is no such freedge.
+		"""
+		cur = self.open_connection().cursor()
+		cur.execute("SELECT * FROM freedges JOIN addresses USING(freedge_id)"
+					" WHERE freedge_id = ?", [freedge_id])
+		row = cur.fetchone()
+		cur.close()
+		if row is None:
+			return None
+		return self.row_to_freedge(row)
+
+	def get_by_project_name(self, name):
+		"""
+		Retrieves a single freedge by its project name, using the index on
+		the project_name column. If more than one freedge has the name, the
+		first one added (with the lowest ID) is returned.
+
+		Parameters: name -> the str project name of the freedge.
+
+		Returns: A Freedge object, or None if there is no such freedge.
+		"""
+		cur = self.open_connection().cursor()
+		cur.execute("SELECT * FROM freedges JOIN addresses USING(freedge_id)"
+					" WHERE project_name = ? ORDER BY freedge_id LIMIT 1", [name])
+		row = cur.fetchone()
+		cur.close()
+		if row is None:
+			return None
+		return self.row_to_freedge(row)
+
+	def get_freedges_by_id(self, freedge_ids):
+		"""
+		Retrieves the freedges with the given database IDs.
+
+		Parameters: freedge_ids -> a list of int database IDs.
+
+		Returns: A dict of {freedge_id: Freedge} for each ID which was found.
+		"""
+		found = {}
+		cur = self.open_connection().cursor()
+		# Look the IDs up in chunks, staying under SQLite's limit on the
+		# number of ? parameters in a single statement
+		for i in range(0, len(freedge_ids), 500):
+			chunk = freedge_ids[i:i + 500]
+			cur.execute("SELECT * FROM freedges JOIN addresses USING(freedge_id)"
+						" WHERE freedge_id IN (" + ",".join("?" * len(chunk)) + ")",
+						chunk)
+			for row in cur.fetchall():
+				found[row[0]] = self.row_to_freedge(row)
+		cur.close()
+		return found
+
+	def diff_csv(self, new_csv_data):
+		"""
+		Determines the changes which loading the passed csv file would make to
+		the database, matching freedges by their project name.
+
+		Parameters: new_csv_data -> a string of the name of the desired csv file
+
+		Returns: A DatabaseDiff, whose ChangeRecords can be paged through.
+
+		Raises: CSVHeaderError if the csv file is missing any required columns.
+		"""
+		# The csv rows are streamed past the existing data one at a time
+		new_freedge_dataset = FD.iter_freedge_data_file(new_csv_data)
+		return diff_database(self, new_freedge_dataset)
+
+	def apply_diff(self, diff):
+		"""
+		Updates the database in place with the changes computed by diff_csv(),
+		within a single transaction. Removed freedges are deleted, modified
+		freedges are updated by their ID, and added freedges are inserted. The
+		status and last status update of a modified freedge are kept, so the
+		history collected through notifications is not lost.
+
+		Parameters: diff -> a DatabaseDiff computed against this database.
+
+		Returns: An int, the number of freedges which were changed.
+		"""
+		sql_update_freedge = \
+			'''UPDATE freedges SET network_name = ?, date_installed = ?,
+					contact_name = ?, phone_number = ?, email_address = ?,
+					permission_to_contact = ?, preferred_contact_method = ?
+				WHERE freedge_id = ?'''
+		sql_upsert_address = \
+			'''INSERT INTO addresses(freedge_id, street_address, city,
+					state_province, zip_code, country)
+				VALUES(?,?,?,?,?,?)
+				ON CONFLICT(freedge_id) DO UPDATE SET
+					street_address = excluded.street_address,
+					city = excluded.city,
+					state_province = excluded.state_province,
+					zip_code = excluded.zip_code,
+					country = excluded.country'''
+		removed = [(fid,) for fid in diff.removed_ids()]
+		modified = diff.modified_rows()
+		added = diff.new_rows(ChangeType.Add)
+		with self.connections.transaction() as conn:
+			cur = conn.cursor()
+			# Since the freedge IDs cannot be read back from an executemany
+			# call, assign the added freedges theirs here so that each address
+			# can be linked to its freedge. As with AUTOINCREMENT, the IDs of
+			# removed freedges are never reused.
+			cur.execute("SELECT MAX(COALESCE(MAX(freedge_id), 0), COALESCE("
+						"(SELECT seq FROM sqlite_sequence WHERE name = 'freedges'), 0))"
+						" FROM freedges")
+			first_id = cur.fetchone()[0] + 1
+			ids = range(first_id, first_id + len(added))
+			cur.executemany("DELETE FROM addresses WHERE freedge_id = ?", removed)
+			cur.executemany("DELETE FROM freedges WHERE freedge_id = ?", removed)
+			cur.executemany(sql_update_freedge,
+							[[f[1], f[2], f[3], f[5], f[6], f[7], f[8], fid]
+							 for (fid, (f, a)) in modified])
+			cur.executemany(sql_upsert_address,
+							[[fid] + list(a) for (fid, (f, a)) in modified])
+			cur.executemany(schema.SQL_INSERT_FREEDGE,
+							[[fid] + list(f) for (fid, (f, a)) in zip(ids, added)])
+			cur.executemany(schema.SQL_INSERT_ADDRESS,
+							[[fid] + list(a) for (fid, (f, a)) in zip(ids, added)])
+		self._data_changed()
+		return len(removed) + len(modified) + len(added)
+
 	def compare_databases(self, new_csv_data):
 		""" 
 		Determines what freedges have data that is different from the data in
@@ -329,177 +949,12 @@ class FreedgeDatabase:
 		Returns:
 			Tuple of lists of freedges whose data is different from the 
 			data in the passed in csv file argument -> (to_add, to_remove, to_modify).
+			Each entry of to_modify is a tuple of the (current, new) Freedges.
 		"""
-		
-		# Open the connection and verify that it was made successfully
-		conn = self.open_connection()
-		if conn is None:
-			ConnectionError("Failure to connect to the original database.")
-		cur = conn.cursor()
-
-		# Define the structure of the new (temporary) addresses table
-		sql_new_addresses = \
-			""" CREATE TABLE IF NOT EXISTS new_addresses (
-				freedge_id INTEGER PRIMARY KEY,
-				street_address varchar(255),
-				city varchar(255),
-				state_province varchar(255),
-				zip_code varchar(10),
-				country varchar(50)
-			);"""
-		
-		# Define the structure of the new (temporary) freedges table
-		sql_new_csv_data = \
-			""" CREATE TABLE IF NOT EXISTS new_freedges (
-				freedge_id INTEGER PRIMARY KEY AUTOINCREMENT,
-				project_name varchar(255),
-				network_name varchar(255),
-				date_installed date,
-				contact_name varchar(255),
-				active_status varchar(50),
-				last_status_update date DEFAULT NULL,
-				phone_number varchar(50),
-				email_address varchar(50),
-				permission_to_contact int DEFAULT 0,
-				preferred_contact_method varchar(10)
-			);"""
-		
-		# Create the new temporary tables to compare the current data to
-		cur.execute("DROP TABLE IF EXISTS new_addresses;")
-		cur.execute("DROP TABLE IF EXISTS new_freedges;")
-		self.create_table(conn, sql_new_csv_data)
-		self.create_table(conn, sql_new_addresses)
-		
-		# Parse the data from the new csv file
-		new_freedge_dataset = FD.parse_freedge_data_file(new_csv_data)
-		# Insert the data into the new temporary tables
-		for freedge_data in new_freedge_dataset:
-			fid = self.new_freedge(conn, freedge_data[0], True)
-			address_data = [str(fid)] + freedge_data[1]
-			self.new_address(conn, address_data, True)
-		
-		# =====================================================================
-		# Get the freedges that would be ADDED to the database
-		# =====================================================================
-		sql = '''SELECT new.freedge_id, new.project_name, new.network_name, new.contact_name,
-		 				new.date_installed, new.active_status, new.last_status_update,
-		 				new.phone_number, new.email_address, new.permission_to_contact,
-		 				new.preferred_contact_method, new.street_address, new.city,
-		 				new.state_province, new.zip_code, new.country  FROM (new_freedges f2
-					JOIN new_addresses a2
-					USING (freedge_id))
-					AS new
-				WHERE NOT EXISTS(
-					SELECT * FROM (freedges f1
-					JOIN addresses a1
-					USING(freedge_id))
-					AS old
-				WHERE old.project_name = new.project_name)
-				'''
-		cur.execute(sql)
-		rows_to_add = cur.fetchall()
-		
-		# =====================================================================
-		# Get the freedges that would be REMOVED from the database
-		# =====================================================================
-		sql = '''SELECT old.freedge_id, old.project_name, old.network_name, old.contact_name,
-		 				old.date_installed, old.active_status, old.last_status_update,
-		 				old.phone_number, old.email_address, old.permission_to_contact,
-		 				old.preferred_contact_method, old.street_address, old.city,
-		 				old.state_province, old.zip_code, old.country FROM (freedges f1
-					JOIN addresses a1
-					USING(freedge_id))
-					AS old
-				WHERE NOT EXISTS(
-					SELECT * FROM (new_freedges f2
-					JOIN new_addresses a2
-					USING (freedge_id))
-					AS new
-				WHERE old.project_name = new.project_name)
-				'''
-		cur.execute(sql)
-		rows_to_remove = cur.fetchall()
-		
-		# =====================================================================
-		# Get the freedges that would be CHANGED within the database
-		# =====================================================================
-		sql = '''SELECT old.freedge_id, old.project_name, old.network_name, old.contact_name,
-		 				old.date_installed, old.active_status, old.last_status_update,
-		 				old.phone_number, old.email_address, old.permission_to_contact,
-		 				old.preferred_contact_method, old.street_address, old.city,
-		 				old.state_province, old.zip_code, old.country FROM (freedges f1
-					JOIN addresses a1
-					USING(freedge_id))
-					AS old
-				WHERE EXISTS(
-					SELECT * FROM (new_freedges f2
-					JOIN new_addresses a2
-					USING (freedge_id))
-					AS new
-				WHERE old.project_name = new.project_name
-					AND (old.network_name != new.network_name
-					OR old.contact_name != new.contact_name
-					OR old.date_installed != new.date_installed
-					OR old.active_status != new.active_status
-					OR old.last_status_update != new.last_status_update
-					OR old.phone_number != new.phone_number
-					OR old.email_address != new.email_address
-					OR old.permission_to_contact != new.permission_to_contact
-					OR old.preferred_contact_method != new.preferred_contact_method
-					OR old.street_address != new.street_address
-					OR old.city != new.city
-					OR old.state_province != new.state_province
-					OR old.zip_code != new.zip_code
-					OR old.country != new.country))
-				'''
-		cur.execute(sql)
-		rows_modify_from = cur.fetchall()
-		
-		sql = '''SELECT old.freedge_id, old.project_name, old.network_name, old.contact_name,
-		 				old.date_installed, old.active_status, old.last_status_update,
-		 				old.phone_number, old.email_address, old.permission_to_contact,
-		 				old.preferred_contact_method, old.street_address, old.city,
-		 				old.state_province, old.zip_code, old.country  FROM (freedges f1
-							JOIN addresses a1
-							USING(freedge_id))
-							AS old
-						WHERE EXISTS(
-							SELECT * FROM (new_freedges f2
-							JOIN new_addresses a2
-							USING (freedge_id))
-							AS new
-						WHERE old.project_name = new.project_name
-							AND (old.network_name != new.network_name
-							OR old.contact_name != new.contact_name
-							OR old.date_installed != new.date_installed
-							OR old.active_status != new.active_status
-							OR old.last_status_update != new.last_status_update
-							OR old.phone_number != new.phone_number
-							OR old.email_address != new.email_address
-							OR old.permission_to_contact != new.permission_to_contact
-							OR old.preferred_contact_method != new.preferred_contact_method
-							OR old.street_address != new.street_address
-							OR old.city != new.city
-							OR old.state_province != new.state_province
-							OR old.zip_code != new.zip_code
-							OR old.country != new.country))
-						'''
-		cur.execute(sql)
-		rows_modify_to = cur.fetchall()
-
-		to_add = self.query_to_freedgelist(rows_to_add)
-		to_remove = self.query_to_freedgelist(rows_to_remove)
-		to_modify = []
-		for i in range(len(rows_modify_from)):
-			f1 = self.row_to_freedge(rows_modify_from[i])
-			f2 = self.row_to_freedge(rows_modify_to[i])
-			to_modify.append((f1, f2))
-		
-		cur.execute("DROP TABLE IF EXISTS new_addresses;")
-		cur.execute("DROP TABLE IF EXISTS new_freedges;")
-		
-		# Close the connection
-		conn.close()
+		diff = self.diff_csv(new_csv_data)
+		to_add = [r.new for r in diff.page(ChangeType.Add)]
+		to_remove = [r.old for r in diff.page(ChangeType.Remove)]
+		to_modify = [(r.old, r.new) for r in diff.page(ChangeType.Modify)]
 		return (to_add, to_remove, to_modify)
 
 def exists_internal_database(db_path):
@@ -514,95 +969,399 @@ def exists_internal_database(db_path):
 
 def load_internal_database(db_path):
 	""" 
-	Loads and returns the database at the given path. 
+	Loads and returns the database at the given path, upgrading its schema
+	if it was created by an older version of the system.
 	
 	Parameters: db_path -> a string indicating the path of the database to be loaded.
 
 	Returns:
 		freedgeDB -> Instance of FreedgeDatabase object.
 	"""
+	freedgeDB = FreedgeDatabase(db_path)
 	try:
-		sqlite3.connect(DATABASE_PATH_INFO)
+		# Bring files created by older versions of the system up to date
+		freedgeDB.upgrade_schema()
 	except Error as e:
 		ConnectionError(e, " Unable to find or connect to database at the given path.")
 		return None
-	freedgeDB = FreedgeDatabase(db_path)
 	return freedgeDB
 	
-def new_database_from_csv(db_path: str, csv_file_path: str):
+def _remove_database_file(path):
+	"""
+	Deletes a database file, along with the write-ahead log and shared memory
+	files SQLite keeps beside it, if they exist. Intended for internal use only.
+
+	Parameters: path -> str Path of the database file.
+
+	Returns: None
+	"""
+	for suffix in ("", "-wal", "-shm"):
+		if exists(path + suffix):
+			os.remove(path + suffix)
+
+def _prepare_shadow_database(shadowDB):
+	"""
+	Brings a shadow database's tables up to the current schema version, and
+	stops its full-text index from being updated row by row while the data is
+	imported; _replace_database() indexes every row once the import is done.
+	Intended for internal use only.
+
+	Parameters: shadowDB -> the FreedgeDatabase of the shadow database.
+
+	Returns: None
+	"""
+	shadowDB.upgrade_schema()
+	with shadowDB.connections.transaction() as conn:
+		schema.suspend_search_index(conn)
+
+def _open_shadow_import(shadow_path, csv_file_path, batch_size, resume):
+	"""
+	Opens the shadow database a csv file is imported into, continuing an
+	interrupted import of the same csv file if there is one. Otherwise, any
+	leftover shadow database is replaced with an empty one.
+	Intended for internal use only.
+
+	Parameters:
+		shadow_path -> str Path of the shadow database.
+		csv_file_path -> str Path of the input csv file.
+		batch_size -> int number of rows to insert at a time.
+		resume -> bool whether an interrupted import may be continued.
+
+	Returns: a CSVImport into the shadow database
+	"""
+	if (resume and exists(shadow_path)):
+		shadowDB = FreedgeDatabase(shadow_path)
+		try:
+			_prepare_shadow_database(shadowDB)
+			importer = CSVImport(shadowDB, csv_file_path, batch_size)
+			if importer.can_resume():
+				return importer
+		except Error:
+			pass		# The shadow database is unusable, so start again
+		shadowDB.close()
+	_remove_database_file(shadow_path)
+	shadowDB = FreedgeDatabase(shadow_path)
+	_prepare_shadow_database(shadowDB)
+	return CSVImport(shadowDB, csv_file_path, batch_size)
+
+def _link_or_copy(source_path, dest_path):
+	"""
+	Gives a file a second name by hard linking it, which takes no time or
+	extra space, or copies it where the file system does not allow links.
+	Intended for internal use only.
+
+	Parameters:
+		source_path -> str Path of the existing file.
+		dest_path -> str Path to give it.
+
+	Returns: None
+	"""
+	try:
+		os.link(source_path, dest_path)
+	except OSError:
+		shutil.copy2(source_path, dest_path)
+
+def _replace_database(shadowDB, db_path):
+	"""
+	Moves a finished shadow database into place at db_path in a single step,
+	so that the database at db_path is never seen partly written. The file
+	it replaces is kept beside it (named by adding BACKUP_DATABASE_SUFFIX),
+	so that it can be restored by restore_previous_database().
+	Intended for internal use only.
+
+	Parameters:
+		shadowDB -> the FreedgeDatabase of the shadow database.
+		db_path -> str Path of the database to replace.
+
+	Returns: None
+	"""
+	# Index the newly imported rows for searching all at once, then gather
+	# the query planner's statistics on them
+	with shadowDB.connections.transaction() as conn:
+		schema.rebuild_search_index(conn)
+	shadowDB.analyze()
+	# Write everything in the shadow database's write-ahead log into the file
+	# itself, since the log is not moved along with it
+	shadowDB.checkpoint()
+	shadowDB.close()
+	if exists(db_path):
+		# Likewise, fold the old database's log into it, so that the snapshot
+		# is complete and no stale log is left beside the new file
+		oldDB = FreedgeDatabase(db_path)
+		try:
+			oldDB.checkpoint()
+		except Error:
+			pass		# The old file is not a database; it is replaced anyway
+		oldDB.close()
+		# Keep the old file as a snapshot to roll back to
+		backup_path = db_path + BACKUP_DATABASE_SUFFIX
+		_remove_database_file(backup_path)
+		_link_or_copy(db_path, backup_path)
+	# Anything still connected to the old file reconnects to the new one the
+	# next time it is used (see connection_manager.py)
+	os.replace(shadowDB.db_location, db_path)
+
+def _rebuild_database(db_path, freedge_dataset, batch_size):
+	"""
+	Replaces the database at db_path with a new one holding the parsed data.
+	The new database is built in a shadow file, so the old database can be
+	read as usual until the new one is complete.
+	Intended for internal use only.
+
+	Parameters:
+		db_path -> str Path of database to be created.
+		freedge_dataset -> an iterable of (freedge_data, address_data) tuples
+		batch_size -> int number of rows to insert at a time.
+
+	Returns:
+		freedgeDB - a FreedgeDatabase class instance.
+	"""
+	shadow_path = db_path + SHADOW_DATABASE_SUFFIX
+	_remove_database_file(shadow_path)
+	shadowDB = FreedgeDatabase(shadow_path)
+	try:
+		# Create the tables at the current schema version (the structure of
+		# the tables is defined in database_schema.py) and insert the data
+		with shadowDB.connections.transaction() as conn:
+			schema.apply_migrations(conn)
+			schema.suspend_search_index(conn)
+			stats = shadowDB.bulk_insert_freedges(freedge_dataset, batch_size)
+	except BaseException:
+		shadowDB.close()
+		_remove_database_file(shadow_path)
+		raise
+	_replace_database(shadowDB, db_path)
+
+	freedgeDB = FreedgeDatabase(db_path)
+	freedgeDB.import_stats = stats
+	return freedgeDB
+
+def restore_previous_database(db_path: str):
+	"""
+	Rolls the database at db_path back to the snapshot kept when it was last
+	replaced by a new database. The current file becomes the snapshot in
+	turn, so the restore can itself be undone by calling this again.
+
+	Parameters: db_path -> str Path of the database to restore.
+
+	Returns:
+		freedgeDB - a FreedgeDatabase class instance for the restored database.
+
+	Raises:
+		FileNotFoundError - if there is no snapshot of the database.
+	"""
+	backup_path = db_path + BACKUP_DATABASE_SUFFIX
+	if not exists(backup_path):
+		raise FileNotFoundError("There is no earlier version of the database at: " + db_path)
+	swap_path = backup_path + SHADOW_DATABASE_SUFFIX
+	_remove_database_file(swap_path)
+	if exists(db_path):
+		currentDB = FreedgeDatabase(db_path)
+		currentDB.checkpoint()
+		currentDB.close()
+		_link_or_copy(db_path, swap_path)
+	# Each step is a single rename, so there is always a database at db_path
+	os.replace(backup_path, db_path)
+	if exists(swap_path):
+		os.replace(swap_path, backup_path)
+
+	freedgeDB = FreedgeDatabase(db_path)
+	# The snapshot may have been made by an older version of the system
+	freedgeDB.upgrade_schema()
+	return freedgeDB
+
+def new_database_from_csv(db_path: str, csv_file_path: str, batch_size=IMPORT_BATCH_SIZE,
+						  resume=True, progress=None):
 	""" 
 	Creates and returns a new internal database from a csv file. 
+
+	The database is built in a shadow file beside db_path (named by adding
+	SHADOW_DATABASE_SUFFIX), which replaces the file at db_path only once the
+	import has finished; the file it replaces is kept as a snapshot, which
+	restore_previous_database() rolls back to. Rows which cannot be imported
+	are written to the 'rejected_rows' table rather than stopping the import.
+	If an import is interrupted, calling this again with the same, unchanged
+	csv file resumes it from the last batch it committed.
 	
 	Parameters:
 		db_path -> str Path of database to be created.
 		csv_file_path -> str Path of the input csv file.
+		batch_size -> int number of rows to insert at a time. Each batch is
+					  committed along with a checkpoint of the import.
+		resume -> bool whether to continue an interrupted import of the
+				  same csv file, rather than starting again.
+		progress -> an optional function of (ImportStats, fraction of the
+					file imported), called after each batch is committed.
+					If it raises an exception (for example, because the
+					import was cancelled), the import stops and the shadow
+					database is kept so that it can be resumed.
 
 	Returns:
-		freedgeDB - a FreedgeDatabase class instance.
+		freedgeDB - a FreedgeDatabase class instance. The statistics of the
+					import are stored as an ImportStats object in its
+					import_stats attribute.
+
+	Raises:
+		CSVHeaderError - if a csv file is missing any of the required columns.
 	"""
+	# Check the header row before anything is written
+	FD.ImportPlan.from_file(csv_file_path)
+	importer = _open_shadow_import(db_path + SHADOW_DATABASE_SUFFIX, csv_file_path,
+								   batch_size, resume)
+	try:
+		stats = importer.run(progress)
+	except BaseException:
+		# Keep the shadow database, so that the import can be resumed
+		importer.fdb.close()
+		raise
+	_replace_database(importer.fdb, db_path)
 
-	# This defines the structure of the addresses table
-	sql_address_table = \
-		""" CREATE TABLE IF NOT EXISTS addresses (
-			freedge_id INTEGER PRIMARY KEY,
-			street_address varchar(255),
-			city varchar(255),
-			state_province varchar(255),
-			zip_code varchar(10),
-			country varchar(50)
-		);"""
-	
-	# This defines the structure of the freedges table
-	sql_freedges_table = \
-		""" CREATE TABLE IF NOT EXISTS freedges (
-			freedge_id INTEGER PRIMARY KEY AUTOINCREMENT,
-			project_name varchar(255),
-			network_name varchar(255),
-			contact_name varchar(255),
-			date_installed date,
-			active_status varchar(50) DEFAULT 'Unknown',
-			last_status_update date DEFAULT NULL,
-			phone_number varchar(50),
-			email_address varchar(50),
-			permission_to_contact int,
-			preferred_contact_method varchar(10)
-		);"""
-	
-	# Create the new FreedgeDatabase class object
 	freedgeDB = FreedgeDatabase(db_path)
-	# create a database connection
-	conn = freedgeDB.open_connection()
+	freedgeDB.import_stats = stats
+	return freedgeDB
 
-	# If the connection was successful, create the tables
-	if conn is not None:
-		cur = conn.cursor()
-		# create projects table
-		sql = "DROP TABLE IF EXISTS addresses;"
-		cur.execute(sql)
-		freedgeDB.create_table(conn, sql_address_table)
-		
-		# create tasks table
-		sql = "DROP TABLE IF EXISTS freedges;"
-		cur.execute(sql)
-		freedgeDB.create_table(conn, sql_freedges_table)
-	else:
-		ConnectionError("Error: Could not create the database connection.")
-	
-	# Now that the (empty) tables have been created, parse data from the csv file
-	freedge_dataset = FD.parse_freedge_data_file(csv_file_path)
-	# Insert all the parsed data into the database tables
-	for freedge_data in freedge_dataset:
-		# Add the individual freedge to the SQL table
-		# So long as there is SOME kind of response to their preferred contact method,
-		# set the most recent update to today.
-		data_fields = freedge_data[0]
-		fid = freedgeDB.new_freedge(conn, data_fields)
-		address_data = [str(fid)] + freedge_data[1]
-		freedgeDB.new_address(conn, address_data)
+def _parse_csv_batch(csv_file_path, offset, line_number, batch_size):
+	"""
+	Parses the next batch of rows of a csv file, starting from the record
+	which begins at the given byte offset (or just past the header row, if
+	the offset is 0). This runs in a worker process, so only a single batch
+	of the file is held in memory and sent back at a time.
+	Intended for internal use only.
+
+	Parameters:
+		csv_file_path -> str path of the csv file.
+		offset -> int byte offset of the first record of the batch.
+		line_number -> int number of lines before that record.
+		batch_size -> int largest number of rows in the batch.
+
+	Returns: a tuple of (list of (freedge_data, address_data) tuples, byte
+			 offset just past the batch, line number just past the batch,
+			 whether the end of the file was reached)
+
+	Raises: csv.Error if a row of the file is not valid csv or UTF-8 text.
+	"""
+	plan = FD.ImportPlan.from_file(csv_file_path)
+	reader = CSVRecordReader(csv_file_path, offset, line_number)
+	records = iter(reader)
+	if (offset == 0):
+		next(records, None)		# Skip the header row
+	rows = []
+	finished = True
+	for (record_line, row, reason, raw) in records:
+		if reason is not None:
+			records.close()
+			raise csv.Error(csv_file_path + ", line " + str(record_line) + ": " + reason)
+		# Skip blank lines, as csv.DictReader does
+		if (len(row) > 0):
+			rows.append(row)
+		if (len(rows) == batch_size):
+			finished = False
+			break
+	records.close()
+	return (plan.parse_batch(rows), reader.offset, reader.line_number, finished)
+
+class _CSVFileParse:
+	"""
+	The progress of parsing one csv file a batch at a time in the worker
+	processes of _parse_csv_files(). Intended for internal use only.
+
+	Attributes
+	-----------
+	path -> a string of the path of the csv file
+	offset -> the int byte offset of the next batch to parse
+	line_number -> the int number of lines before the next batch
+	finished -> whether the last batch of the file has been parsed
+	pending -> the Future of the batch being parsed, or None
+	parsed -> a deque of the parsed batches which have not been used yet
+	"""
+	def __init__(self, path):
+		self.path = path
+		self.offset = 0
+		self.line_number = 0
+		self.finished = False
+		self.pending = None
+		self.parsed = deque()
+
+	def poll(self, executor, batch_size):
+		"""
+		Collects the batch being parsed if it is ready, and starts parsing the
+		next one, unless CSV_PARSE_AHEAD batches are already waiting to be used.
+		"""
+		if self.pending is not None and self.pending.done():
+			(rows, self.offset, self.line_number, self.finished) = self.pending.result()
+			self.pending = None
+			self.parsed.append(rows)
+		if (self.pending is None and not self.finished
+				and len(self.parsed) < CSV_PARSE_AHEAD):
+			self.pending = executor.submit(_parse_csv_batch, self.path, self.offset,
+										   self.line_number, batch_size)
+
+def _parse_csv_files(csv_file_paths, workers, batch_size=IMPORT_BATCH_SIZE):
+	"""
+	Parses csv files in parallel in a pool of worker processes, yielding the
+	parsed rows of each file in the order the files were given. Each worker
+	parses and sends back a single batch of batch_size rows at a time, and
+	the next batch of a file is only parsed once fewer than CSV_PARSE_AHEAD
+	of its batches are waiting to be used, so the memory used stays bounded
+	however large the files are. As many files as there are workers are
+	parsed at once, ahead of the rows of earlier files being consumed.
+	Intended for internal use only.
+
+	Parameters:
+		csv_file_paths -> list of str paths of the input csv files.
+		workers -> int maximum number of worker processes, or None to use
+				   one per CPU.
+		batch_size -> int number of rows parsed and sent back at a time.
+
+	Returns: (yields) (freedge_data, address_data) tuples
+	"""
+	files = [_CSVFileParse(path) for path in csv_file_paths]
+	window = workers or os.cpu_count() or 1
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for i in range(len(files)):
+			current = files[i]
+			while True:
+				for parse in files[i:i + window]:
+					parse.poll(executor, batch_size)
+				if (len(current.parsed) > 0):
+					yield from current.parsed.popleft()
+				elif current.finished:
+					break
+				else:
+					wait([current.pending])
+
+def new_database_from_csvs(db_path: str, csv_file_paths, workers=None,
+						   batch_size=IMPORT_BATCH_SIZE):
+	"""
+	Creates and returns a new internal database from several csv files which
+	share the same format, such as the exports of each regional organizer.
+	The files are parsed in parallel by a pool of worker processes, and the
+	results are merged into the database by this process alone, in bulk.
 	
-	# Commit the changes
-	conn.commit()
-	# Close the connection
-	conn.close()
-	# Return the FreedgeDatabase class instance
-	return freedgeDB
+	As with new_database_from_csv(), the database is built in a shadow file
+	and replaces the file at db_path only once it is complete, keeping the
+	file it replaces as a snapshot.
+
+	Parameters:
+		db_path -> str Path of database to be created.
+		csv_file_paths -> list of str paths of the input csv files.
+		workers -> int maximum number of worker processes used to parse the
+				   files. Defaults to the number of CPUs.
+		batch_size -> int number of rows to insert at a time. All of the
+					  rows are inserted within a single transaction.
+
+	Returns:
+		freedgeDB - a FreedgeDatabase class instance. The statistics of the
+					import are stored as an ImportStats object in its
+					import_stats attribute.
+
+	Raises:
+		CSVHeaderError - if a csv file is missing any of the required columns.
+	"""
+	csv_file_paths = list(csv_file_paths)
+	# Check the header row of every file before any of them are parsed, so
+	# that a file in the wrong format is rejected before the import begins
+	for csv_file_path in csv_file_paths:
+		FD.ImportPlan.from_file(csv_file_path)
+	freedge_dataset = _parse_csv_files(csv_file_paths, workers, batch_size)
+	return _rebuild_database(db_path, freedge_dataset, batch_size)
@@ -0,0 +1,402 @@
+"""
+===============================================================================
+Title:	Query Builder for the Freedge Database
+===============================================================================
+Description:	Builds the SQL used to search, filter, and sort the freedges in
+		a FreedgeDatabase, so that the work is done by SQLite using its
+		indexes, rather than by reading every freedge into Python.
+
+		A FreedgeQuery is built up one step at a time, and each step
+		returns a new query, leaving the one it was called on unchanged:
+
+			fdb.query().search("main").with_status(Status.Active) \\
+					   .sort_by("last_status_update", descending=True)
+
+		Searches match the freedges with a word starting with each word
+		of the search in their project name, caretaker's name, or
+		address, ignoring case and accents, using the freedge_search
+		full-text index added in schema version 7. If SQLite does not
+		include FTS5, searches instead match the start of the project
+		name, the caretaker's name, or the city, using the NOCASE indexes
+		added in schema version 6. Either way, a search only reads the
+		rows which match it.
+"""
+import re
+from InternalData.freedge_constants import FIRST_UPDATE_THRESHOLD
+from FreedgeDatabase.freedge_data_entry import Status, ContactMethod
+
+# The columns which freedges can be sorted by, and the SQL each is sorted by.
+# Ties are broken by the freedge_id, so that every order is well defined.
+SORT_COLUMNS = {
+	"freedge_id": "freedge_id",
+	"project_name": "project_name COLLATE NOCASE",
+	"contact_name": "contact_name COLLATE NOCASE",
+	"city": "city COLLATE NOCASE",
+	"active_status": "active_status",
+	"last_status_update": "last_status_update"
+}
+
+# A search matching more than this fraction of the freedges is paged through by
+# reading the freedges in order and skipping those which do not match, which
+# finds a page sooner than collecting every match through the search indexes
+_SCAN_FRACTION = 0.25
+
+# Folds the ASCII uppercase letters to lowercase, as SQLite's NOCASE does
+_NOCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _like_prefix(text):
+	"""
+	Builds a LIKE pattern (using \\ as the escape character) which matches
+	the strs starting with text.
+
+	Parameters: text -> the str to match the start of
+
+	Returns: a str
+	"""
+	escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+	return escaped + "%"
+
+def search_words(text):
+	"""
+	Splits the text of a search into its words, ignoring punctuation.
+
+	Parameters: text -> the str searched for
+
+	Returns: a list of strs
+	"""
+	return re.findall(r"\w+", text or "")
+
+def fts_match(words):
+	"""
+	Builds an FTS5 MATCH expression which matches the rows containing a word
+	starting with each of the given words.
+
+	Parameters: words -> a list of strs, as returned by search_words()
+
+	Returns: a str
+	"""
+	return " ".join('"' + word + '"*' for word in words)
+
+class _Descending:
+	"""
+	Wraps a sort key so that it sorts in the opposite order.
+	"""
+	__slots__ = ("key",)
+
+	def __init__(self, key):
+		self.key = key
+
+	def __lt__(self, other):
+		return other.key < self.key
+
+	def __gt__(self, other):
+		return other.key > self.key
+
+	def __le__(self, other):
+		return other.key <= self.key
+
+	def __ge__(self, other):
+		return other.key >= self.key
+
+	def __eq__(self, other):
+		return self.key == other.key
+
+class FreedgeQuery:
+	"""
+	A search of the freedges in a FreedgeDatabase, with optional filters and
+	a sort order.
+
+	Attributes
+	-----------
+	fdb -> the FreedgeDatabase which is searched
+	text -> the str searched for in the freedges' names and addresses
+	statuses -> a tuple of the Statuses to include, or () for all of them
+	contact_methods -> a tuple of the ContactMethods to include, or () for all
+	threshold -> if only out-of-date freedges are included, the int number of
+				 days after which a status is out of date; otherwise None
+	sort -> the name of the column the freedges are sorted by
+	descending -> whether the freedges are sorted in descending order
+
+	Methods
+	--------
+	search(text): Returns a query for freedges whose names or address match
+				  the words of text
+	with_status(*statuses): Returns a query for freedges with these Statuses
+	with_contact_method(*methods): Returns a query for freedges whose
+								   caretakers prefer these ContactMethods
+	out_of_date(threshold): Returns a query for out-of-date freedges only
+	sort_by(column, descending): Returns a query sorted by the column
+	count(): Returns the number of matching freedges
+	page(offset, limit): Returns a range of the matching freedges
+	by_id(freedge_ids): Returns those of the given freedges which match
+	sort_key(f): Returns a value which sorts Freedges in the query's order
+	"""
+	def __init__(self, fdb, text="", statuses=(), contact_methods=(),
+				 threshold=None, sort="freedge_id", descending=False):
+		"""
+		Initializes a query for the freedges of fdb. With the default
+		arguments, every freedge matches, in order of freedge_id.
+		"""
+		if sort not in SORT_COLUMNS:
+			raise ValueError("Freedges cannot be sorted by: " + str(sort))
+		self.fdb = fdb
+		self.text = text
+		self.statuses = tuple(statuses)
+		self.contact_methods = tuple(contact_methods)
+		self.threshold = threshold
+		self.sort = sort
+		self.descending = descending
+
+	def _replace(self, **changes):
+		"""
+		Returns a copy of the query with some of its attributes changed.
+		Intended for internal use only.
+		"""
+		fields = {"text": self.text, "statuses": self.statuses,
+				  "contact_methods": self.contact_methods,
+				  "threshold": self.threshold, "sort": self.sort,
+				  "descending": self.descending}
+		fields.update(changes)
+		return FreedgeQuery(self.fdb, **fields)
+
+	def search(self, text):
+		"""
+		Returns a query which also requires the project name, the caretaker's
+		name, or the address of each freedge to contain a word starting with
+		each word of text, ignoring case. Without the full-text index, the
+		project name, caretaker's name, or city must start with text instead.
+
+		Parameters: text -> the str to search for. Blank text matches everything.
+
+		Returns: a FreedgeQuery
+		"""
+		return self._replace(text=(text or "").strip())
+
+	def with_status(self, *statuses):
+		"""
+		Returns a query which also requires each freedge to have one of the
+		given Statuses. With no Statuses, freedges of every Status match.
+
+		Parameters: statuses -> Status values
+
+		Returns: a FreedgeQuery
+		"""
+		return self._replace(statuses=tuple(s for s in Status if s in statuses))
+
+	def with_contact_method(self, *methods):
+		"""
+		Returns a query which also requires each freedge's caretaker to prefer
+		one of the given ContactMethods. With no ContactMethods, freedges with
+		any (or no) preferred contact method match.
+
+		Parameters: methods -> ContactMethod values
+
+		Returns: a FreedgeQuery
+		"""
+		return self._replace(contact_methods=tuple(m for m in ContactMethod if m in methods))
+
+	def out_of_date(self, threshold=FIRST_UPDATE_THRESHOLD):
+		"""
+		Returns a query which also requires each freedge's information to be
+		out of date, as FreedgeDatabase.get_out_of_date() does.
+
+		Parameters: threshold -> the int number of days after which a status
+								 is considered out of date.
+
+		Returns: a FreedgeQuery
+		"""
+		return self._replace(threshold=threshold)
+
+	def sort_by(self, column, descending=False):
+		"""
+		Returns a query which sorts the freedges by a column.
+
+		Parameters:
+			column -> the name of a column in SORT_COLUMNS
+			descending -> whether to sort in descending order
+
+		Returns: a FreedgeQuery
+
+		Raises: ValueError if the freedges cannot be sorted by the column
+		"""
+		return self._replace(sort=column, descending=descending)
+
+	def key(self):
+		"""
+		Returns a hashable value which is the same for queries matching the
+		same freedges in the same order, used to cache their results.
+
+		Parameters: None
+
+		Returns: a tuple
+		"""
+		return (self.text, self.statuses, self.contact_methods, self.threshold,
+				self.sort, self.descending)
+
+	def __eq__(self, other):
+		return (isinstance(other, FreedgeQuery) and self.fdb is other.fdb
+				and self.key() == other.key())
+
+	def __hash__(self):
+		return hash(self.key())
+
+	def where(self, scan=False):
+		"""
+		Builds the SQL WHERE clause matching the freedges of the query, for
+		a query of 'freedges JOIN addresses USING(freedge_id)'.
+
+		Parameters: scan -> whether the rows will be read in order and
+					checked one at a time (for example, when looking up a
+					few freedges by ID), rather than found using the search
+					indexes.
+
+		Returns: (sql, params) -> the str clause (or None if every freedge
+				 matches) and its list of values.
+		"""
+		clauses = []
+		params = []
+		words = search_words(self.text)
+		if (len(words) > 0 and self.fdb.has_search_index()):
+			(sql, values) = self.fdb._search_filter(words)
+			clauses.append(sql)
+			params += values
+		elif (self.text and scan):
+			pattern = _like_prefix(self.text)
+			clauses.append("""(project_name LIKE ? ESCAPE '\\'
+				OR contact_name LIKE ? ESCAPE '\\' OR city LIKE ? ESCAPE '\\')""")
+			params += [pattern, pattern, pattern]
+		elif self.text:
+			# Each branch of the search uses its own NOCASE index, which a
+			# single condition OR-ed across the two tables could not
+			pattern = _like_prefix(self.text)
+			clauses.append("""freedge_id IN (
+				SELECT freedge_id FROM freedges WHERE project_name LIKE ? ESCAPE '\\'
+				UNION SELECT freedge_id FROM freedges WHERE contact_name LIKE ? ESCAPE '\\'
+				UNION SELECT freedge_id FROM addresses WHERE city LIKE ? ESCAPE '\\')""")
+			params += [pattern, pattern, pattern]
+		if self.statuses:
+			values = [s.value for s in self.statuses]
+			clause = "active_status IN (" + ",".join("?" * len(values)) + ")"
+			if Status.Unknown in self.statuses:
+				# Any status which is not one of the Status values reads as Unknown
+				known = [s.value for s in Status]
+				clause = "(" + clause + " OR active_status IS NULL OR active_status" \
+					" NOT IN (" + ",".join("?" * len(known)) + "))"
+				values += known
+			clauses.append(clause)
+			params += values
+		if self.contact_methods:
+			values = [m.value for m in self.contact_methods]
+			clauses.append("preferred_contact_method IN (" + ",".join("?" * len(values)) + ")")
+			params += values
+		if self.threshold is not None:
+			(sql, values) = self.fdb._out_of_date_filter(self.threshold)
+			clauses.append("(" + sql + ")")
+			params += values
+		if len(clauses) == 0:
+			return (None, params)
+		return (" AND ".join(clauses), params)
+
+	def order_by(self):
+		"""
+		Builds the SQL ORDER BY clause for the query's sort order.
+
+		Parameters: None
+
+		Returns: a str
+		"""
+		direction = " DESC" if self.descending else ""
+		if self.sort == "freedge_id":
+			return "freedge_id" + direction
+		return SORT_COLUMNS[self.sort] + direction + ", freedge_id" + direction
+
+	def count(self):
+		"""
+		Counts the freedges matching the query, without building any Freedge
+		objects. The result is cached until the data in the database changes.
+
+		Parameters: None
+
+		Returns: an int
+		"""
+		(where, params) = self.where()
+		def count():
+			sql = "SELECT COUNT(*) FROM freedges JOIN addresses USING(freedge_id)"
+			if where is not None:
+				sql += " WHERE " + where
+			return self.fdb.open_connection().execute(sql, params).fetchone()[0]
+		return self.fdb._cached(("query_count", self.key()), count)
+
+	def page(self, offset, limit):
+		"""
+		Retrieves a single page of the freedges matching the query, in the
+		query's sort order.
+
+		Parameters:
+			offset -> the int number of freedges before the start of the page.
+			limit -> the int maximum number of freedges on the page.
+
+		Returns: A list of Freedge objects.
+		"""
+		# A search matching most of the freedges is quicker to page through
+		# by scanning; both counts are usually cached already
+		broad = (self.text != "" and
+				 self.count() > _SCAN_FRACTION * self.fdb.count_freedges())
+		(where, params) = self.where(scan=broad)
+		# Only the IDs are read while skipping to the page, since reading
+		# whole rows only to skip them makes pages far down the list slow
+		sql = "SELECT freedge_id FROM freedges JOIN addresses USING(freedge_id)"
+		if where is not None:
+			sql += " WHERE " + where
+		sql += " ORDER BY " + self.order_by() + " LIMIT ? OFFSET ?"
+		conn = self.fdb.open_connection()
+		ids = [row[0] for row in conn.execute(sql, params + [limit, offset])]
+		found = self.fdb.get_freedges_by_id(ids)
+		return [found[fid] for fid in ids if fid in found]
+
+	def by_id(self, freedge_ids):
+		"""
+		Retrieves those of the freedges with the given database IDs which
+		match the query.
+
+		Parameters: freedge_ids -> a list of int database IDs.
+
+		Returns: A dict of {freedge_id: Freedge}.
+		"""
+		(where, params) = self.where(scan=True)
+		found = {}
+		# Look the IDs up in chunks, as FreedgeDatabase.get_freedges_by_id() does
+		for i in range(0, len(freedge_ids), 500):
+			chunk = list(freedge_ids[i:i + 500])
+			in_chunk = "freedge_id IN (" + ",".join("?" * len(chunk)) + ")"
+			if where is not None:
+				in_chunk = "(" + where + ") AND " + in_chunk
+			for f in self.fdb.iter_freedges(where=in_chunk, params=params + chunk):
+				found[f.freedge_id] = f
+		return found
+
+	def sort_key(self, f):
+		"""
+		Returns a value for a Freedge which sorts in the same order that the
+		query sorts the freedges in. Freedges whose stored value cannot be
+		recovered exactly from the Freedge object (such as a status, which may
+		have been stored as 'yes', or a missing date) have no sort key.
+
+		Parameters: f -> a Freedge object
+
+		Returns: a comparable value, or None if it cannot be determined
+		"""
+		if self.sort == "freedge_id":
+			key = f.freedge_id
+		elif self.sort == "last_status_update":
+			if f.last_status_update is None:
+				return None
+			key = (f.last_status_update.isoformat(), f.freedge_id)
+		else:
+			value = {"project_name": f.project_name,
+					 "contact_name": f.caretaker_name,
+					 "city": f.fridge_location.city}.get(self.sort)
+			if not isinstance(value, str):
+				return None
+			key = (value.translate(_NOCASE), f.freedge_id)
+		return _Descending(key) if self.descending else key
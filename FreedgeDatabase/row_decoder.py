@@ -0,0 +1,156 @@
+"""
+===============================================================================
+Title:	Row Decoder for the Freedge Database
+===============================================================================
+Description:	Converts rows selected from the freedge database into Freedge
+		objects. This is done for every row each time the display is
+		refreshed, so the work which is the same for every row is done
+		ahead of time:
+
+		(1)	The positions of the columns are looked up by name once per
+			query, rather than using fixed indexes such as row[11].
+		(2)	The stored statuses are converted using a precomputed lookup
+			table, rather than by comparing against each Status in turn.
+		(3)	Parsed ISO dates are kept in a bounded cache, since most
+			freedges share a small number of installation and update dates.
+"""
+from datetime import date
+from functools import lru_cache
+from operator import itemgetter
+from FreedgeDatabase.freedge_data_entry import Status, Freedge, FreedgeAddress
+
+# The columns needed to build a Freedge, in the order they are passed to
+# Freedge() and FreedgeAddress().
+FREEDGE_COLUMNS = ("freedge_id", "project_name", "network_name", "contact_name",
+				   "last_status_update", "preferred_contact_method",
+				   "phone_number", "email_address", "date_installed",
+				   "permission_to_contact")
+ADDRESS_COLUMNS = ("street_address", "city", "state_province", "zip_code",
+				   "country")
+
+# The columns of a row selected using 'SELECT * FROM freedges JOIN addresses'
+DEFAULT_COLUMNS = ("freedge_id", "project_name", "network_name", "contact_name",
+				   "date_installed", "active_status", "last_status_update",
+				   "phone_number", "email_address", "permission_to_contact",
+				   "preferred_contact_method", "street_address", "city",
+				   "state_province", "zip_code", "country")
+
+# The Status for each (uppercase, stripped) string which may be stored in the
+# active_status column. Any other string is read as Status.Unknown.
+STATUS_LOOKUP = {
+	"YES": Status.Active,
+	"NO": Status.ConfirmedInactive,
+	Status.Active.value.upper(): Status.Active,
+	Status.ConfirmedInactive.value.upper(): Status.ConfirmedInactive,
+	Status.SuspectedInactive.value.upper(): Status.SuspectedInactive,
+	Status.Unknown.value.upper(): Status.Unknown
+}
+
+# The maximum number of distinct dates kept in the parsed date cache
+DATE_CACHE_SIZE = 4096
+
+def decode_status(status_str):
+	"""
+	Converts a status stored in the database into the proper Status, accepting
+	the yes/no form responses as well as the Status values themselves.
+
+	Parameters: status_str -> the str stored in the active_status column
+
+	Returns: a Status
+	"""
+	# Most rows store the Status value exactly, so try it before normalizing
+	status = STATUS_LOOKUP.get(status_str)
+	if status is None:
+		if status_str is None:
+			return Status.Unknown
+		status = STATUS_LOOKUP.get(status_str.upper().strip(), Status.Unknown)
+	return status
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def decode_date(date_str):
+	"""
+	Converts an ISO date stored in the database into a date, remembering the
+	most recently parsed dates.
+
+	Parameters: date_str -> the str stored in a date column
+
+	Returns: a date, or None if the value is missing or is not an ISO date
+	"""
+	try:
+		return date.fromisoformat(date_str)
+	except (TypeError, ValueError):
+		return None
+
+def decode_permission(permission_str):
+	"""
+	Converts a yes/no form response into a bool.
+
+	Parameters: permission_str -> the str stored in the permission column
+
+	Returns: True or False
+	"""
+	if permission_str is None:
+		return False
+	return permission_str.upper().strip() == "YES"
+
+class RowDecoder:
+	"""
+	Converts the rows of a single query into Freedge objects, using the names
+	of the query's columns to find each field.
+
+	Methods
+	--------
+	decode(row): Converts a row into a Freedge object
+	"""
+	def __init__(self, column_names=DEFAULT_COLUMNS):
+		"""
+		Looks up the position of each needed column in the query's results.
+
+		Parameters: column_names -> a sequence of the query's column names, in
+									order (e.g. from Cursor.description)
+
+		Returns: None
+		"""
+		position = {}
+		for i in range(len(column_names)):
+			# Keep the first position of a name, in case the query joined on it
+			position.setdefault(column_names[i], i)
+		missing = [c for c in FREEDGE_COLUMNS + ADDRESS_COLUMNS + ("active_status",)
+				   if c not in position]
+		if (len(missing) > 0):
+			raise ValueError("The query is missing the columns: " + ", ".join(missing))
+		# itemgetters pick all of the fields out of a row in a single call
+		self._freedge_fields = itemgetter(*[position[c] for c in FREEDGE_COLUMNS])
+		self._address_fields = itemgetter(*[position[c] for c in ADDRESS_COLUMNS])
+		self._status_index = position["active_status"]
+
+	@classmethod
+	def from_cursor(cls, cursor):
+		"""
+		Builds a RowDecoder for the query most recently executed by a cursor.
+
+		Parameters: cursor -> an sqlite3 Cursor
+
+		Returns: a RowDecoder
+		"""
+		return cls([d[0] for d in cursor.description])
+
+	def decode(self, row):
+		"""
+		Converts an SQL row into an instance of the Freedge class.
+
+		Parameters: row -> a row of the query this decoder was built for
+
+		Returns: new_freedge -> An instance of the Freedge class
+		"""
+		(fid, pname, nname, cname, last_update, c_method, phone, email,
+		 installed, permission) = self._freedge_fields(row)
+		address = FreedgeAddress(self._address_fields(row))
+		new_freedge = Freedge(fid, pname, nname, cname, address,
+							  decode_date(last_update), c_method, phone, email,
+							  decode_date(installed), decode_permission(permission))
+		new_freedge.freedge_status = decode_status(row[self._status_index])
+		return new_freedge
+
+# The decoder for rows selected using 'SELECT * FROM freedges JOIN addresses'
+DEFAULT_DECODER = RowDecoder()
@@ -19,6 +19,64 @@ Last Edit By:	Ginni Gallagher
 # we would like to get a status update from the freedge caretaker again.
 FIRST_UPDATE_THRESHOLD = 90
 
+#==============================================================================
+# Notification Dispatch Constants
+#==============================================================================
+# The largest number of notifications which are sent (and awaiting a reply) at
+# once when notifying many caretakers, such as every out-of-date freedge's.
+# DEFAULT: {50}
+NOTIFY_CONCURRENCY = 50
+# The largest number of simulated notification popups the prototype shows at
+# once. Each popup stays open until the user replies to it or closes it.
+# DEFAULT: {5}
+NOTIFY_POPUP_LIMIT = 5
+# The caretakers' replies are saved to the database in batches of up to this
+# many freedges at a time.
+# DEFAULT: {100}
+NOTIFY_WRITE_BATCH_SIZE = 100
+# The longest number of seconds a reply waits to be saved to the database
+# when its batch is not full yet, so that the tables show it promptly.
+# DEFAULT: {1.0}
+NOTIFY_WRITE_INTERVAL = 1.0
+
+#==============================================================================
+# Notification Provider Constants
+#==============================================================================
+# Description: The services the SMS and email notifications are sent through
+# (see NotificationSystem/notificationTransport.py). The passwords are not
+# stored here; they are read from the environment variables named below.
+
+# The SMTP server email notifications are sent through, and its port.
+# DEFAULT: {"localhost"}, {587}
+SMTP_HOST = "localhost"
+SMTP_PORT = 587
+# Whether to encrypt the connection to the SMTP server using STARTTLS.
+# DEFAULT: {True}
+SMTP_USE_TLS = True
+# The address email notifications are sent from, and the username used to log
+# in to the SMTP server ("" if it does not need a login). The password is read
+# from the environment variable named by SMTP_PASSWORD_VARIABLE.
+# DEFAULT: {"notifications@freedge.org"}, {""}, {"FREEDGE_SMTP_PASSWORD"}
+SMTP_SENDER = "notifications@freedge.org"
+SMTP_USERNAME = ""
+SMTP_PASSWORD_VARIABLE = "FREEDGE_SMTP_PASSWORD"
+# The URL of the SMS gateway's HTTP API, which SMS notifications are POSTed
+# to, and the phone number they are sent from. The gateway's API key is read
+# from the environment variable named by SMS_API_KEY_VARIABLE.
+# DEFAULT: {"https://localhost/messages"}, {""}, {"FREEDGE_SMS_API_KEY"}
+SMS_GATEWAY_URL = "https://localhost/messages"
+SMS_SENDER_NUMBER = ""
+SMS_API_KEY_VARIABLE = "FREEDGE_SMS_API_KEY"
+# The largest number of connections kept open to each service. Each
+# connection is reused for many notifications, rather than connecting (and
+# logging in) again for every message.
+# DEFAULT: {4}
+TRANSPORT_POOL_SIZE = 4
+# The number of seconds to wait for a service to respond before giving up on
+# a notification.
+# DEFAULT: {10}
+TRANSPORT_TIMEOUT = 10
+
 #==============================================================================
 # Internal Data Constants
 #==============================================================================
@@ -28,6 +86,89 @@ FIRST_UPDATE_THRESHOLD = 90
 # DEFAULT: {r"InternalData/fdb_path.txt"}
 DATABASE_PATH_INFO = r"InternalData/fdb_path.txt"
 
+#==============================================================================
+# Database Import Constants
+#==============================================================================
+# The number of csv rows which are inserted into the database at a time when
+# creating a new database from a csv file. Each batch is committed along with
+# a checkpoint of how far into the file the import has got, so an interrupted
+# import resumes from the last batch; larger batches are slightly faster.
+# DEFAULT: {1000}
+IMPORT_BATCH_SIZE = 1000
+# When creating a database from several csv files at once, each file is
+# parsed by a worker process IMPORT_BATCH_SIZE rows at a time, up to this many
+# batches ahead of the rows being inserted into the database.
+# DEFAULT: {2}
+CSV_PARSE_AHEAD = 2
+# The number of rows which are read from the database at a time when
+# iterating over its freedges.
+# DEFAULT: {500}
+FETCH_BATCH_SIZE = 500
+# New databases are built in a separate file next to the database, named by
+# adding this suffix to its name, and only replace the database once the
+# import has finished. If an import is interrupted, this file is kept so that
+# loading the same csv file again resumes the import where it left off.
+# DEFAULT: {".building"}
+SHADOW_DATABASE_SUFFIX = ".building"
+# When a database is replaced by a new one, the old file is kept beside it,
+# named by adding this suffix to its name, so that it can be restored.
+# DEFAULT: {".bak"}
+BACKUP_DATABASE_SUFFIX = ".bak"
+
+#==============================================================================
+# Display Constants
+#==============================================================================
+# The number of rows above and below the visible part of each table in the
+# Administrator Interface which are read from the database ahead of time, so
+# that scrolling a short distance does not need to read the database again.
+# DEFAULT: {100}
+TABLE_ROW_BUFFER = 100
+
+# The number of milliseconds between each check the Administrator Interface
+# makes on the database tasks running in the background, for their progress
+# and results. 16ms keeps the display updating at about 60 frames a second.
+# DEFAULT: {16}
+TASK_POLL_INTERVAL = 16
+
+# The number of milliseconds to wait after the last keystroke in the search
+# box before searching, so that typing a word only searches once.
+# DEFAULT: {250}
+SEARCH_DEBOUNCE_INTERVAL = 250
+
+# The largest number of freedges returned by a ranked full-text search of the
+# database (FreedgeDatabase.search), best matches first.
+# DEFAULT: {50}
+SEARCH_RESULT_LIMIT = 50
+
+#==============================================================================
+# SQLite Connection Constants
+#==============================================================================
+# Description: These PRAGMAs are applied to every connection the system opens
+# to a database file. See https://www.sqlite.org/pragma.html for the allowed
+# values of each.
+
+# The journal mode. Write-ahead logging lets the interface keep reading the
+# database while a write is in progress.
+# DEFAULT: {"WAL"}
+SQLITE_JOURNAL_MODE = "WAL"
+# How often SQLite waits for data to reach the disk. NORMAL is safe to use
+# together with WAL mode.
+# DEFAULT: {"NORMAL"}
+SQLITE_SYNCHRONOUS = "NORMAL"
+# The size of each connection's page cache. Negative values are in KiB.
+# DEFAULT: {-16000}
+SQLITE_CACHE_SIZE = -16000
+# The number of bytes of the database file which may be memory-mapped.
+# DEFAULT: {67108864}
+SQLITE_MMAP_SIZE = 67108864
+# The number of rows of each index sampled when gathering the statistics the
+# query planner uses to choose between indexes (for example, when searching
+# and sorting the freedges at once). 0 samples every row, which takes about a
+# tenth of a second per 100,000 freedges but gives the planner exact counts;
+# small limits can make it choose a much slower plan.
+# DEFAULT: {0}
+SQLITE_ANALYSIS_LIMIT = 0
+
 #=============================================================================
 # CSV File Column Labels/Headers
 #==============================================================================
@@ -58,6 +199,17 @@ PREFERRED_METHOD_KEY = "Preferred Contact Method"
 
 ACTIVE_STATUS_KEY = "Active?"
 
+#==============================================================================
+# CSV File Date Formats
+#==============================================================================
+# Description: The formats (see the 'strftime() and strptime() Format Codes'
+# of Python's datetime module) which the dates installed in the CSV files may
+# be written in. Each date is stored in the database as an ISO date (YYYY-MM-DD)
+# using the first format it matches, so more specific formats should come
+# first. Dates which match none of the formats are stored as they are.
+# DEFAULT: {("%m/%d/%Y", "%Y-%m-%d", "%m/%d/%y", "%Y/%m/%d", "%m-%d-%Y")}
+INSTALLED_DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%m/%d/%y", "%Y/%m/%d", "%m-%d-%Y")
+
 #==============================================================================
 # CSV File Notification Method Constants
 
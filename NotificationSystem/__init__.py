@@ -2,3 +2,7 @@
 from .notificationMgmt import NotificationMgmt
 from FreedgeDatabase.caretaker_info_parser import *
 from .notificationGUI import *
+from .notificationDispatch import NotificationDispatcher, DispatchStats, popup_transport
+from .notificationTransport import TransportError, SMTPTransport, HTTPSMSTransport, \
+    ContactTransport, async_transport
+from .notificationFakeProvider import FakeSMTPServer, FakeSMSServer
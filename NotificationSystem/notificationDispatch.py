@@ -0,0 +1,317 @@
+"""
+===============================================================================
+Title:	Notification Dispatch
+===============================================================================
+Description:	Sends the notifications of a campaign (such as one to every
+                out-of-date freedge's caretaker) many at a time, rather than
+                waiting for each caretaker to reply before contacting the next.
+
+                The dispatch runs on an asyncio event loop. A fixed number
+                (NOTIFY_CONCURRENCY) of sender coroutines take the freedges
+                from a queue, and each sends a notification and waits for its
+                reply using a transport. Replies are collected as they come
+                in, and a single writer coroutine saves them to the database
+                in batches of up to NOTIFY_WRITE_BATCH_SIZE freedges, using
+                FreedgeDatabase.update_freedges() on a worker thread. A
+                campaign therefore takes about as long as its slowest
+                notifications, rather than the sum of all of them.
+
+                A transport is an async function of a Freedge which notifies
+                its caretaker and returns their reply: the freedge's new
+                Status, or None if they did not reply. popup_transport() is
+                the prototype's transport, which shows each notification as a
+                PopUp (see notificationGUI.py).
+
+                The event loop must not run on the tkinter main loop's thread,
+                since it waits for replies which the main loop delivers. The
+                Administrator Interface runs it as a background task.
+"""
+import asyncio
+import time
+from InternalData.freedge_constants import NOTIFY_CONCURRENCY, \
+    NOTIFY_WRITE_BATCH_SIZE, NOTIFY_WRITE_INTERVAL
+from NotificationSystem.notificationGUI import PopUp
+
+
+class DispatchStats:
+    """
+    Counts the outcomes of the notifications of a campaign.
+
+    Attributes
+    ===========================================================================
+    total: int
+        The number of freedges to notify.
+
+    sent: int
+        The number of notifications sent, whether or not they were replied to.
+
+    replied: int
+        The number of caretakers who replied.
+
+    failed: int
+        The number of notifications which could not be sent.
+
+    written: int
+        The number of replies saved to the database so far.
+
+    batches: int
+        The number of batches the replies were saved in.
+
+    errors: list
+        A (freedge_id, exception) tuple for each notification which failed.
+
+    cancelled: bool
+        Whether the campaign was stopped before every notification was sent.
+
+    elapsed: float
+        The number of seconds the campaign took.
+    """
+    def __init__(self, total):
+        """
+        Initializes the counts of a campaign which has not started yet.
+
+        Parameters:
+            total: the int number of freedges to notify.
+        """
+        self.total = total
+        self.sent = 0
+        self.replied = 0
+        self.failed = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = []
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    def finished(self):
+        """
+        Returns the number of notifications which were sent or failed.
+
+        Returns: an int
+        """
+        return self.sent + self.failed
+
+
+class NotificationDispatcher:
+    """
+    Sends notifications to the caretakers of many freedges at once, and saves
+    their replies to the database in batches.
+
+    Attributes
+    ===========================================================================
+    fdb: FreedgeDatabase
+        The database the replies are saved to.
+
+    transport: function
+        The async function of a Freedge which notifies its caretaker and
+        returns their reply (a Status, or None).
+
+    concurrency: int
+        The largest number of notifications awaiting a reply at once.
+
+    batch_size: int
+        The largest number of replies saved to the database at a time.
+
+    write_interval: float
+        The longest number of seconds a reply waits for its batch to fill.
+
+    Methods
+    ===========================================================================
+    dispatch(freedges, should_stop, on_progress)
+        Runs a campaign on a new event loop, returning its DispatchStats once
+        every notification has been sent and every reply saved.
+
+    run(freedges, should_stop, on_progress)
+        The coroutine which runs a campaign on the current event loop.
+    """
+    def __init__(self, fdb, transport, concurrency=NOTIFY_CONCURRENCY,
+                 batch_size=NOTIFY_WRITE_BATCH_SIZE,
+                 write_interval=NOTIFY_WRITE_INTERVAL):
+        """
+        Initializes a dispatcher which notifies caretakers using a transport.
+
+        Parameters:
+            fdb: the FreedgeDatabase to save the replies to.
+            transport: an async function of a Freedge, which returns the
+                       caretaker's reply as a Status, or None.
+            concurrency: the int largest number of notifications at once.
+            batch_size: the int largest number of replies saved at a time.
+            write_interval: the float longest number of seconds a reply
+                            waits before it is saved.
+        """
+        self.fdb = fdb
+        self.transport = transport
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.write_interval = write_interval
+
+    def dispatch(self, freedges, should_stop=None, on_progress=None):
+        """
+        Notifies the caretakers of the given freedges, blocking until every
+        notification has been sent and every reply has been saved. Must not
+        be called on the tkinter main loop's thread.
+
+        Parameters:
+            freedges: a list of the Freedge objects to notify.
+            should_stop: an optional function of no arguments which returns
+                         True once the campaign should stop (for example,
+                         BackgroundTask.cancelled). Notifications awaiting a
+                         reply are abandoned, but the replies already
+                         received are still saved.
+            on_progress: an optional function of the DispatchStats, called
+                         whenever a notification finishes or a batch of
+                         replies is saved.
+
+        Returns: the DispatchStats of the campaign
+        """
+        return asyncio.run(self.run(freedges, should_stop, on_progress))
+
+    async def run(self, freedges, should_stop=None, on_progress=None):
+        """
+        The coroutine which notifies the caretakers of the given freedges.
+        See dispatch().
+
+        Returns: the DispatchStats of the campaign
+        """
+        stats = DispatchStats(len(freedges))
+        start = time.perf_counter()
+        pending = asyncio.Queue()           # The freedges not yet notified
+        for freedge in freedges:
+            pending.put_nowait(freedge)
+        replies = asyncio.Queue()           # The replies not yet saved
+        senders = [asyncio.create_task(self._send(pending, replies, stats,
+                                                  on_progress))
+                   for i in range(min(self.concurrency, len(freedges)))]
+        writer = asyncio.create_task(self._write(replies, stats, on_progress))
+        watcher = None
+        if should_stop is not None:
+            watcher = asyncio.create_task(self._watch(should_stop, senders, stats))
+        sending = asyncio.gather(*senders, return_exceptions=True)
+        try:
+            # The writer only finishes early if saving a batch failed
+            await asyncio.wait([sending, writer],
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for sender in senders:
+                sender.cancel()
+            if watcher is not None:
+                watcher.cancel()
+            await sending
+            # Let the writer save the remaining replies, and then stop
+            replies.put_nowait(None)
+            try:
+                await writer
+            finally:
+                stats.elapsed = time.perf_counter() - start
+        return stats
+
+    async def _send(self, pending, replies, stats, on_progress):
+        """
+        Notifies caretakers one at a time, until there are none left to
+        notify, passing their replies on to the writer. Several of these run
+        at once. Intended for internal use only.
+        """
+        while True:
+            try:
+                freedge = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                status = await self.transport(freedge)
+            except Exception as error:
+                stats.failed += 1
+                stats.errors.append((freedge.freedge_id, error))
+            else:
+                stats.sent += 1
+                if status is not None:
+                    stats.replied += 1
+                    # Update the status, and reset the last update to today
+                    freedge.update_status(status)
+                    replies.put_nowait(freedge)
+            if on_progress is not None:
+                on_progress(stats)
+
+    async def _write(self, replies, stats, on_progress):
+        """
+        Saves the replies to the database in batches, once a batch is full or
+        its first reply has waited write_interval seconds, until it receives
+        None. Intended for internal use only.
+        """
+        batch = []
+        finished = False
+        while not finished:
+            try:
+                timeout = self.write_interval if len(batch) > 0 else None
+                freedge = await asyncio.wait_for(replies.get(), timeout)
+            except asyncio.TimeoutError:
+                freedge = None
+            else:
+                if freedge is None:
+                    finished = True
+                else:
+                    batch.append(freedge)
+                    if len(batch) < self.batch_size:
+                        continue
+            if len(batch) == 0:
+                continue
+            # The database is used from a worker thread, so that the other
+            # notifications carry on while the batch is saved
+            await asyncio.to_thread(self.fdb.update_freedges, batch)
+            stats.written += len(batch)
+            stats.batches += 1
+            batch = []
+            if on_progress is not None:
+                on_progress(stats)
+
+    async def _watch(self, should_stop, senders, stats):
+        """
+        Stops the senders once should_stop() returns True. Intended for
+        internal use only.
+        """
+        while not should_stop():
+            await asyncio.sleep(0.05)
+        stats.cancelled = True
+        for sender in senders:
+            sender.cancel()
+
+
+def popup_transport(root, call_in_main):
+    """
+    Builds the prototype's transport, which shows each notification as a
+    PopUp and returns the user's reply to it, without blocking the display
+    while the reply is awaited.
+
+    Parameters:
+        root: the tkinter root of the display.
+        call_in_main: a function which runs a function of no arguments on the
+                      tkinter main loop, returning a concurrent.futures Future
+                      of its result (e.g. BackgroundTask.call_in_main).
+
+    Returns: an async function of a Freedge, which returns a Status or None
+    """
+    async def send(freedge):
+        loop = asyncio.get_running_loop()
+        reply = loop.create_future()
+
+        def on_reply(status):
+            # Runs on the main loop, so pass the reply back to the event loop
+            loop.call_soon_threadsafe(_resolve, reply, status)
+
+        popup = await asyncio.wrap_future(call_in_main(
+            lambda: PopUp(root, freedge, on_reply=on_reply)))
+        try:
+            return await reply
+        finally:
+            if reply.cancelled():
+                # The campaign was stopped, so close the unanswered popup
+                call_in_main(popup.on_close)
+    return send
+
+
+def _resolve(future, result):
+    """
+    Sets the result of an asyncio Future, unless it was already cancelled.
+    Intended for internal use only.
+    """
+    if not future.done():
+        future.set_result(result)
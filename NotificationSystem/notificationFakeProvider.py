@@ -0,0 +1,276 @@
+"""
+===============================================================================
+Title:	Fake Notification Providers
+===============================================================================
+Description:	Local stand-ins for the SMTP server and the SMS gateway, which
+                run in the same process on 127.0.0.1. They accept and record
+                every message without delivering it, so that the notification
+                transports (see notificationTransport.py) can be tested, and
+                the throughput and latency of a campaign measured, without
+                sending real messages or paying for them.
+
+                FakeSMTPServer speaks just enough SMTP for smtplib to send
+                mail (without STARTTLS or logging in, so its transports need
+                use_tls=False and no username), and FakeSMSServer accepts the
+                JSON POSTs of an HTTPSMSTransport over HTTP/1.1 keep-alive
+                connections. Both can wait a fixed latency before accepting
+                each message, to stand in for a real provider's delay.
+
+                For example:
+                    with FakeSMTPServer(latency=0.01) as server:
+                        transport = SMTPTransport(server.host, server.port,
+                                                  use_tls=False)
+                        transport.send(freedge)
+                    print(len(server.messages), server.connections)
+"""
+import json
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeProvider:
+    """
+    The parent class of the fake providers, which runs a server on a
+    background thread and records what it receives.
+
+    Attributes
+    ===========================================================================
+    host: str
+        The address the server listens on.
+
+    port: int
+        The port the server listens on, chosen by the system if 0 was given.
+
+    latency: float
+        The number of seconds the server waits before accepting each message.
+
+    messages: list
+        The messages accepted so far, oldest first.
+
+    connections: int
+        The number of connections the clients have opened so far.
+
+    Methods
+    ===========================================================================
+    start()
+        Starts the server on a background thread.
+
+    stop()
+        Stops the server and closes its socket.
+    """
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0):
+        """
+        Initializes a fake provider without starting it.
+
+        Parameters:
+            latency: the float number of seconds to wait before accepting
+                     each message.
+            host: the str address to listen on.
+            port: the int port to listen on, or 0 for any free port.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()       # Guards messages and connections
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the server on a background thread, and sets its port.
+
+        Returns: None
+        """
+        self._server = self._make_server((self.host, self.port))
+        self._server.daemon_threads = True
+        self._server.provider = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the server, and waits for it to close its socket.
+
+        Returns: None
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _connected(self):
+        """
+        Counts a new connection. Intended for internal use only.
+        """
+        with self._lock:
+            self.connections += 1
+
+    def _accept(self, message):
+        """
+        Waits for the latency, and then records a message. Intended for
+        internal use only.
+        """
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            self.messages.append(message)
+
+    def _make_server(self, address):
+        """
+        Creates the server. Implemented by each fake provider.
+        """
+        raise NotImplementedError
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one SMTP session. Intended for internal use only.
+    """
+    disable_nagle_algorithm = True     # Send each reply without delay
+
+    def handle(self):
+        provider = self.server.provider
+        provider._connected()
+        self._reply("220 fake.freedge.org ESMTP")
+        sender = None
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip()
+            verb = command[:4].upper()
+            if (verb == "EHLO"):
+                self._reply("250-fake.freedge.org\r\n250-8BITMIME\r\n250 SIZE")
+            elif (verb == "HELO"):
+                self._reply("250 fake.freedge.org")
+            elif (verb == "MAIL"):
+                sender = command[10:].strip(" <>")
+                recipients = []
+                self._reply("250 OK")
+            elif (verb == "RCPT"):
+                recipients.append(command[8:].strip(" <>"))
+                self._reply("250 OK")
+            elif (verb == "DATA"):
+                if not recipients:
+                    self._reply("503 No recipients")
+                    continue
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                if data is None:
+                    return
+                message = message_from_bytes(data, policy=default_policy)
+                provider._accept((sender, recipients, message))
+                sender = None
+                recipients = []
+                self._reply("250 OK")
+            elif (verb == "RSET"):
+                sender = None
+                recipients = []
+                self._reply("250 OK")
+            elif (verb == "NOOP"):
+                self._reply("250 OK")
+            elif (verb == "QUIT"):
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+    def _read_data(self):
+        """
+        Reads the lines of a message up to the terminating ".", undoing the
+        dot-stuffing, or returns None if the client disconnected.
+        """
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if line in (b".\r\n", b".\n"):
+                return b"".join(lines)
+            if line.startswith(b"."):
+                line = line[1:]
+            lines.append(line)
+
+    def _reply(self, text):
+        self.wfile.write(text.encode("ascii") + b"\r\n")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+class FakeSMTPServer(FakeProvider):
+    """
+    A fake SMTP server. Each of its messages is a (sender, recipients,
+    EmailMessage) tuple.
+    """
+    def _make_server(self, address):
+        return _SMTPServer(address, _SMTPHandler)
+
+
+class _SMSHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of one HTTP/1.1 connection. Intended for internal
+    use only.
+    """
+    protocol_version = "HTTP/1.1"      # Keeps connections alive
+    disable_nagle_algorithm = True     # Send each response without delay
+
+    def setup(self):
+        super().setup()
+        self.server.provider._connected()
+
+    def do_POST(self):
+        provider = self.server.provider
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            message = json.loads(self.rfile.read(length))
+            if not message.get("to"):
+                raise ValueError("no recipient")
+        except ValueError:
+            self._respond(400, {"error": "invalid message"})
+            return
+        provider._accept(message)
+        self._respond(201, {"id": len(provider.messages), "status": "queued"})
+
+    def _respond(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass                            # Do not print every request
+
+
+class FakeSMSServer(FakeProvider):
+    """
+    A fake SMS gateway. Each of its messages is the dict of a JSON POST,
+    with the "from", "to", and "body" of the SMS. Its url is the URL to give
+    an HTTPSMSTransport.
+    """
+    @property
+    def url(self):
+        return "http://" + self.host + ":" + str(self.port) + "/messages"
+
+    def _make_server(self, address):
+        return ThreadingHTTPServer(address, _SMSHandler)
@@ -42,7 +42,7 @@ class PopUp:
     Again, this class is for the prototype only and serves to demonstrate how
     a notification may be sent out, recieved, and interpreted by the system.
     """
-    def __init__(self, root: Tk, freedge: Freedge):
+    def __init__(self, root: Tk, freedge: Freedge, on_reply=None):
         """
         Initializes a new PopUp class with 'root' as the tkinter root of the
         display, filling in the popup window with information contained in
@@ -50,12 +50,19 @@ class PopUp:
 
         Parameters:
             freedge: Freedge
-        Called by: notify_and_update() in notificationMgmt.py to run the
+            on_reply: an optional function of the response (a Status, or None
+                      if the window was closed without replying), called once
+                      the user replies. This lets many popups wait for their
+                      replies at once, rather than waiting on each in turn.
+        Called by: notify_and_update() in notificationMgmt.py and
+                   popup_transport() in notificationDispatch.py to run the
                    display of the prototype notification system
         Returns: None, stores class information
         """
         # The tkinter root of the display (type: Tk)
         self.root: Tk = root
+        # The function to call with the response, if any
+        self.on_reply = on_reply
         # Whether or not the user has responded to the popup window yet
         self.response_received = BooleanVar()
         # The value of the user's response, either True, False, or None
@@ -164,6 +171,9 @@ class PopUp:
         self.response_received.set(True)
         # Destroy the pop-up window object, removing it from the display
         self.pop_up_win.destroy()
+        # Pass the (lack of a) response on
+        if self.on_reply is not None:
+            self.on_reply(self.response_value)
 
     def exit_(self):
         """
@@ -180,3 +190,6 @@ class PopUp:
         self.response_received.set(True)
         # Destroy the pop-up window object, removing it from the display
         self.pop_up_win.destroy()
+        # Pass the response on
+        if self.on_reply is not None:
+            self.on_reply(self.response_value)
@@ -83,25 +83,25 @@ class NotificationMgmt():
 
         return
 
-    def notify_and_update(self, fdb, freedge):
+    def notify(self, freedge):
         """
         Purpose:
             Calls the  interface class which will return a boolean
             value based on whether or not the Freedge is active from user input.
-            Based on this boolean value, updates the freedge object status and
-            then updates the freedge database status for the specific Freedge
-            using the freedge_id to look up the entry in the database.
+            Based on this boolean value, updates the status of the freedge
+            object, without writing it to the database. This lets many replies
+            be written to the database together using update_freedges().
 
         Parameters: 
-            fdb -> FreedgeDatabase object to interact with the SQLite database
             freedge -> Freedge object to be updated
 
         Calls: notificationGUI.py in order to notify user of fridge activity
             update_status() of Freedge class
 
-        Called by: get_fridge_info_message
+        Called by: notify_and_update()
 
-        Returns: None
+        Returns: True if the caretaker replied (and the freedge was updated),
+                 or False otherwise
         """
         # calls notification GUI pop up function to send message
         popup = NS.notificationGUI.PopUp(self.root, freedge)
@@ -117,16 +117,31 @@ class NotificationMgmt():
         # If the user did not respond:
         if response is None:
             print("no response.")
-        # If the user did respond
-        else:
-            # Update the status of the Freedge according to the user's response
-            freedge.update_status(response)
-            # Reset the last update of the Freedge (sets to today's date)
-            freedge.reset_last_update()
-            # update the SQLite freedge database with the updated information
-            fdb.update_freedge(freedge)
-        return
+            return False
+        # Update the status of the Freedge according to the user's response
+        freedge.update_status(response)
+        # Reset the last update of the Freedge (sets to today's date)
+        freedge.reset_last_update()
+        return True
+
+    def notify_and_update(self, fdb, freedge):
+        """
+        Purpose:
+            Notifies the caretaker of a single freedge using notify(), and
+            then updates the freedge database status for the specific Freedge
+            using the freedge_id to look up the entry in the database.
 
+        Parameters: 
+            fdb -> FreedgeDatabase object to interact with the SQLite database
+            freedge -> Freedge object to be updated
 
+        Calls: notify() to send the notification
 
+        Called by: get_fridge_info_message
 
+        Returns: None
+        """
+        if self.notify(freedge):
+            # update the SQLite freedge database with the updated information
+            fdb.update_freedge(freedge)
+        return
@@ -2,22 +2,15 @@
 ===============================================================================
 Title:	 Email Notification Management
 ===============================================================================
-Description:	This is skeleton code to be updated with Twilio in order to 
-                send notifications via email. Twilio is a paid service and therefore 
-                we are not using it in the prototype. 
+Description:	Sends notifications via email, through an SMTP server, using a
+                SMTPTransport (see notificationTransport.py). The email provider is set by
+                the Notification Provider Constants in freedge_constants.py, and any
+                other transport (such as one connected to the local fake provider in
+                notificationFakeProvider.py) may be passed in instead.
 
                 The email system will function through inheriting the notification class.
                 The NotificationMgmt is created using modularity so any future notification
-                type can be added without touching the main NotificationMgmt file. In order
-                for a future developer to implement emailing, they will need to add to implement
-                the notify_and_update function within the class.
-
-                Information on Twilio for setting up email:
-                Payment plans:
-                https://www.twilio.com/sendgrid/email-api
-
-                Instruction use and sample code:
-                https://www.twilio.com/docs/verify/email
+                type can be added without touching the main NotificationMgmt file.
 
 Authors: 		Ellie Kobak,
 Last Edited: 	3-01-22
@@ -37,25 +30,24 @@ import NotificationSystem as NS                      # for prototype only, used
 class email_mgmt(NS.NotificationMgmt):
     """
     This class enables email notifications from freedge organizers to the fridge caretakers.
-    The class has the attributes to send emails using the Twilio Email API
+    The class sends emails through an SMTP server, using its transport.
     """
 
-    def __init__(self, root):
+    def __init__(self, root, transport=None):
         """
-        This function is set up to be updated for non prototype version.
-
-        Parameters:  None
+        Parameters:
+            root: TK, the tkinter root for the GUI display, passed in from the main driver.
+            transport: the notificationTransport.SMTPTransport the email messages are sent through.
+                       Defaults to one for the SMTP server set in freedge_constants.py.
 
-        Purpose:  initialize email management system to enable email communication between freedge organizers  
+        Purpose:  initialize email management system to enable email communication between freedge organizers
                 and caretaker
 
-        Calls:  In funtioning version, will call freedge_data_entry.py in order to obtain correct contact 
-                info for each fridge.
-        Returns: None, stores sender and reciever information in class initiation.
+        Returns: None, stores the transport in class initiation.
         """
         self.root = root    # The root of the Tkinter display
-        # self.sender =  UPDATE with Twilio account information
-        # self.reciever = UPDAtE with freedge_data_entry
+        # The SMTP server the messages are sent through. No connection is opened until the first message.
+        self.transport = transport if transport is not None else NS.SMTPTransport()
 
     def get_fridge_info_message(self):
         """
@@ -88,25 +80,43 @@ class email_mgmt(NS.NotificationMgmt):
 
         return 
 
+    def notify(self, freedge):
+        """
+        Purpose:
+            Sends an email to the caretaker of the freedge through the transport, asking whether the
+            freedge is still active. The caretaker replies later, through the SMTP server, so the freedge's
+            status is not updated yet.
+
+        Parameters:
+            freedge -> Freedge object whose caretaker is notified
+
+        Calls: send() of the transport
+
+        Called by: notify_and_update()
+
+        Returns: True if an email was sent, or False if the caretaker cannot be notified
+
+        Raises: TransportError if the SMTP server could not be reached or refused the message
+        """
+        if not freedge.can_notify() or not freedge.email_address:
+            return False
+        self.transport.send(freedge)
+        return True
+
     def notify_and_update(self, fdb, freedge):
         """
-       Purpose:
-            TO BE IMPLEMENTED IF USING EMAIL NOTIFICATIONS
-            Calls the notification interface class which will return a boolean value based on whether or not the
-            Freedge is active from user input.
-            Based on this boolean value, updates the freedge object status and then updates the freedge database status
-            for the specific fridge object.
+        Purpose:
+            Sends an email to the caretaker of a single freedge using notify(). The database is not
+            updated until the caretaker replies.
 
         Parameters:
             fdb -> fridge database object
             freedge -> freedge object
 
-        Calls: notificationGUI.py in order to notify user of fridge activity
-            update_status() of Freedge class
+        Calls: notify() to send the notification
 
         Called by: get_fridge_info_message
 
-        Returns: None
-        
+        Returns: True if an email was sent, or False otherwise
         """
-        pass
+        return self.notify(freedge)
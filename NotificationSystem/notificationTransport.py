@@ -0,0 +1,420 @@
+"""
+===============================================================================
+Title:	Notification Transports
+===============================================================================
+Description:	The services which deliver the notifications to the freedge
+                caretakers: email through an SMTP server, and SMS through the
+                HTTP API of an SMS gateway.
+
+                Each transport sends a single notification with send(freedge),
+                and may be used by many threads at once. Rather than opening a
+                new connection for every message, a transport keeps a pool of
+                up to TRANSPORT_POOL_SIZE open connections, and each connection
+                sends many notifications one after another. A connection which
+                fails is thrown away, and a notification sent on a connection
+                which had gone stale (for example, closed by the server while
+                it was idle) is retried once on a new one.
+
+                Python's smtplib does not pipeline the commands of a message
+                (the ESMTP PIPELINING extension), so the SMTP transport saves
+                its round trips by sending many messages per session instead,
+                which skips reconnecting, the STARTTLS handshake, and logging
+                in again for each message.
+
+                Neither transport waits for the caretaker's reply, which
+                arrives later through the provider, so send() returns None.
+                async_transport() adapts a transport for the
+                NotificationDispatcher (see notificationDispatch.py), and
+                notificationFakeProvider.py has local stand-ins for both
+                services, for testing without sending real messages.
+"""
+import asyncio
+import http.client
+import json
+import os
+import queue
+import smtplib
+import ssl
+import threading
+from email.message import EmailMessage
+from urllib.parse import urlsplit
+from InternalData.freedge_constants import *
+from FreedgeDatabase.freedge_data_entry import ContactMethod
+
+
+class TransportError(Exception):
+    """
+    Raised when a notification could not be delivered to the provider.
+    """
+    pass
+
+
+def status_check_message(freedge):
+    """
+    Builds the text of the notification asking a caretaker whether their
+    freedge is still active.
+
+    Parameters:
+        freedge: the Freedge whose caretaker is notified.
+
+    Returns: a str
+    """
+    return (f'Hi {freedge.caretaker_name}! This is a message from the folks at'
+            f' freedge.org. According to our systems, the status of your'
+            f' community fridge, "{freedge.project_name}" in'
+            f' {freedge.fridge_location.ShortString()}, was last updated on:'
+            f' {freedge.last_status_update}. Is this freedge still active?'
+            f' Please reply YES or NO.')
+
+
+class Transport:
+    """
+    The parent class of the transports, which keeps the pool of open
+    connections. Each transport implements _connect(), _deliver(), and
+    _disconnect() for its own kind of connection.
+
+    Attributes
+    ===========================================================================
+    pool_size: int
+        The largest number of connections open at once.
+
+    timeout: float
+        The number of seconds to wait for the provider to respond.
+
+    reuse_connections: bool
+        Whether connections are kept open for the next notification.
+
+    connections_opened: int
+        The number of connections opened so far.
+
+    Methods
+    ===========================================================================
+    send(freedge)
+        Sends a notification to the caretaker of the freedge.
+
+    close()
+        Closes every open connection.
+    """
+    # The errors which mean that a connection can no longer be used
+    connection_errors = (OSError,)
+
+    def __init__(self, pool_size=TRANSPORT_POOL_SIZE, timeout=TRANSPORT_TIMEOUT,
+                 reuse_connections=True):
+        """
+        Initializes a transport without opening any connections yet.
+
+        Parameters:
+            pool_size: the int largest number of connections open at once.
+            timeout: the float number of seconds to wait for the provider.
+            reuse_connections: whether to keep each connection open for the
+                               next notification (only turned off to measure
+                               the difference it makes).
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.reuse_connections = reuse_connections
+        self.connections_opened = 0
+        self._slots = threading.BoundedSemaphore(pool_size)  # Connections free
+        self._idle = queue.LifoQueue()      # Open connections not in use
+        self._lock = threading.Lock()       # Guards connections_opened
+
+    def send(self, freedge):
+        """
+        Sends a notification to the caretaker of the freedge, waiting for a
+        connection to be free if all pool_size of them are in use.
+
+        Parameters:
+            freedge: the Freedge whose caretaker is notified.
+
+        Returns: None, since the caretaker replies later
+
+        Raises: TransportError if the notification could not be delivered.
+        """
+        with self._slots:
+            for attempt in range(2):
+                (conn, reused) = self._take()
+                try:
+                    self._deliver(conn, freedge)
+                except TransportError:
+                    self._give_back(conn)   # The connection is still usable
+                    raise
+                except self.connection_errors as error:
+                    self._disconnect(conn)
+                    if (reused and attempt == 0):
+                        continue            # Retry on a new connection
+                    raise TransportError("Could not notify the caretaker of " +
+                                         str(freedge.project_name) + ": " +
+                                         str(error)) from error
+                except BaseException:
+                    self._disconnect(conn)
+                    raise
+                self._give_back(conn)
+                return None
+
+    def close(self):
+        """
+        Closes every open connection. The transport may still be used, and
+        opens new connections as needed.
+
+        Returns: None
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._disconnect(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _take(self):
+        """
+        Returns (connection, whether it was used before), reusing an idle
+        connection if there is one. Intended for internal use only.
+        """
+        try:
+            return (self._idle.get_nowait(), True)
+        except queue.Empty:
+            pass
+        with self._lock:
+            self.connections_opened += 1
+        try:
+            return (self._connect(), False)
+        except self.connection_errors as error:
+            raise TransportError("Could not connect to the provider: " +
+                                 str(error)) from error
+
+    def _give_back(self, conn):
+        """
+        Keeps a connection open for the next notification, or closes it if
+        connections are not reused. Intended for internal use only.
+        """
+        if self.reuse_connections:
+            self._idle.put(conn)
+        else:
+            self._disconnect(conn)
+
+    def _connect(self):
+        """
+        Opens a new connection to the provider. Implemented by each transport.
+        """
+        raise NotImplementedError
+
+    def _deliver(self, conn, freedge):
+        """
+        Sends a notification over an open connection, raising TransportError
+        if the provider refused it. Implemented by each transport.
+        """
+        raise NotImplementedError
+
+    def _disconnect(self, conn):
+        """
+        Closes a connection, ignoring any errors. Implemented by each transport.
+        """
+        raise NotImplementedError
+
+
+class SMTPTransport(Transport):
+    """
+    Sends the notifications as emails through an SMTP server, using smtplib.
+    Each connection is logged in once, and then sends many emails.
+    """
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, sender=SMTP_SENDER,
+                 username=SMTP_USERNAME, password=None, use_tls=SMTP_USE_TLS,
+                 **kwargs):
+        """
+        Initializes a transport for an SMTP server.
+
+        Parameters:
+            host: the str host name of the SMTP server.
+            port: the int port of the SMTP server.
+            sender: the str address the emails are sent from.
+            username: the str username to log in with, or "" to not log in.
+            password: the str password to log in with. Defaults to the value
+                      of the environment variable SMTP_PASSWORD_VARIABLE.
+            use_tls: whether to encrypt the connection using STARTTLS.
+            kwargs: the pool_size, timeout, and reuse_connections of the
+                    Transport.
+        """
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password if password is not None else \
+            os.environ.get(SMTP_PASSWORD_VARIABLE, "")
+        self.use_tls = use_tls
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        return smtp
+
+    def _deliver(self, smtp, freedge):
+        if not freedge.email_address:
+            raise TransportError("The caretaker of " + str(freedge.project_name) +
+                                 " has no email address.")
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = freedge.email_address
+        message["Subject"] = "Is " + str(freedge.project_name) + " still active?"
+        message.set_content(status_check_message(freedge))
+        try:
+            refused = smtp.send_message(message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                smtplib.SMTPDataError) as error:
+            raise TransportError("The SMTP server refused the email to " +
+                                 freedge.email_address + ": " + str(error)) from error
+        if len(refused) > 0:
+            raise TransportError("The SMTP server refused the email to " +
+                                 freedge.email_address + ".")
+
+    def _disconnect(self, smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+
+class HTTPSMSTransport(Transport):
+    """
+    Sends the notifications as SMS messages by POSTing them, as JSON, to the
+    HTTP API of an SMS gateway. Each connection is kept alive, and sends many
+    requests.
+    """
+    connection_errors = (http.client.HTTPException, OSError)
+
+    def __init__(self, url=SMS_GATEWAY_URL, sender=SMS_SENDER_NUMBER,
+                 api_key=None, **kwargs):
+        """
+        Initializes a transport for an SMS gateway.
+
+        Parameters:
+            url: the str URL the messages are POSTed to (http or https).
+            sender: the str phone number the messages are sent from.
+            api_key: the str key sent in the Authorization header. Defaults
+                     to the value of the environment variable
+                     SMS_API_KEY_VARIABLE.
+            kwargs: the pool_size, timeout, and reuse_connections of the
+                    Transport.
+        """
+        super().__init__(**kwargs)
+        parts = urlsplit(url)
+        self.secure = (parts.scheme == "https")
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or "/"
+        self.sender = sender
+        self.api_key = api_key if api_key is not None else \
+            os.environ.get(SMS_API_KEY_VARIABLE, "")
+
+    def _connect(self):
+        if self.secure:
+            return http.client.HTTPSConnection(self.host, self.port,
+                                               timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port,
+                                          timeout=self.timeout)
+
+    def _deliver(self, conn, freedge):
+        if not freedge.phone_number:
+            raise TransportError("The caretaker of " + str(freedge.project_name) +
+                                 " has no phone number.")
+        body = json.dumps({"from": self.sender, "to": freedge.phone_number,
+                           "body": status_check_message(freedge)}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = "Bearer " + self.api_key
+        conn.request("POST", self.path, body, headers)
+        response = conn.getresponse()
+        response.read()     # The response must be read before reusing conn
+        if not 200 <= response.status < 300:
+            raise TransportError("The SMS gateway refused the message to " +
+                                 freedge.phone_number + ": " +
+                                 str(response.status) + " " + response.reason)
+
+    def _disconnect(self, conn):
+        conn.close()
+
+
+class ContactTransport:
+    """
+    Sends each notification by the caretaker's preferred contact method:
+    SMS if they prefer text messages, and email otherwise.
+
+    Methods
+    ===========================================================================
+    send(freedge)
+        Sends a notification to the caretaker of the freedge.
+
+    close()
+        Closes the connections of both transports.
+    """
+    def __init__(self, sms, email):
+        """
+        Initializes a transport which chooses between two others.
+
+        Parameters:
+            sms: the Transport used for SMS (e.g. an HTTPSMSTransport).
+            email: the Transport used for email (e.g. an SMTPTransport).
+        """
+        self.sms = sms
+        self.email = email
+
+    def send(self, freedge):
+        """
+        Sends a notification to the caretaker of the freedge.
+
+        Parameters:
+            freedge: the Freedge whose caretaker is notified.
+
+        Returns: None, since the caretaker replies later
+
+        Raises: TransportError if the notification could not be delivered.
+        """
+        if (freedge.preferred_contact_method == ContactMethod.SMS.value):
+            return self.sms.send(freedge)
+        return self.email.send(freedge)
+
+    def close(self):
+        """
+        Closes the connections of both transports.
+
+        Returns: None
+        """
+        self.sms.close()
+        self.email.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def async_transport(transport):
+    """
+    Adapts a transport for the NotificationDispatcher, which needs an async
+    function. Each notification is sent on a worker thread, so many can be
+    sent at once (up to the transport's pool_size).
+
+    Parameters:
+        transport: a Transport or ContactTransport.
+
+    Returns: an async function of a Freedge, which returns None
+    """
+    async def send(freedge):
+        return await asyncio.to_thread(transport.send, freedge)
+    return send
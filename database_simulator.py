@@ -59,6 +59,7 @@ def main():
 	
 	# Update every nth freedge's date to be out-of-date
 	n = random.randint(4, 10)
+	updated = []
 	for i in range(len(freedges)):
 
 		# Update the nth freedge's date
@@ -75,7 +76,10 @@ def main():
 			if (days_since_update.days > freedge_constants.FIRST_UPDATE_THRESHOLD):
 				freedges[i].freedge_status = freedge_data_entry.Status.SuspectedInactive
 
-			tdb.update_freedge(freedges[i])
+			updated.append(freedges[i])
+
+	# Write all of the updated freedges to the database at once
+	tdb.update_freedges(updated)
 
 
 if __name__ == '__main__':
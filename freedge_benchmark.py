@@ -0,0 +1,538 @@
+"""
+===============================================================================
+Title:	Benchmarks for the Freedge Tracker System
+===============================================================================
+Description:	This script is for testing purposes only.
+
+				The benchmarks measure how the FreedgeDatabase module performs
+				on networks far larger than the test data, using fabricated
+				freedges. Nothing in the test_data folder is modified.
+
+===============================================================================
+Instructions: How To Utilize this test script:
+===============================================================================
+(1)	Run 'python3 freedge_benchmark.py' in the terminal to run every
+	benchmark, or 'python3 freedge_benchmark.py <name>' to run only the
+	benchmark with that name (for example, 'memory').
+
+(2)	Each benchmark prints its results to the terminal.
+===============================================================================
+"""
+import asyncio
+import csv
+import gc
+import heapq
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from FreedgeDatabase.freedge_data_entry import Status, ContactMethod, Freedge, FreedgeAddress
+from FreedgeDatabase.row_decoder import DEFAULT_DECODER
+from FreedgeDatabase.caretaker_info_parser import ImportPlan, _get_headers, _get_address_format, \
+	_STATUS_INDEX
+from FreedgeDatabase.csv_normalizer import STATUS_RESPONSES
+from FreedgeDatabase.freedge_database import new_database_from_csv, load_internal_database
+from AdminInterface.background_tasks import TaskRunner
+from NotificationSystem.notificationDispatch import NotificationDispatcher
+from NotificationSystem.notificationTransport import SMTPTransport, HTTPSMSTransport, \
+	ContactTransport, async_transport
+from NotificationSystem.notificationFakeProvider import FakeSMTPServer, FakeSMSServer
+from InternalData.freedge_constants import IMPORT_BATCH_SIZE, TASK_POLL_INTERVAL, \
+	PERMISSION_TO_CONTACT_KEY
+
+def fabricate_rows(count):
+	"""
+	Description: Builds fabricated database rows, in the column order of a row
+				 selected from 'freedges JOIN addresses'.
+	Parameters: count -> the int number of rows to build
+	Returns: a list of tuples
+	"""
+	rows = []
+	for i in range(1, count + 1):
+		rows.append((i, "Project " + str(i), "Network " + str(i % 50),
+					 "Caretaker " + str(i), "2021-%02d-%02d" % (i % 12 + 1, i % 28 + 1),
+					 "ACTIVE", "2022-%02d-%02d" % (i % 12 + 1, i % 28 + 1),
+					 "+1 555 010 " + str(i % 10000), "caretaker" + str(i) + "@example.com",
+					 "yes", "text", str(i) + " Main Street", "City " + str(i % 500),
+					 "State", str(10000 + i % 90000), "Country"))
+	return rows
+
+def _dict_backed(cls):
+	"""
+	Description: Builds a copy of a class which stores its attributes in a
+				 per-object __dict__ rather than in __slots__, for comparison.
+	Parameters: cls -> the class to copy
+	Returns: a new class
+	"""
+	members = {}
+	for (name, value) in cls.__dict__.items():
+		if name not in cls.__slots__ and name not in ("__slots__", "__dict__"):
+			members[name] = value
+	return type("Dict" + cls.__name__, (), members)
+
+def _measure_freedges(rows, freedge_cls, address_cls):
+	"""
+	Description: Measures the memory allocated while building one Freedge (and
+				 its FreedgeAddress) per row.
+	Parameters:
+		rows -> the rows to build the freedges from
+		freedge_cls -> the class to use for each Freedge
+		address_cls -> the class to use for each FreedgeAddress
+	Returns: the int number of bytes allocated
+	"""
+	tracemalloc.start()
+	freedges = []
+	for row in rows:
+		address = address_cls([row[11], row[12], row[13], row[14], row[15]])
+		freedges.append(freedge_cls(row[0], row[1], row[2], row[3], address,
+									row[6], row[10], row[7], row[8], row[4], True))
+	allocated = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return allocated
+
+def benchmark_memory(count=100000):
+	"""
+	Description: Compares the per-fridge memory footprint of the Freedge and
+				 FreedgeAddress classes with dict-backed copies of them. The
+				 strings of each row are shared by both, so only the objects
+				 themselves are measured.
+	Parameters: count -> the int number of freedges to build
+	Returns: None
+	"""
+	rows = fabricate_rows(count)
+	slotted = _measure_freedges(rows, Freedge, FreedgeAddress)
+	dict_backed = _measure_freedges(rows, _dict_backed(Freedge),
+									_dict_backed(FreedgeAddress))
+	print("memory: %d freedges" % count)
+	print("    __slots__:    %8.1f bytes/freedge (%.1f MiB)"
+		  % (slotted / count, slotted / 2**20))
+	print("    dict-backed:  %8.1f bytes/freedge (%.1f MiB)"
+		  % (dict_backed / count, dict_backed / 2**20))
+
+def _legacy_row_to_freedge(row):
+	"""
+	Description: The original FreedgeDatabase.row_to_freedge(), kept here as
+				 the baseline for benchmark_decode().
+	Parameters: row -> a row selected from 'freedges JOIN addresses'
+	Returns: a Freedge
+	"""
+	active_str = Status.Active.value.upper()
+	sus_inact_str = Status.SuspectedInactive.value.upper()
+	conf_inact_str = Status.ConfirmedInactive.value.upper()
+	unknown_str = Status.Unknown.value.upper()
+	status_str = row[5].upper().strip()
+	if (status_str == "YES" or status_str == active_str):
+		status = Status.Active
+	elif (status_str == "NO" or status_str == conf_inact_str):
+		status = Status.ConfirmedInactive
+	elif (status_str == sus_inact_str):
+		status = Status.SuspectedInactive
+	else:
+		status = Status.Unknown
+	permission = (row[9].upper().strip() == "YES")
+	try:
+		installed_date = date.fromisoformat(row[6])
+	except:
+		installed_date = '-'
+	try:
+		last_update = date.fromisoformat(row[4])
+	except:
+		last_update = '-'
+	address = FreedgeAddress([row[11], row[12], row[13], row[14], row[15]])
+	new_freedge = Freedge(row[0], row[1], row[2], row[3], address, installed_date, row[10], row[7],
+						  row[8], last_update, permission)
+	new_freedge.freedge_status = status
+	return new_freedge
+
+def _time_decoding(rows, decode):
+	"""
+	Description: Times how long it takes to convert every row into a Freedge.
+	Parameters:
+		rows -> the rows to convert
+		decode -> the function which converts a single row
+	Returns: the float number of seconds taken
+	"""
+	start = time.perf_counter()
+	for row in rows:
+		decode(row)
+	return time.perf_counter() - start
+
+def benchmark_decode(counts=(10000, 100000)):
+	"""
+	Description: Compares the RowDecoder used by FreedgeDatabase with the
+				 original row_to_freedge() implementation.
+	Parameters: counts -> the numbers of rows to convert
+	Returns: None
+	"""
+	for count in counts:
+		rows = fabricate_rows(count)
+		legacy = _time_decoding(rows, _legacy_row_to_freedge)
+		decoder = _time_decoding(rows, DEFAULT_DECODER.decode)
+		print("decode: %d rows" % count)
+		print("    original row_to_freedge: %7.1f ms" % (legacy * 1000))
+		print("    RowDecoder:              %7.1f ms (%.2fx faster)"
+			  % (decoder * 1000, legacy / decoder))
+
+def fabricate_csv_rows(count):
+	"""
+	Description: Builds a fabricated header row and csv rows, in the format
+				 filled out by the freedge caretakers.
+	Parameters: count -> the int number of rows to build
+	Returns: a tuple of (header row, list of rows)
+	"""
+	header_row = _get_headers() + _get_address_format()
+	responses = ["yes", "YES", "no", "", "maybe"]
+	rows = []
+	for i in range(1, count + 1):
+		rows.append(["Project " + str(i), "Network " + str(i % 50),
+					 "%d/%d/20%02d" % (i % 12 + 1, i % 28 + 1, i % 8 + 15),
+					 "Caretaker " + str(i), responses[i % 5],
+					 "+1 555 010 " + str(i % 10000), "caretaker" + str(i) + "@example.com",
+					 "yes" if i % 3 else "", "text", str(i) + " Main Street",
+					 "City " + str(i % 500), "State", str(10000 + i % 90000), "Country"])
+	return (header_row, rows)
+
+def _legacy_parse_row(plan, entry_data, permission_index):
+	"""
+	Description: The per-row ImportPlan.parse() which the csv parser used
+				 before rows were normalized a batch at a time, kept here as
+				 the baseline for benchmark_normalize(). It calls
+				 date.today() for each row, and does not convert the dates
+				 installed.
+	Parameters:
+		plan -> the ImportPlan compiled from the header row
+		entry_data -> a row (list of strings) of the csv file
+		permission_index -> the position of the permission to contact column
+	Returns: a tuple of (general data, address), as from ImportPlan.parse_batch()
+	"""
+	if (len(entry_data) < plan.width):
+		entry_data = entry_data + [""] * (plan.width - len(entry_data))
+	parsed = list(plan._general_fields(entry_data))
+	status_str = parsed[_STATUS_INDEX].strip().upper()
+	if (len(status_str) != 0):
+		parsed[_STATUS_INDEX] = STATUS_RESPONSES.get(status_str, Status.Unknown.value)
+		last_update = date.today().isoformat()
+	elif (len(entry_data[permission_index].strip()) != 0):
+		parsed[_STATUS_INDEX] = Status.Active.value
+		last_update = date.today().isoformat()
+	else:
+		last_update = "NULL"
+	parsed.append(last_update)
+	return (parsed, list(plan._address_fields(entry_data)))
+
+def _time_normalizing(rows, parse_batch):
+	"""
+	Description: Times how long it takes to parse every row, a batch of
+				 IMPORT_BATCH_SIZE rows at a time.
+	Parameters:
+		rows -> the csv rows to parse
+		parse_batch -> the function which parses a list of rows
+	Returns: the float number of seconds taken (the best of three runs)
+	"""
+	best = None
+	# As with timeit, garbage collection is turned off while timing, so that
+	# collections of the fabricated rows are not counted against either parser
+	gc.disable()
+	try:
+		for attempt in range(3):
+			start = time.perf_counter()
+			for i in range(0, len(rows), IMPORT_BATCH_SIZE):
+				parse_batch(rows[i:i + IMPORT_BATCH_SIZE])
+			taken = time.perf_counter() - start
+			best = taken if best is None else min(best, taken)
+	finally:
+		gc.enable()
+	return best
+
+def benchmark_normalize(counts=(10000, 100000)):
+	"""
+	Description: Compares the batched, column-at-a-time normalization used by
+				 ImportPlan with the per-row parser it replaced. As that
+				 parser did not convert the dates installed, the batched
+				 normalization is also timed without converting them, so
+				 that the same work is compared.
+	Parameters: counts -> the numbers of rows to normalize
+	Returns: None
+	"""
+	for count in counts:
+		(header_row, rows) = fabricate_csv_rows(count)
+		plan = ImportPlan(header_row)
+		permission_index = header_row.index(PERMISSION_TO_CONTACT_KEY)
+		no_dates = ImportPlan(header_row)
+		no_dates._converters = ()
+
+		legacy = _time_normalizing(rows, lambda batch: [
+			_legacy_parse_row(plan, row, permission_index) for row in batch])
+		batched_no_dates = _time_normalizing(rows, no_dates.parse_batch)
+		batched = _time_normalizing(rows, plan.parse_batch)
+
+		print("normalize: %d rows" % count)
+		print("    original per-row parser:      %7.1f ms (dates not converted)"
+			  % (legacy * 1000))
+		print("    batched, dates not converted: %7.1f ms (%.2fx the speed of the original)"
+			  % (batched_no_dates * 1000, legacy / batched_no_dates))
+		print("    batched, dates converted:     %7.1f ms (%.2fx the speed of the original)"
+			  % (batched * 1000, legacy / batched))
+
+class _FrameLoop:
+	"""
+	Description: A stand-in for the tkinter main loop, which has no display
+				 to run on here. It runs the callbacks scheduled with after()
+				 in order, on the thread which calls run().
+	"""
+	def __init__(self):
+		self._callbacks = []	# A heap of (due time, order, callback)
+		self._order = 0
+
+	def after(self, ms, callback):
+		self._order += 1
+		heapq.heappush(self._callbacks,
+					   (time.perf_counter() + ms / 1000, self._order, callback))
+
+	def run(self):
+		while self._callbacks:
+			(due, order, callback) = heapq.heappop(self._callbacks)
+			delay = due - time.perf_counter()
+			if delay > 0:
+				time.sleep(delay)
+			callback()
+
+def _write_csv(path, count):
+	"""
+	Description: Writes a fabricated csv file of freedges.
+	Parameters:
+		path -> the str path of the file to write
+		count -> the int number of rows to write
+	Returns: None
+	"""
+	(header_row, rows) = fabricate_csv_rows(count)
+	with open(path, "w", newline="") as csvfile:
+		writer = csv.writer(csvfile)
+		writer.writerow(header_row)
+		writer.writerows(rows)
+
+def benchmark_responsiveness(count=100000):
+	"""
+	Description: Measures how smoothly the display of the Administrator
+				 Interface would update while a csv file is imported. A frame
+				 is drawn every TASK_POLL_INTERVAL milliseconds on the main
+				 loop, while the import runs on a TaskRunner's worker thread;
+				 the gaps between frames are compared with importing the file
+				 on the main loop itself, which blocks every frame until the
+				 import is done.
+	Parameters: count -> the int number of csv rows to import
+	Returns: None
+	"""
+	with tempfile.TemporaryDirectory() as folder:
+		csv_path = os.path.join(folder, "freedges.csv")
+		_write_csv(csv_path, count)
+
+		# Importing on the main loop blocks the display for the whole import
+		start = time.perf_counter()
+		new_database_from_csv(os.path.join(folder, "blocking.db"), csv_path).close()
+		blocking = time.perf_counter() - start
+
+		loop = _FrameLoop()
+		runner = TaskRunner(loop)
+		frames = []
+		finished = []
+
+		def frame():
+			frames.append(time.perf_counter())
+			if not finished:
+				loop.after(TASK_POLL_INTERVAL, frame)
+
+		def import_csv(task):
+			def progress(stats, fraction):
+				task.report_progress(fraction, str(stats.rows_inserted))
+				task.check_cancelled()
+			fdb = new_database_from_csv(os.path.join(folder, "background.db"),
+										csv_path, progress=progress)
+			fdb.close()
+			return fdb.import_stats
+
+		start = time.perf_counter()
+		runner.submit("import", import_csv, finished.append)
+		loop.after(0, frame)
+		loop.run()
+		background = time.perf_counter() - start
+		runner.shutdown()
+
+	gaps = sorted(b - a for (a, b) in zip(frames, frames[1:]))
+	print("responsiveness: importing %d csv rows" % count)
+	print("    on the main loop:  display blocked for %7.1f ms" % (blocking * 1000))
+	print("    on a worker:       %7.1f ms, %d frames (%.1f frames/sec)"
+		  % (background * 1000, len(frames), len(gaps) / background))
+	print("                       frame gap median %.1f ms, 99th percentile %.1f ms, max %.1f ms"
+		  % (gaps[len(gaps) // 2] * 1000, gaps[int(len(gaps) * 0.99)] * 1000,
+			 gaps[-1] * 1000))
+
+def _time_ms(fn):
+	"""
+	Description: Times a single call of a function.
+	Parameters: fn -> a function of no arguments
+	Returns: the float number of milliseconds the call took
+	"""
+	start = time.perf_counter()
+	fn()
+	return (time.perf_counter() - start) * 1000
+
+def benchmark_query(count=100000, page_size=130):
+	"""
+	Description: Measures how quickly the tables of the Administrator
+				 Interface can be searched, filtered, and sorted. For each
+				 query, the matching freedges are counted and the first page
+				 and a page from the middle of the results are read, as the
+				 VirtualTable does; the cache is cleared before each query.
+	Parameters:
+		count -> the int number of fabricated freedges in the database
+		page_size -> the int number of freedges read per page
+	Returns: None
+	"""
+	with tempfile.TemporaryDirectory() as folder:
+		csv_path = os.path.join(folder, "freedges.csv")
+		db_path = os.path.join(folder, "freedges.db")
+		_write_csv(csv_path, count)
+		new_database_from_csv(db_path, csv_path).close()
+		fdb = load_internal_database(db_path)
+		query = fdb.query()
+		queries = [
+			("all freedges", query),
+			("search 'project 12'", query.search("project 12")),
+			("search 'caretaker 99'", query.search("caretaker 99")),
+			("search 'city 7'", query.search("city 7")),
+			("status Active", query.with_status(Status.Active)),
+			("sort by last update, descending",
+			 query.sort_by("last_status_update", descending=True)),
+			("sort by city", query.sort_by("city")),
+			("status Active, sort by last update",
+			 query.with_status(Status.Active).sort_by("last_status_update")),
+			("search 'project 1', sort by last update",
+			 query.search("project 1").sort_by("last_status_update")),
+			("out of date, sort by project", query.out_of_date().sort_by("project_name"))
+		]
+		print("query: searching, filtering, and sorting %d freedges" % count)
+		for (name, q) in queries:
+			fdb._data_changed()		# Forget the cached counts
+			fdb.count_freedges()	# The display has always counted these
+			counted = _time_ms(q.count)
+			first = _time_ms(lambda: q.page(0, page_size))
+			middle = _time_ms(lambda: q.page(q.count() // 2, page_size))
+			print("    %-42s %6d found: count %6.1f ms, first page %5.1f ms, middle page %6.1f ms"
+				  % (name, q.count(), counted, first, middle))
+		print("    ranked search (full-text index: %s)" % fdb.has_search_index())
+		for text in ["project 12345", "caretaker 77", "main street 99", "city 7"]:
+			fdb._data_changed()
+			took = _time_ms(lambda: fdb.search(text))
+			print("    %-42s %6d found: %6.1f ms" % ("'" + text + "'", len(fdb.search(text)), took))
+		fdb.close()
+
+def benchmark_dispatch(count=5000, latency=0.05, sample=100):
+	"""
+	Description: Measures how long a notification campaign to the caretakers
+				 of many freedges takes, using a simulated transport in which
+				 every notification takes a fixed time to be replied to. The
+				 campaign is compared with notifying the caretakers one at a
+				 time, which is timed on the first few freedges only.
+	Parameters:
+		count -> the int number of freedges to notify
+		latency -> the float number of seconds each reply takes
+		sample -> the int number of freedges notified one at a time
+	Returns: None
+	"""
+	async def transport(freedge):
+		await asyncio.sleep(latency)
+		return Status.Active
+
+	with tempfile.TemporaryDirectory() as folder:
+		csv_path = os.path.join(folder, "freedges.csv")
+		_write_csv(csv_path, count)
+		fdb = new_database_from_csv(os.path.join(folder, "freedges.db"), csv_path)
+		freedges = fdb.get_freedges()
+		one_at_a_time = NotificationDispatcher(fdb, transport, concurrency=1)
+		sequential = one_at_a_time.dispatch(freedges[:sample])
+		dispatcher = NotificationDispatcher(fdb, transport)
+		stats = dispatcher.dispatch(freedges)
+		fdb.close()
+
+	print("dispatch: notifying %d caretakers, %.0f ms per reply" % (count, latency * 1000))
+	print("    one at a time:     %7.1f s (estimated from %d caretakers)"
+		  % (sequential.elapsed * count / sample, sample))
+	print("    %3d at a time:     %7.1f s, %d replies saved in %d batches"
+		  % (dispatcher.concurrency, stats.elapsed, stats.written, stats.batches))
+
+def benchmark_campaign(count=2000, latency=0.005):
+	"""
+	Description: Measures the throughput and latency of a notification
+				 campaign sent through the real SMTP and SMS transports, to
+				 the local fake providers. Half of the caretakers prefer
+				 email and half SMS, and each provider takes a fixed time to
+				 accept every message. The campaign is run with each
+				 connection reused for many messages, and again with a new
+				 connection for every message.
+	Parameters:
+		count -> the int number of caretakers to notify
+		latency -> the float number of seconds each provider takes to accept
+				   a message
+	Returns: None
+	"""
+	with tempfile.TemporaryDirectory() as folder:
+		csv_path = os.path.join(folder, "freedges.csv")
+		_write_csv(csv_path, count)
+		fdb = new_database_from_csv(os.path.join(folder, "freedges.db"), csv_path)
+		freedges = fdb.get_freedges()
+		for freedge in freedges[::2]:
+			freedge.preferred_contact_method = ContactMethod.Email.value
+
+		print("campaign: notifying %d caretakers through the fake providers, %.0f ms per message"
+			  % (count, latency * 1000))
+		for reuse in (False, True):
+			with FakeSMTPServer(latency) as smtp_server, FakeSMSServer(latency) as sms_server:
+				email = SMTPTransport(smtp_server.host, smtp_server.port, use_tls=False,
+									  username="", reuse_connections=reuse)
+				sms = HTTPSMSTransport(sms_server.url, api_key="", reuse_connections=reuse)
+				with ContactTransport(sms, email) as transport:
+					send = async_transport(transport)
+					latencies = []
+
+					async def timed(freedge):
+						start = time.perf_counter()
+						await send(freedge)
+						latencies.append(time.perf_counter() - start)
+
+					stats = NotificationDispatcher(fdb, timed).dispatch(freedges)
+				delivered = len(smtp_server.messages) + len(sms_server.messages)
+				connections = smtp_server.connections + sms_server.connections
+			latencies.sort()
+			print("    %-22s %6.2f s, %6.0f messages/sec, %d delivered, %d failed"
+				  % ("reusing connections:" if reuse else "a connection each:",
+					 stats.elapsed, delivered / stats.elapsed, delivered, stats.failed))
+			print("    %-22s send median %.1f ms, 99th percentile %.1f ms, %d connections opened"
+				  % ("", latencies[len(latencies) // 2] * 1000,
+					 latencies[int(len(latencies) * 0.99)] * 1000, connections))
+		fdb.close()
+
+# The benchmarks which can be run, by name
+BENCHMARKS = {
+	"memory": benchmark_memory,
+	"decode": benchmark_decode,
+	"normalize": benchmark_normalize,
+	"responsiveness": benchmark_responsiveness,
+	"query": benchmark_query,
+	"dispatch": benchmark_dispatch,
+	"campaign": benchmark_campaign
+}
+
+def main():
+	"""
+	Description: Runs the benchmarks named on the command line, or all of them.
+	Returns: None
+	"""
+	names = sys.argv[1:] or list(BENCHMARKS.keys())
+	for name in names:
+		BENCHMARKS[name]()
+
+if __name__ == '__main__':
+	main()
@@ -75,8 +75,11 @@ def main():
 			if proceed_response:
 				# Otherwise, load the internal database file that was found
 				MainInterface.fdb_path = located_file_path
+				# in the background, which updates the display once it is loaded
 				MainInterface.LoadDatabase(located_file_path)
-	MainInterface.UpdateFullDisplay()
+	# Show the instructions for creating or loading a database, if none is loading
+	if not MainInterface.tasks.busy():
+		MainInterface.UpdateFullDisplay()
 	MainInterface.root.mainloop()
 		
 
@@ -0,0 +1,118 @@
+"""
+===============================================================================
+Title:	Tests for the FreedgeDatabase module of the Freedge Tracker System
+===============================================================================
+Description:	This script is for testing purposes only.
+
+				Checks the database operations which the Administrator
+				Interface relies upon against the csv files and database in
+				the test_data folder. Every database is created in a temporary
+				folder, so nothing in the test_data folder is modified.
+
+===============================================================================
+Instructions: How To Utilize this test script:
+===============================================================================
+(1)	Run 'python3 -m unittest test_freedge_database' in the terminal, from
+	the folder containing this file.
+===============================================================================
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from FreedgeDatabase import new_database_from_csv, load_internal_database
+from FreedgeDatabase import database_schema as schema
+
+# The test data used by the tests
+TINY_CSV = os.path.join("test_data", "freeedge_data_tiny.csv")
+TINY_EDITED_CSV = os.path.join("test_data", "freeedge_data_tiny_edited.csv")
+FULL_CSV = os.path.join("test_data", "freeedge_data.csv")
+NEEDS_UPDATING_DB = os.path.join("test_data", "fdb_needs_updating.db")
+# The name shared by two freedges, each with its own caretaker, in the test data
+SHARED_NAME = "Riverside Community Fridge"
+
+class ApplyDiffTest(unittest.TestCase):
+	"""
+	Tests updating a database from an edited csv file, as the "Update
+	Database" button of the Administrator Interface does.
+	"""
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+		self.fdb = new_database_from_csv(os.path.join(self.folder.name, "freedges.db"),
+										 TINY_CSV)
+
+	def tearDown(self):
+		self.fdb.close()
+		self.folder.cleanup()
+
+	def test_apply_diff_with_search_index(self):
+		"""
+		The full-text index's triggers must not stop the upserts of
+		apply_diff, and must keep the index in sync with the changes.
+		"""
+		self.assertTrue(self.fdb.has_search_index())
+		diff = self.fdb.diff_csv(TINY_EDITED_CSV)
+		self.assertGreater(self.fdb.apply_diff(diff), 0)
+
+		conn = self.fdb.open_connection()
+		indexed = conn.execute("SELECT COUNT(*) FROM freedge_search").fetchone()[0]
+		self.assertEqual(indexed, self.fdb.count_freedges())
+		# The changed address, and not the old one, is found
+		found = [f.project_name for f in self.fdb.search("25 Commercial Street")]
+		self.assertIn("Friends of the Community Fridge", found)
+		found = [f.project_name for f in self.fdb.search("23 Commercial Street")]
+		self.assertNotIn("Friends of the Community Fridge", found)
+		# The freedge removed from the csv file is no longer found
+		self.assertEqual(self.fdb.search("Garage Cafe"), [])
+
+class SharedProjectNameTest(unittest.TestCase):
+	"""
+	Tests that freedges which share a project name, as two do in the test
+	data, are all kept.
+	"""
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.folder.cleanup()
+
+	def caretakers(self, fdb):
+		"""
+		Returns the sorted caretakers of the freedges with the shared name.
+		"""
+		return sorted(f.caretaker_name for f in fdb.get_freedges()
+					  if f.project_name == SHARED_NAME)
+
+	def test_upgrade_keeps_shared_names(self):
+		"""
+		A database created before schema versions were tracked is upgraded
+		without losing any of its freedges.
+		"""
+		path = os.path.join(self.folder.name, "old.db")
+		shutil.copyfile(NEEDS_UPDATING_DB, path)
+		fdb = load_internal_database(path)
+		try:
+			version = schema.get_schema_version(fdb.open_connection())
+			self.assertEqual(version, schema.SCHEMA_VERSION)
+			self.assertEqual(fdb.count_freedges(), 51)
+			self.assertEqual(len(self.caretakers(fdb)), 2)
+		finally:
+			fdb.close()
+
+	def test_import_and_update_keep_shared_names(self):
+		"""
+		Importing the csv file keeps both freedges, and updating the database
+		from the same file changes nothing.
+		"""
+		fdb = new_database_from_csv(os.path.join(self.folder.name, "new.db"), FULL_CSV)
+		try:
+			self.assertEqual(self.caretakers(fdb), ["Jimmy Ainsley", "Susan McCarthy"])
+			diff = fdb.diff_csv(FULL_CSV)
+			self.assertTrue(diff.is_empty())
+			self.assertEqual(fdb.apply_diff(diff), 0)
+			self.assertEqual(self.caretakers(fdb), ["Jimmy Ainsley", "Susan McCarthy"])
+		finally:
+			fdb.close()
+
+if __name__ == '__main__':
+	unittest.main()